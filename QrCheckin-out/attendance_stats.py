@@ -0,0 +1,112 @@
+import datetime, os
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+TIMEZONE = ZoneInfo(os.getenv("TIMEZONE", "Asia/Bangkok"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    day     TEXT NOT NULL,        -- yyyy-MM-dd (TIMEZONE)
+    booth   TEXT NOT NULL,
+    hour    INTEGER NOT NULL,
+    status  TEXT NOT NULL,        -- IN | OUT | AUTO_OUT
+    count   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, booth, hour, status)
+);
+CREATE TABLE IF NOT EXISTS rollup_seen (event_id TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS rollup_rows (id INTEGER PRIMARY KEY);      -- checkins.id ของแถวที่ไม่มี event_id
+"""
+
+
+def _local_time(iso: str):
+    """เวลาใน TIMEZONE: ค่าที่ไม่มี offset (บันทึกจากบูธ) ถือเป็นเวลาท้องถิ่นอยู่แล้ว"""
+    try:
+        stamp = datetime.datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return None
+    return stamp.astimezone(TIMEZONE) if stamp.tzinfo else stamp
+
+
+# =====================================================
+# 📊 Attendance rollups
+# =====================================================
+class AttendanceStats:
+    """
+    ยอดรวม checkins ต่อ วัน / บูธ / ชั่วโมง / สถานะ อัปเดตทีละเหตุการณ์
+    ใช้ SQLite ไฟล์เดียวกับ ParticipantStore จึงรีเซ็ตพร้อม cursor ของการ sync เสมอ
+    - เหตุการณ์ของบูธนี้ถูกนับตอนสแกน แล้วข้ามเมื่อแถวเดียวกันกลับมาจากการ sync (ดูจาก event_id)
+    - แถวจากบูธอื่นถูกนับตอน sync; แถวที่ไม่มี event_id นับครั้งเดียวตาม checkins.id
+      (sync อ่านแถวท้าย ๆ ซ้ำทุกรอบ การนับจึงต้องเล่นซ้ำได้)
+    """
+
+    def __init__(self, store):
+        self.conn = store.conn
+        self._lock = store._lock
+        with self._lock:
+            self.conn.executescript(SCHEMA)
+
+    def record(self, row: dict) -> bool:
+        """นับแถว checkins หนึ่งแถว คืน False ถ้าเคยนับ event_id / id นี้แล้วหรือไม่มีเวลา"""
+        status = (row.get("status") or "").upper()
+        stamp = _local_time(row.get("checkin_time") if status == "IN" else row.get("checkout_time"))
+        stamp = stamp or _local_time(row.get("last_updated"))
+        if not status or stamp is None:
+            return False
+        booth = (row.get("booth") or "").strip()
+        with self._lock:
+            if row.get("event_id"):
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO rollup_seen (event_id) VALUES (?)", (row["event_id"],))
+                if cursor.rowcount == 0:
+                    return False
+            elif row.get("id") is not None:
+                cursor = self.conn.execute("INSERT OR IGNORE INTO rollup_rows (id) VALUES (?)", (row["id"],))
+                if cursor.rowcount == 0:
+                    return False
+            self.conn.execute(
+                "INSERT INTO rollup (day, booth, hour, status, count) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (day, booth, hour, status) DO UPDATE SET count = count + 1",
+                (stamp.date().isoformat(), booth, stamp.hour, status),
+            )
+        return True
+
+    def reset(self):
+        """ล้างยอดทั้งหมด (ก่อน sync ใหม่ตั้งแต่แถวแรก)"""
+        with self._lock:
+            self.conn.executescript("DELETE FROM rollup; DELETE FROM rollup_seen; DELETE FROM rollup_rows;")
+
+    def dates(self) -> list:
+        """วันที่ที่มี check-in (แทนการดาวน์โหลด checkin_time ทุกแถว)"""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT DISTINCT day FROM rollup WHERE status = 'IN' ORDER BY day")]
+
+    def summary(self, day: str = None) -> dict:
+        """ยอดต่อบูธ (in/out และ check-in รายชั่วโมง) ของวันที่ระบุ หรือทุกวันถ้า day เป็น None"""
+        query = "SELECT booth, hour, status, SUM(count) FROM rollup"
+        params = ()
+        if day:
+            query += " WHERE day = ?"
+            params = (day,)
+        with self._lock:
+            rows = self.conn.execute(query + " GROUP BY booth, hour, status", params).fetchall()
+
+        booths = {}
+        for booth, hour, status, count in rows:
+            entry = booths.setdefault(booth, {"booth": booth, "in": 0, "out": 0, "hours": [0] * 24})
+            if status == "IN":
+                entry["in"] += count
+                entry["hours"][hour] += count
+            else:
+                entry["out"] += count
+        ordered = sorted(booths.values(), key=lambda b: b["in"], reverse=True)
+        return {
+            "date": day or "ALL",
+            "total_in": sum(b["in"] for b in ordered),
+            "total_out": sum(b["out"] for b in ordered),
+            "booths": ordered,
+        }
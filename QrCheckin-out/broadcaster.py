@@ -0,0 +1,100 @@
+import asyncio, json, os
+from dotenv import load_dotenv
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", 64))         # ข้อความค้างส่งสูงสุดต่อหน้าจอ
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 5.0))  # ส่งไม่ออกนานเท่านี้ถือว่าหน้าจอค้าง
+
+
+def encode(data) -> str:
+    """serialize แบบเดียวกับ WebSocket.send_json ของ Starlette"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+# =====================================================
+# 📺 Per-client channel
+# =====================================================
+class ClientChannel:
+    """คิวส่งของหน้าจอหนึ่งเครื่องพร้อม writer task ของตัวเอง"""
+
+    def __init__(self, websocket, on_close, queue_size: int = WS_QUEUE_SIZE):
+        self.websocket = websocket
+        self.on_close = on_close
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self.task = asyncio.create_task(self._writer())
+
+    def put(self, text: str):
+        """ไม่บล็อก: คิวเต็ม (หน้าจอช้า) ทิ้งข้อความเก่าที่สุดแล้วใส่ข้อความล่าสุด"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(text)
+
+    async def _writer(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=WS_SEND_TIMEOUT)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ WebSocket send failed ({self.websocket.client}): {e.__class__.__name__}")
+            # ปิด socket ด้วย: หน้าจอจะ reconnect (onclose) แล้วได้ snapshot ใหม่ แทนที่จะค้างอยู่โดยไม่ได้ข้อความอีก
+            try:
+                await asyncio.wait_for(self.websocket.close(), timeout=WS_SEND_TIMEOUT)
+            except Exception:
+                pass
+            self.on_close(self.websocket)
+
+    def close(self):
+        self.task.cancel()
+
+
+# =====================================================
+# 📡 Broadcaster
+# =====================================================
+class Broadcaster:
+    """
+    กระจายเหตุการณ์ไปทุกหน้าจอ: serialize ครั้งเดียวต่อเหตุการณ์ แล้วใส่คิวของแต่ละ client
+    หน้าจอที่ค้างไม่ทำให้ตัวอื่นช้า (แต่ละตัวมี writer task ของตัวเอง)
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.published = 0
+
+    def connect(self, websocket, snapshot=None) -> ClientChannel:
+        """ลงทะเบียน client ใหม่ (เรียกบน event loop) และส่ง snapshot เป็นข้อความแรก"""
+        channel = ClientChannel(websocket, self.disconnect)
+        if snapshot is not None:
+            channel.put(encode(snapshot))
+        self.channels[websocket] = channel
+        return channel
+
+    def disconnect(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.close()
+
+    def publish(self, data):
+        """เรียกบน event loop: ไม่ await การส่งจริง"""
+        text = encode(data)
+        self.published += 1
+        for channel in list(self.channels.values()):
+            channel.put(text)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.channels),
+            "published": self.published,
+            "per_client": [
+                {"client": str(ws.client), "queued": ch.queue.qsize(), "sent": ch.sent, "dropped": ch.dropped}
+                for ws, ch in self.channels.items()
+            ],
+        }
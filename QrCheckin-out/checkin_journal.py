@@ -0,0 +1,277 @@
+import asyncio, json, os, random, sqlite3, threading, time, uuid as uuid_lib
+from pathlib import Path
+import httpx
+from dotenv import load_dotenv
+from supabase_async import build_checkin_row
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", str(Path(__file__).resolve().parent / "checkin_journal.db"))
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", 100))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", 2.0))   # วินาที (append ปลุก flusher ทันที)
+JOURNAL_MAX_BACKOFF = float(os.getenv("JOURNAL_MAX_BACKOFF", 60.0))
+JOURNAL_RETENTION = float(os.getenv("JOURNAL_RETENTION", 86400))          # เก็บรายการที่ส่งแล้วกี่วินาที
+# ส่งผ่าน rpc record_scans: ปิด visit เดิมและเปิด visit ใหม่ใน transaction เดียว
+# เปิดหลังจากรัน sql/002_record_scan.sql บนฐานข้อมูลแล้วเท่านั้น
+RECORD_SCAN_RPC = os.getenv("RECORD_SCAN_RPC", "0") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT NOT NULL,              -- scan | insert | close
+    event_id    TEXT NOT NULL UNIQUE,       -- idempotency key (checkins.event_id)
+    payload     TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    state       TEXT NOT NULL DEFAULT 'pending',   -- pending | sent | failed
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    sent_at     REAL,
+    last_error  TEXT
+);
+CREATE INDEX IF NOT EXISTS journal_state_id ON journal (state, id);
+"""
+
+
+# =====================================================
+# 📒 Write-behind journal
+# =====================================================
+class CheckinJournal:
+    """
+    บันทึก check-in / check-out ลง SQLite (WAL) ในเครื่องก่อน แล้วค่อยส่งขึ้น Supabase เป็นชุด
+    - append() เป็นแค่ INSERT ในเครื่อง การสแกนจึงไม่ต้องรอ network
+    - flusher ส่งตามลำดับ id: scan ที่ติดกันรวมเป็น rpc record_scans เดียว (RECORD_SCAN_RPC=1)
+      หรือแบบเดิม insert ที่ติดกันรวมเป็น bulk insert เดียว, close ส่งเป็น PATCH
+    - ทุกแถวมี event_id ไม่ซ้ำ ส่งซ้ำหลัง timeout ก็ไม่เกิดแถวซ้ำ (on_conflict=event_id)
+    - ส่งไม่สำเร็จ: รอแบบ exponential backoff แล้วลองใหม่ ข้อมูลไม่หายระหว่างเน็ตล่ม
+    """
+
+    def __init__(self, db, path: str = JOURNAL_PATH, booth: str = None, rpc: bool = RECORD_SCAN_RPC):
+        self.db = db
+        self.booth = booth or db.booth
+        self.rpc = rpc
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = None
+        self._backoff = 0.0
+        self.sent = 0
+        self.retries = 0
+        self.last_error = None
+        self.last_flush_ms = None
+        # แถวที่ค้างส่งจากรอบก่อน (เช่นเครื่องดับระหว่างเน็ตล่ม) จะถูกส่งเมื่อ flusher เริ่ม
+        pending = self.pending_count()
+        if pending:
+            print(f"📒 Journal has {pending} unsent events from previous run")
+
+    # -------------------------------------------------
+    # ✍️ Append
+    # -------------------------------------------------
+    def _append(self, kind: str, payload: dict, event_id: str = None) -> str:
+        event_id = event_id or uuid_lib.uuid4().hex
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO journal (kind, event_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                (kind, event_id, json.dumps(payload), time.time()),
+            )
+        if self._wake:
+            self._wake.set()
+        return event_id
+
+    def checkin(self, uuid: str, status: str) -> dict:
+        """บันทึกแถว checkins (Check-in / Check-out / Auto) ลง journal คืนแถวที่บันทึก"""
+        row = build_checkin_row(uuid, status, self.booth)
+        row["event_id"] = uuid_lib.uuid4().hex
+        self._append("scan" if self.rpc else "insert", row, row["event_id"])
+        return row
+
+    def append_scan(self, row: dict, history: bool = False) -> bool:
+        """
+        บันทึกแถว checkins ที่สร้างไว้แล้ว (มี event_id) เช่นเหตุการณ์จาก LAN replica ตามลำดับ HLC
+        history=True: แถวย้อนหลังที่มาถึงหลังเหตุการณ์ที่ใหม่กว่าของ uuid เดียวกัน เขียนแบบ insert ตรง
+        (record_scan จะปิด visit ที่เปิดอยู่ตอนนี้ผิดตัว)
+        event_id ที่อยู่ใน journal แล้วถูกข้าม คืน True ถ้าเพิ่มใหม่
+        """
+        kind = "scan" if self.rpc and not history else "insert"
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO journal (kind, event_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                (kind, row["event_id"], json.dumps(row), time.time()),
+            )
+        if cursor.rowcount and self._wake:
+            self._wake.set()
+        return cursor.rowcount > 0
+
+    def close_checkin(self, uuid: str, booth: str, checkout_time: str):
+        """
+        บันทึกการปิดแถวที่ยังเปิดค้างของบูธเดิม (auto-checkout)
+        โหมด rpc ไม่ต้องบันทึก: record_scan ของ check-in ถัดไปปิดแถวของบูธอื่นให้ใน transaction เดียวกัน
+        """
+        if self.rpc:
+            return None
+        return self._append("close", {"uuid": uuid, "booth": booth, "checkout_time": checkout_time})
+
+    # -------------------------------------------------
+    # 🚚 Flush
+    # -------------------------------------------------
+    def _pending(self, limit: int):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT id, kind, event_id, payload FROM journal WHERE state = 'pending' ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def _mark(self, ids, state: str, error: str = None):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE journal SET state = ?, sent_at = ?, last_error = ?, attempts = attempts + 1 WHERE id = ?",
+                [(state, time.time() if state == "sent" else None, error, i) for i in ids],
+            )
+
+    def _mark_retry(self, ids, error: str):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(error, i) for i in ids],
+            )
+
+    async def _send(self, kind: str, entries):
+        if kind == "scan":
+            results = await self.db.record_scans([json.loads(entry[3]) for entry in entries])
+            for result in results:
+                if result.get("result") == "auto_checkout":
+                    print(f"🟠 Auto-checkout {result['uuid']} from {result['previous_booth']}")
+                elif result.get("result") == "invalid":
+                    print(f"⚠️ record_scan rejected unknown uuid {result['uuid']}")
+        elif kind == "insert":
+            await self.db.insert_checkins([json.loads(entry[3]) for entry in entries])
+        else:
+            payload = json.loads(entries[0][3])
+            updated = await self.db.close_checkin(payload["uuid"], payload["booth"], payload["checkout_time"])
+            print(f"🟠 Auto-checkout {payload['uuid']} from {payload['booth']} → updated rows: {updated}")
+
+    async def flush(self) -> int:
+        """ส่งรายการที่ค้างตามลำดับจนหมดหรือเจอ error คืนจำนวนรายการที่ส่งสำเร็จ"""
+        sent = 0
+        isolate = 0   # หลังชุดที่ถูกปฏิเสธ (400/409) ส่งทีละแถวเท่าจำนวนแถวในชุดนั้น เพื่อให้ failed แค่แถวที่เสีย
+        while True:
+            entries = self._pending(1 if isolate else JOURNAL_BATCH_SIZE)
+            if not entries:
+                return sent
+
+            # scan / insert ที่ติดกันรวมเป็นชุดเดียว, close ส่งทีละรายการ
+            kind = entries[0][1]
+            batch = [entries[0]]
+            if kind != "close":
+                for entry in entries[1:]:
+                    if entry[1] != kind:
+                        break
+                    batch.append(entry)
+
+            ids = [entry[0] for entry in batch]
+            started = time.perf_counter()
+            try:
+                await self._send(kind, batch)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status in (408, 429) or status >= 500:
+                    self._mark_retry(ids, f"{status}: {e.response.text[:200]}")
+                    raise
+                if kind == "scan" and status == 404:
+                    # ยังไม่ได้รัน sql/002_record_scan.sql: เก็บไว้เป็น pending จนกว่าจะมี function
+                    self._mark_retry(ids, f"{status}: {e.response.text[:200]}")
+                    print("❌ rpc record_scans not found: run sql/002_record_scan.sql or set RECORD_SCAN_RPC=0")
+                    raise
+                if status in (400, 409) and len(ids) > 1:
+                    isolate = len(ids)
+                    print(f"⚠️ Supabase rejected a batch of {len(ids)} ({status}), retrying one event at a time")
+                    continue
+                # 4xx อื่นๆ ส่งซ้ำก็ไม่ผ่าน: เก็บไว้ใน journal เป็น failed เพื่อไม่ให้บล็อกคิว
+                self._mark(ids, "failed", f"{status}: {e.response.text[:200]}")
+                print(f"❌ Supabase rejected {len(ids)} journal event(s) ({status}): {e.response.text[:200]}")
+                isolate = max(0, isolate - len(ids))
+                continue
+            except Exception as e:
+                self._mark_retry(ids, str(e) or e.__class__.__name__)
+                raise
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+            self._mark(ids, "sent")
+            self.sent += len(ids)
+            sent += len(ids)
+            isolate = max(0, isolate - len(ids))
+
+    def prune(self):
+        """ลบรายการที่ส่งแล้วเก่ากว่า JOURNAL_RETENTION"""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM journal WHERE state = 'sent' AND sent_at < ?", (time.time() - JOURNAL_RETENTION,)
+            )
+
+    async def run(self):
+        """flusher: ตื่นเมื่อมี append หรือทุก JOURNAL_FLUSH_INTERVAL วินาที"""
+        self._wake = asyncio.Event()
+        last_prune = 0.0
+        while True:
+            self._wake.clear()
+            try:
+                sent = await self.flush()
+                if sent:
+                    print(f"📤 Journal flushed {sent} event(s) ({self.last_flush_ms} ms)")
+                self._backoff = 0.0
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.retries += 1
+                self.last_error = str(e) or e.__class__.__name__
+                self._backoff = min(JOURNAL_MAX_BACKOFF, max(1.0, self._backoff * 2))
+                delay = self._backoff * random.uniform(0.8, 1.2)
+                print(f"⚠️ Journal flush failed ({self.pending_count()} pending), retry in {delay:.1f}s: {self.last_error}")
+                await asyncio.sleep(delay)
+                continue
+
+            if time.monotonic() - last_prune > 3600:
+                self.prune()
+                last_prune = time.monotonic()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=JOURNAL_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def checkin_rows(self):
+        """แถว checkins ทุกแถวที่ยังอยู่ใน journal ตามลำดับ (ใช้ rebuild สถานะผู้เข้าร่วม)"""
+        with self._lock:
+            payloads = self.conn.execute(
+                "SELECT payload FROM journal WHERE kind IN ('scan', 'insert') AND state != 'failed' ORDER BY id"
+            ).fetchall()
+        return [json.loads(p[0]) for p in payloads]
+
+    # -------------------------------------------------
+    # 📊 Metrics
+    # -------------------------------------------------
+    def pending_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM journal WHERE state = 'pending'").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, oldest = self.conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM journal WHERE state = 'pending'"
+            ).fetchone()
+            failed_total = self.conn.execute("SELECT COUNT(*) FROM journal WHERE state = 'failed'").fetchone()[0]
+        return {
+            "pending": pending,
+            "lag_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "sent": self.sent,
+            "failed": failed_total,
+            "retries": self.retries,
+            "backoff_s": self._backoff,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
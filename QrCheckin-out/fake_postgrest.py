@@ -0,0 +1,185 @@
+"""
+PostgREST ปลอมของตาราง genqrcode / checkins สำหรับทดสอบ QrCheckin-out แบบ offline
+
+    python fake_postgrest.py --port 54321 --uuids 5000 --latency-ms 40 --jitter-ms 20 --error-rate 0.02
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=x python server.py
+
+รองรับเฉพาะ query ที่ supabase_async.AsyncSupabase ใช้ (eq / gt / gte / is.null, order, offset, limit,
+PATCH ตาม filter, bulk POST ที่ ignore event_id ซ้ำ, rpc record_scan / record_scans)
+ข้อมูลอยู่ใน SQLite ผ่าน record_scan.py (หน่วยความจำ หรือไฟล์ด้วย --db สำหรับทำงาน offline)
+latency และ error (HTTP 503) ฉีดได้ต่อ request; /_stats บอกจำนวน request ต่อ table/method
+POST /_offline?on=true จำลองเน็ตล่ม (ทุก request ตอบ 503 จนกว่าจะ on=false)
+"""
+import argparse, asyncio, random, uuid as uuidlib
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+import record_scan
+
+RESERVED_PARAMS = ("select", "order", "limit", "offset", "on_conflict")
+
+
+class FakeDatabase:
+    def __init__(self, uuids: int = 1000, path: str = ":memory:"):
+        self.conn = record_scan.connect(path)
+        if self.conn.execute("SELECT COUNT(*) FROM genqrcode").fetchone()[0] == 0:
+            self.conn.executemany("INSERT INTO genqrcode (id, uuid) VALUES (?, ?)",
+                                  [(i, str(uuidlib.uuid4())) for i in range(1, uuids + 1)])
+        self.columns = {
+            table: [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            for table in ("genqrcode", "checkins")
+        }
+        self.requests = {}
+        self.injected_errors = 0
+        self.offline = False
+
+    def _column(self, table: str, column: str) -> str:
+        if column not in self.columns[table]:
+            raise ValueError(f"unknown column {table}.{column}")
+        return column
+
+    def _where(self, table: str, params) -> tuple:
+        """filter แบบ PostgREST: eq.x, gt.x, gte.x, is.null, not.is.null"""
+        clauses, args = [], []
+        for column, expr in params.items():
+            if column in RESERVED_PARAMS:
+                continue
+            column = self._column(table, column)
+            op, _, arg = expr.partition(".")
+            if op == "is":
+                clauses.append(f"{column} IS NULL")
+            elif op == "not":
+                clauses.append(f"{column} IS NOT NULL")
+            elif op in ("eq", "gt", "gte"):
+                clauses.append(f"{column} {dict(eq='=', gt='>', gte='>=')[op]} ?")
+                args.append(arg)
+            else:
+                raise ValueError(f"unsupported filter {column}={expr}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    def select(self, table: str, params) -> list:
+        columns = params.get("select", "*")
+        if columns != "*":
+            columns = ", ".join(self._column(table, c) for c in columns.split(","))
+        where, args = self._where(table, params)
+        order = []
+        for part in filter(None, (params.get("order") or "").split(",")):
+            column, _, direction = part.partition(".")
+            order.append(f"{self._column(table, column)} {'DESC' if direction == 'desc' else 'ASC'}")
+        sql = f"SELECT {columns} FROM {table}{where}"
+        if order:
+            sql += " ORDER BY " + ", ".join(order)
+        sql += f" LIMIT {int(params.get('limit', -1))} OFFSET {int(params.get('offset', 0))}"
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def insert(self, table: str, rows: list):
+        """bulk insert; แถวที่ event_id ซ้ำถูกข้าม (resolution=ignore-duplicates)"""
+        for row in rows:
+            columns = [self._column(table, c) for c in row if c != "id"]
+            self.conn.execute(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [row[c] for c in columns],
+            )
+
+    def update(self, table: str, params, changes: dict) -> list:
+        where, args = self._where(table, params)
+        assignments = ", ".join(f"{self._column(table, c)} = ?" for c in changes)
+        return [dict(row) for row in self.conn.execute(
+            f"UPDATE {table} SET {assignments}{where} RETURNING *", [*changes.values(), *args])]
+
+    def rpc(self, function: str, body: dict):
+        if function == "record_scan":
+            return record_scan.record_scan(self.conn, body.get("p_uuid"), body.get("p_booth"),
+                                           body.get("p_status", "IN"), body.get("p_event_id"), body.get("p_at"))
+        if function == "record_scans":
+            return record_scan.record_scans(self.conn, body.get("p_events") or [])
+        return None
+
+
+def create_app(db: FakeDatabase, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0) -> FastAPI:
+    app = FastAPI()
+
+    async def _inject(key: str):
+        """นับ request, หน่วงเวลา และคืน 503 ตามสัดส่วน error_rate (หรือทุก request ระหว่าง offline)"""
+        db.requests[key] = db.requests.get(key, 0) + 1
+        if db.offline:
+            return JSONResponse({"message": "offline"}, status_code=503)
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and random.random() < error_rate:
+            db.injected_errors += 1
+            return JSONResponse({"message": "injected failure"}, status_code=503)
+        return None
+
+    @app.get("/_stats")
+    async def stats():
+        count = lambda sql: db.conn.execute(sql).fetchone()[0]
+        return {
+            "requests": db.requests,
+            "injected_errors": db.injected_errors,
+            "checkins": count("SELECT COUNT(*) FROM checkins"),
+            "open_checkins": count("SELECT COUNT(*) FROM checkins WHERE checkout_time IS NULL"),
+            "multiple_open": count("SELECT COUNT(*) FROM (SELECT uuid FROM checkins WHERE checkout_time IS NULL "
+                                   "GROUP BY uuid HAVING COUNT(DISTINCT booth) > 1)"),
+        }
+
+    @app.post("/_offline")
+    async def offline(on: bool = True):
+        db.offline = on
+        return {"offline": db.offline}
+
+    @app.get("/_uuids")
+    async def uuids():
+        return [row[0] for row in db.conn.execute("SELECT uuid FROM genqrcode ORDER BY id")]
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        failure = await _inject(f"RPC {function}")
+        if failure:
+            return failure
+        result = db.rpc(function, await request.json())
+        if result is None:
+            return JSONResponse({"code": "PGRST202", "message": f"function {function} not found"}, status_code=404)
+        return result
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH"])
+    async def rest(table: str, request: Request):
+        failure = await _inject(f"{request.method} {table}")
+        if failure:
+            return failure
+        if table not in db.columns:
+            return JSONResponse({"message": f"relation {table} does not exist"}, status_code=404)
+
+        params = request.query_params
+        try:
+            if request.method == "GET":
+                return db.select(table, params)
+            body = await request.json()
+            if request.method == "POST":
+                db.insert(table, body if isinstance(body, list) else [body])
+                return Response(status_code=201)
+            return db.update(table, params, body)
+        except ValueError as e:
+            return JSONResponse({"message": str(e)}, status_code=400)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--uuids", type=int, default=1000, help="จำนวน QR ที่ถูกต้องใน genqrcode")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="สัดส่วน request ที่ตอบ 503")
+    parser.add_argument("--db", default=":memory:", help="ไฟล์ SQLite (เก็บข้อมูลข้ามการรีสตาร์ท)")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(FakeDatabase(args.uuids, args.db), args.latency_ms, args.jitter_ms, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+import asyncio, hmac, json, os, sqlite3, threading, time, uuid as uuid_lib
+from pathlib import Path
+import httpx
+from dotenv import load_dotenv
+from supabase_async import build_checkin_row
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+# URL ของบูธอื่นในวง LAN คั่นด้วย comma (ว่าง = ไม่ replicate ทำงานแบบเดิม)
+REPLICA_PEERS = [p.strip().rstrip("/") for p in os.getenv("REPLICA_PEERS", "").split(",") if p.strip()]
+REPLICA_PATH = os.getenv("REPLICA_PATH", str(Path(__file__).resolve().parent / "replica.db"))
+REPLICA_TOKEN = os.getenv("REPLICA_TOKEN", "")                        # shared secret ระหว่างบูธ (ต้องตั้งเมื่อมี REPLICA_PEERS)
+REPLICA_PULL_INTERVAL = float(os.getenv("REPLICA_PULL_INTERVAL", 1.0))
+REPLICA_TIMEOUT = float(os.getenv("REPLICA_TIMEOUT", 1.0))
+REPLICA_PEER_DEAD = float(os.getenv("REPLICA_PEER_DEAD", 300))        # peer ที่ติดต่อไม่ได้นานกว่านี้ไม่ถ่วง reconciler
+REPLICA_RETENTION = float(os.getenv("REPLICA_RETENTION", 86400))      # เก็บ log ที่ส่งเข้า journal แล้วกี่วินาที
+REPLICA_PAGE = int(os.getenv("REPLICA_PAGE", 500))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_log (
+    seq       INTEGER PRIMARY KEY AUTOINCREMENT,   -- ลำดับที่เข้ามาในเครื่องนี้ (cursor ของ peer ที่ดึง)
+    hlc       TEXT NOT NULL,                       -- hybrid logical clock ของบูธที่สแกน
+    event_id  TEXT NOT NULL UNIQUE,
+    uuid      TEXT NOT NULL,
+    origin    TEXT NOT NULL,
+    row       TEXT NOT NULL,                       -- แถว checkins (json)
+    state     TEXT NOT NULL DEFAULT 'pending'      -- pending | queued (ส่งเข้า journal แล้ว)
+);
+CREATE INDEX IF NOT EXISTS scan_log_uuid_hlc ON scan_log (uuid, hlc);
+CREATE INDEX IF NOT EXISTS scan_log_state_hlc ON scan_log (state, hlc);
+CREATE TABLE IF NOT EXISTS peers (url TEXT PRIMARY KEY, cursor INTEGER NOT NULL DEFAULT 0);
+"""
+
+
+# =====================================================
+# 🕰️ Hybrid logical clock
+# =====================================================
+class HybridClock:
+    """
+    HLC: (เวลา ms, counter, node) เขียนเป็น string ที่เรียงตามตัวอักษรได้
+    - ไม่ถอยหลังแม้นาฬิกาเครื่องถอย, เหตุการณ์ที่รับมาจากบูธอื่นดันนาฬิกาเราให้ตามทัน
+    - เหตุการณ์ที่เกิดหลังจากเห็นเหตุการณ์อื่นแล้วได้ค่ามากกว่าเสมอ แม้นาฬิกาของบูธจะไม่ตรงกัน
+    """
+
+    def __init__(self, node: str, wall=lambda: int(time.time() * 1000)):
+        self.node = node
+        self.wall = wall
+        self.millis = 0
+        self.counter = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def encode(millis: int, counter: int, node: str) -> str:
+        return f"{millis:013d}-{counter:05d}-{node}"
+
+    @staticmethod
+    def decode(stamp: str) -> tuple:
+        millis, counter, node = stamp.split("-", 2)
+        return int(millis), int(counter), node
+
+    def peek(self) -> str:
+        """ค่าปัจจุบันโดยไม่เดินนาฬิกา: เหตุการณ์ที่บูธนี้สร้างหลังจากนี้มากกว่าค่านี้เสมอ"""
+        with self._lock:
+            return self.encode(self.millis, self.counter, self.node)
+
+    def now(self) -> str:
+        with self._lock:
+            wall = self.wall()
+            if wall > self.millis:
+                self.millis, self.counter = wall, 0
+            else:
+                self.counter += 1
+            return self.encode(self.millis, self.counter, self.node)
+
+    def update(self, stamp: str):
+        """รับเหตุการณ์จากบูธอื่น"""
+        remote, remote_counter, _ = self.decode(stamp)
+        with self._lock:
+            wall = self.wall()
+            millis = max(self.millis, remote, wall)
+            if millis == self.millis == remote:
+                self.counter = max(self.counter, remote_counter) + 1
+            elif millis == self.millis:
+                self.counter += 1
+            elif millis == remote:
+                self.counter = remote_counter + 1
+            else:
+                self.counter = 0
+            self.millis = millis
+
+
+class _Peer:
+    def __init__(self, url: str, cursor: int, pushed: int):
+        self.url = url
+        self.cursor = cursor        # seq ล่าสุดของ peer ที่ดึงมาแล้ว
+        self.pushed = pushed        # seq ของเราที่ push ไปแล้ว
+        self.clock = None           # HLC ของ peer ตอนที่ดึง log ของมันมาครบล่าสุด
+        self.last_ok = 0.0
+        self.last_error = None
+        self.wake = asyncio.Event()
+
+    def alive(self, started: float) -> bool:
+        return time.monotonic() - (self.last_ok or started) < REPLICA_PEER_DEAD
+
+
+# =====================================================
+# 🛰️ LAN scan log replication
+# =====================================================
+class ScanReplica:
+    """
+    log การสแกนของทุกบูธในวง LAN (SQLite) ทำให้บูธตัดสิน auto-checkout ได้เองโดยไม่ต้องถาม Supabase
+    - สแกนของบูธนี้ได้ HLC แล้วถูก push ไปทุก peer ทันที (POST /replica/push)
+      และแต่ละบูธดึง log ของ peer ตาม seq ทุก REPLICA_PULL_INTERVAL วินาที (GET /replica/log) ชดเชยที่ push ไม่ถึง
+    - สถานะล่าสุดของแต่ละ uuid คือเหตุการณ์ที่ HLC มากที่สุด จึงได้ผลเดียวกันทุกบูธไม่ว่าเหตุการณ์มาถึงลำดับไหน
+    - reconciler: เหตุการณ์ที่ HLC ไม่เกินนาฬิกาของทุก peer ที่ยังติดต่อได้ (ไม่มีเหตุการณ์ที่เก่ากว่านี้มาเพิ่มแล้ว)
+      ถูกส่งเข้า CheckinJournal ตามลำดับ HLC แล้ว journal ส่งขึ้น Supabase เมื่อเน็ตกลับมา
+      ทุกบูธส่งประวัติที่รวมแล้วทั้งหมด (event_id ซ้ำถูกข้าม) สแกนของบูธที่ดับไประหว่างเน็ตล่มจึงไม่หาย
+    """
+
+    def __init__(self, booth: str, journal, participants, peers=REPLICA_PEERS, path: str = REPLICA_PATH,
+                 token: str = REPLICA_TOKEN, transport=None):
+        # ไม่มี token ใครก็ได้ในวง LAN POST check-in ปลอมเข้า /replica/push แล้ว journal ส่งต่อขึ้น Supabase
+        if not token:
+            raise RuntimeError("REPLICA_PEERS is set but REPLICA_TOKEN is empty: set the same secret on every booth")
+        # แถวที่ replicate ต้องเขียนผ่าน record_scans (ปิด visit ของบูธอื่นใน transaction เดียวกัน)
+        if not journal.rpc:
+            raise RuntimeError("LAN replication needs RECORD_SCAN_RPC=1 (run sql/002_record_scan.sql first)")
+        self.booth = booth
+        self.journal = journal
+        self.participants = participants
+        self.token = token
+        self.clock = HybridClock(booth)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.latest = {}            # uuid -> (hlc, booth, status) ของเหตุการณ์ล่าสุด
+        for uuid, hlc, row in self.conn.execute("SELECT uuid, hlc, row FROM scan_log ORDER BY hlc"):
+            row = json.loads(row)
+            self.latest[uuid] = (hlc, row.get("booth"), (row.get("status") or "").upper())
+            self.clock.update(hlc)
+        cursors = dict(self.conn.execute("SELECT url, cursor FROM peers"))
+        last_seq = self.last_seq()
+        self.peers = [_Peer(url, cursors.get(url, 0), last_seq) for url in peers]
+        self.started = time.monotonic()
+        self.received = 0
+        self.queued = 0
+        self.late = 0
+        self.client = httpx.AsyncClient(
+            timeout=REPLICA_TIMEOUT, transport=transport,
+            headers={"X-Replica-Token": token},
+        )
+        if self.latest:
+            print(f"🛰️ Loaded {len(self.latest)} participants from LAN scan log {path}")
+
+    # -------------------------------------------------
+    # 🔍 Local decisions
+    # -------------------------------------------------
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self.latest
+
+    def open_booth(self, uuid: str):
+        """บูธที่ uuid เปิด check-in ค้างตามเหตุการณ์ล่าสุด (HLC) ใน log"""
+        latest = self.latest.get(uuid)
+        return latest[1] if latest and latest[2] == "IN" else None
+
+    def authorized(self, token: str) -> bool:
+        return hmac.compare_digest((token or "").encode(), self.token.encode())
+
+    # -------------------------------------------------
+    # ✍️ Log
+    # -------------------------------------------------
+    def last_seq(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM scan_log").fetchone()[0]
+
+    def _insert(self, entry: dict) -> bool:
+        """เพิ่มเหตุการณ์ลง log (ข้าม event_id ที่มีอยู่แล้ว) และอัปเดตสถานะล่าสุดของ uuid ตาม HLC"""
+        row = entry["row"]
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO scan_log (hlc, event_id, uuid, origin, row) VALUES (?, ?, ?, ?, ?)",
+                (entry["hlc"], row["event_id"], row["uuid"], entry["origin"], json.dumps(row)),
+            )
+        if cursor.rowcount == 0:
+            return False
+        current = self.latest.get(row["uuid"])
+        if current is None or entry["hlc"] > current[0]:
+            self.latest[row["uuid"]] = (entry["hlc"], row.get("booth"), (row.get("status") or "").upper())
+        return True
+
+    def record(self, uuid: str, status: str) -> dict:
+        """บันทึกสแกนของบูธนี้ลง log แล้วปลุก peer ให้ push คืนแถว checkins (แทน journal.checkin)"""
+        row = build_checkin_row(uuid, status, self.booth)
+        row["event_id"] = uuid_lib.uuid4().hex
+        self._insert({"hlc": self.clock.now(), "origin": self.booth, "row": row})
+        for peer in self.peers:
+            peer.wake.set()
+        return row
+
+    def apply(self, entries: list) -> int:
+        """รับเหตุการณ์จาก peer (push หรือ pull) คืนจำนวนที่ใหม่จริง"""
+        applied = 0
+        for entry in entries:
+            self.clock.update(entry["hlc"])
+            if not self._insert(entry):
+                continue
+            row = entry["row"]
+            applied += 1
+            # สถานะ open_booth / หน้าจอ / rollup เหมือนแถวที่ sync มาจาก Supabase
+            if self.latest[row["uuid"]][0] == entry["hlc"]:
+                self.participants.apply_checkin_row(row)
+            self.participants.attendance.record(row)
+        self.received += applied
+        return applied
+
+    def entries_after(self, seq: int, limit: int = REPLICA_PAGE) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, hlc, origin, row FROM scan_log WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+            ).fetchall()
+        return [{"seq": s, "hlc": h, "origin": o, "row": json.loads(r)} for s, h, o, r in rows]
+
+    # -------------------------------------------------
+    # 🔄 Peer sync (HTTP)
+    # -------------------------------------------------
+    async def _push(self, peer: _Peer):
+        """ส่งสแกนของบูธนี้ที่ peer ยังไม่ได้รับ (push ไม่สำเร็จก็ไม่เป็นไร peer จะดึงเอง)"""
+        page = self.entries_after(peer.pushed)
+        entries = [e for e in page if e["origin"] == self.booth]
+        try:
+            if entries:
+                response = await self.client.post(f"{peer.url}/replica/push", json={"entries": entries})
+                response.raise_for_status()
+        finally:
+            if page:
+                peer.pushed = page[-1]["seq"]
+
+    async def _pull(self, peer: _Peer) -> int:
+        """ดึง log ของ peer ตั้งแต่ cursor จนหมด แล้วจำ HLC ของ peer ไว้คำนวณ watermark"""
+        pulled = 0
+        while True:
+            response = await self.client.get(f"{peer.url}/replica/log",
+                                             params={"after": peer.cursor, "limit": REPLICA_PAGE})
+            response.raise_for_status()
+            data = response.json()
+            entries = data["entries"]
+            pulled += self.apply(entries)
+            if entries:
+                peer.cursor = entries[-1]["seq"]
+                with self._lock:
+                    self.conn.execute("INSERT OR REPLACE INTO peers (url, cursor) VALUES (?, ?)",
+                                      (peer.url, peer.cursor))
+            if len(entries) < REPLICA_PAGE:
+                peer.clock = data["clock"]
+                self.clock.update(data["clock"])
+                return pulled
+
+    async def _peer_loop(self, peer: _Peer):
+        was_up = True
+        while True:
+            peer.wake.clear()
+            try:
+                await self._push(peer)
+                pulled = await self._pull(peer)
+                peer.last_ok = time.monotonic()
+                peer.last_error = None
+                if not was_up:
+                    print(f"🛰️ Replica peer {peer.url} back online (+{pulled} events)")
+                was_up = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                peer.last_error = str(e) or e.__class__.__name__
+                if was_up:
+                    print(f"⚠️ Replica peer {peer.url} unreachable: {peer.last_error}")
+                was_up = False
+            try:
+                await asyncio.wait_for(peer.wake.wait(), timeout=REPLICA_PULL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    # -------------------------------------------------
+    # 📤 Reconciler
+    # -------------------------------------------------
+    def watermark(self):
+        """HLC ที่ทุกเหตุการณ์ที่ไม่เกินค่านี้อยู่ใน log แล้ว (None = ยังรอ peer ที่เพิ่งเริ่ม)"""
+        marks = [self.clock.peek()]
+        for peer in self.peers:
+            if not peer.alive(self.started):
+                continue
+            if peer.clock is None:
+                return None
+            marks.append(peer.clock)
+        return min(marks)
+
+    def reconcile(self) -> int:
+        """
+        ส่งเหตุการณ์ที่นิ่งแล้วเข้า journal ตามลำดับ HLC คืนจำนวนที่ส่ง
+        peer ที่ถูกข้ามไป (เกิน REPLICA_PEER_DEAD) แล้วกลับมาส่งเหตุการณ์เก่า: ถ้า uuid เดียวกันมีเหตุการณ์ที่ใหม่กว่า
+        ส่งเข้า journal ไปแล้ว เหตุการณ์ที่มาช้าถูกเขียนเป็นประวัติ (IN ปิดที่เวลาของเหตุการณ์ถัดไป) ไม่ปิด visit ปัจจุบัน
+        """
+        mark = self.watermark()
+        if mark is None:
+            return 0
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, hlc, uuid, row FROM scan_log WHERE state = 'pending' AND hlc <= ? ORDER BY hlc", (mark,)
+            ).fetchall()
+        for _, hlc, uuid, row in rows:
+            row = json.loads(row)
+            later = self._queued_after(uuid, hlc)
+            if later is None:
+                self.journal.append_scan(row)
+                continue
+            if (row.get("status") or "").upper() == "IN" and not row.get("checkout_time"):
+                row["checkout_time"] = later.get("last_updated")
+            self.journal.append_scan(row, history=True)
+            self.late += 1
+        with self._lock:
+            self.conn.executemany("UPDATE scan_log SET state = 'queued' WHERE seq = ?", [(r[0],) for r in rows])
+        self.queued += len(rows)
+        return len(rows)
+
+    def _queued_after(self, uuid: str, hlc: str):
+        """แถวแรกของ uuid นี้ที่ HLC มากกว่า hlc และส่งเข้า journal ไปแล้ว (None = เหตุการณ์นี้ยังเป็นลำดับล่าสุด)"""
+        with self._lock:
+            found = self.conn.execute(
+                "SELECT row FROM scan_log WHERE uuid = ? AND hlc > ? AND state = 'queued' ORDER BY hlc LIMIT 1",
+                (uuid, hlc),
+            ).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def prune(self):
+        """ลบเหตุการณ์ที่ส่งเข้า journal แล้วเก่ากว่า REPLICA_RETENTION (สถานะล่าสุดใน latest ยังอยู่)"""
+        cutoff = HybridClock.encode(int((time.time() - REPLICA_RETENTION) * 1000), 0, "")
+        with self._lock:
+            self.conn.execute("DELETE FROM scan_log WHERE state = 'queued' AND hlc < ?", (cutoff,))
+
+    async def run(self):
+        """peer loop ละหนึ่ง task และ reconciler ทุก REPLICA_PULL_INTERVAL วินาที"""
+        tasks = [asyncio.create_task(self._peer_loop(peer)) for peer in self.peers]
+        print(f"🛰️ LAN replication with {len(self.peers)} peer(s): {', '.join(p.url for p in self.peers)}")
+        last_prune = time.monotonic()
+        try:
+            while True:
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    print(f"⚠️ Replica reconcile failed: {e}")
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+                await asyncio.sleep(REPLICA_PULL_INTERVAL)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # -------------------------------------------------
+    # 📊 Metrics
+    # -------------------------------------------------
+    def pending_count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM scan_log WHERE state = 'pending'").fetchone()[0]
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "clock": self.clock.peek(),
+            "watermark": self.watermark(),
+            "participants": len(self.latest),
+            "log_seq": self.last_seq(),
+            "pending": self.pending_count(),
+            "received": self.received,
+            "queued": self.queued,
+            "late": self.late,
+            "peers": [{
+                "url": p.url,
+                "cursor": p.cursor,
+                "clock": p.clock,
+                "last_ok_age_s": round(now - p.last_ok, 1) if p.last_ok else None,
+                "alive": p.alive(self.started),
+                "last_error": p.last_error,
+            } for p in self.peers],
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,380 @@
+"""
+Load test ของ QrCheckin-out แบบ offline (ไม่ต้องมีเครื่องสแกนหรือ Supabase จริง)
+
+    python loadtest.py --booths 3 --rate 20 --duration 60 --latency-ms 40 --error-rate 0.01 --json result.json
+
+- รัน fake_postgrest.py (latency / error ฉีดได้) และ server.py หนึ่งโปรเซสต่อบูธ (SCAN_INJECT=1)
+- ผู้เข้าร่วมจำลองเดินระหว่างบูธ: check-in, ย้ายบูธ (auto-checkout), check-out, สแกนซ้ำ, QR ปลอม
+  ส่งสแกนแบบ open-loop (Poisson) ผ่าน POST /debug/scan
+- WebSocket client ต่อบูธวัดเวลาตั้งแต่ส่งสแกนจนได้รับข้อความแรกของ uuid นั้น
+- --replicate: บูธ replicate log การสแกนกันเอง (REPLICA_PEERS), --outage: fake PostgREST ล่มช่วงกลางการทดสอบ
+ค่า env อื่นของบูธ (เช่น SCAN_WORKERS, STATE_SYNC_INTERVAL) ส่งผ่านจาก environment ของโปรเซสนี้
+"""
+import argparse, asyncio, json, os, random, shutil, socket, subprocess, sys, tempfile, time, uuid as uuidlib
+from collections import deque
+from pathlib import Path
+import httpx, websockets
+
+HERE = Path(__file__).resolve().parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))], 2)
+
+
+def start_process(args: list, env: dict, log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, *args], cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_until(client: httpx.AsyncClient, url: str, ready, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get(url)
+            if response.status_code == 200 and ready(response.json()):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+# =====================================================
+# 🚶 Synthetic participants
+# =====================================================
+class ScanGenerator:
+    """
+    เลือกสแกนถัดไปจากผู้เข้าร่วมที่กำลังเดินงาน (active) ตามสัดส่วนพฤติกรรม
+    ผู้ที่ check-out แล้วออกจากงานและถูกแทนด้วยคนใหม่จาก uuid ที่เหลือ
+    """
+
+    def __init__(self, uuids: list, booths: list, active: int, hop: float, checkout: float,
+                 duplicate: float, invalid: float, seed: int = None):
+        self.rng = random.Random(seed)
+        self.waiting = list(uuids)
+        self.rng.shuffle(self.waiting)
+        self.booths = booths
+        self.active = {}   # uuid -> บูธที่เปิด check-in ค้างอยู่ (None = ยังไม่ได้ check-in)
+        for _ in range(min(active, len(self.waiting))):
+            self.active[self.waiting.pop()] = None
+        self.hop, self.checkout, self.duplicate, self.invalid = hop, checkout, duplicate, invalid
+        self.last = None
+
+    def next(self):
+        """คืน (booth, uuid, kind)"""
+        r = self.rng.random()
+        if r < self.invalid or not self.active:
+            return self.rng.choice(self.booths), str(uuidlib.uuid4()), "invalid"
+        if r < self.invalid + self.duplicate and self.last:
+            return self.last[0], self.last[1], "duplicate"
+
+        uuid = self.rng.choice(list(self.active))
+        current = self.active[uuid]
+        if current is None:
+            booth, kind = self.rng.choice(self.booths), "checkin"
+            self.active[uuid] = booth
+        elif len(self.booths) > 1 and self.rng.random() < self.hop / (self.hop + self.checkout):
+            booth, kind = self.rng.choice([b for b in self.booths if b != current]), "hop"
+            self.active[uuid] = booth
+        else:
+            booth, kind = current, "checkout"
+            del self.active[uuid]
+            if self.waiting:
+                self.active[self.waiting.pop()] = None
+        self.last = (booth, uuid)
+        return booth, uuid, kind
+
+
+# =====================================================
+# 📺 Display client
+# =====================================================
+class DisplayClient:
+    """WebSocket ของหน้าจอหนึ่งเครื่อง: จับคู่ข้อความกับสแกนที่รออยู่ตาม uuid (ตามลำดับ)"""
+
+    def __init__(self, booth: str, url: str):
+        self.booth = booth
+        self.url = url
+        self.pending = {}        # uuid -> deque ของเวลาที่ส่งสแกน
+        self.latencies = []      # ms
+        self.outcomes = {}
+        self.messages = 0
+        self.task = None
+
+    def expect(self, uuid: str, sent_at: float):
+        self.pending.setdefault(uuid, deque()).append(sent_at)
+
+    def cancel(self, uuid: str, sent_at: float):
+        queue = self.pending.get(uuid)
+        if queue and sent_at in queue:
+            queue.remove(sent_at)
+
+    def pending_count(self) -> int:
+        return sum(len(q) for q in self.pending.values())
+
+    async def run(self, connected: asyncio.Event):
+        async with websockets.connect(self.url, max_queue=None) as ws:
+            connected.set()
+            async for text in ws:
+                now = time.perf_counter()
+                self.messages += 1
+                data = json.loads(text)
+                queue = self.pending.get(data.get("uuid"))
+                if not queue:
+                    continue   # snapshot หรือข้อความที่สองของสแกนเดียวกัน (auto_checkout → checkin)
+                self.latencies.append((now - queue.popleft()) * 1000)
+                kind = data.get("type", "unknown")
+                self.outcomes[kind] = self.outcomes.get(kind, 0) + 1
+
+
+# =====================================================
+# 🚀 Load test
+# =====================================================
+async def run_load(args, booth_urls: dict, fake_url: str) -> dict:
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        uuids = (await client.get(f"{fake_url}/_uuids")).json()
+        generator = ScanGenerator(uuids, list(booth_urls), args.participants, args.hop, args.checkout,
+                                  args.duplicate, args.invalid, args.seed)
+
+        displays = {booth: [] for booth in booth_urls}
+        for booth, url in booth_urls.items():
+            for _ in range(args.ws_clients):
+                display = DisplayClient(booth, url.replace("http://", "ws://") + "/ws")
+                connected = asyncio.Event()
+                display.task = asyncio.create_task(display.run(connected))
+                await asyncio.wait_for(connected.wait(), timeout=10)
+                displays[booth].append(display)
+
+        sent, inject_errors, kinds = 0, 0, {}
+        in_flight = set()
+
+        async def inject(booth: str, uuid: str):
+            nonlocal inject_errors
+            sent_at = time.perf_counter()
+            for display in displays[booth]:
+                display.expect(uuid, sent_at)
+            try:
+                response = await client.post(f"{booth_urls[booth]}/debug/scan", params={"uuid": uuid})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                inject_errors += 1
+                for display in displays[booth]:
+                    display.cancel(uuid, sent_at)
+
+        async def outage():
+            """ตัด fake PostgREST ช่วงกลางการทดสอบ (บูธต้องทำงานต่อได้และส่งข้อมูลที่ค้างเมื่อกลับมา)"""
+            await asyncio.sleep(max(0.0, (args.duration - args.outage) / 2))
+            await client.post(f"{fake_url}/_offline", params={"on": "true"})
+            print(f"🔌 Supabase offline for {args.outage:.0f}s")
+            await asyncio.sleep(args.outage)
+            await client.post(f"{fake_url}/_offline", params={"on": "false"})
+            print("🔌 Supabase back online")
+
+        if args.outage:
+            in_flight.add(asyncio.create_task(outage()))
+
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < args.duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            booth, uuid, kind = generator.next()
+            kinds[kind] = kinds.get(kind, 0) + 1
+            sent += 1
+            task = asyncio.create_task(inject(booth, uuid))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            next_at += rng.expovariate(args.rate)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+        # รอข้อความที่ยังไม่มาถึง แล้วนับที่เหลือเป็น lost
+        drain_deadline = time.monotonic() + args.drain
+        all_displays = [d for ds in displays.values() for d in ds]
+        while time.monotonic() < drain_deadline and any(d.pending_count() for d in all_displays):
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+
+        # รอ journal (และ replica) ส่งรายการที่ค้างขึ้น Supabase ให้หมด ที่เหลือนับเป็น journal_pending
+        async def backlog(url: str) -> int:
+            pending = (await client.get(f"{url}/metrics/journal")).json().get("pending", 0)
+            return pending + (await client.get(f"{url}/metrics/replica")).json().get("pending", 0)
+
+        while time.monotonic() < drain_deadline + args.drain:
+            if not sum([await backlog(url) for url in booth_urls.values()]):
+                break
+            await asyncio.sleep(0.5)
+
+        booth_stats = {}
+        for booth, url in booth_urls.items():
+            booth_stats[booth] = {
+                "scans": (await client.get(f"{url}/metrics/scans")).json(),
+                "journal": (await client.get(f"{url}/metrics/journal")).json(),
+                "replica": (await client.get(f"{url}/metrics/replica")).json(),
+                "slowest": (await client.get(f"{url}/debug/slow-scans", params={"limit": 3})).json(),
+            }
+        fake_stats = (await client.get(f"{fake_url}/_stats")).json()
+
+        for display in all_displays:
+            display.task.cancel()
+        await asyncio.gather(*(d.task for d in all_displays), return_exceptions=True)
+
+    # latency วัดจากหน้าจอแรกของแต่ละบูธ (หน้าจออื่นใช้ดูผลของ fan-out)
+    primary = [ds[0] for ds in displays.values()]
+    latencies = sorted(ms for d in primary for ms in d.latencies)
+    fanout = sorted(ms for d in all_displays for ms in d.latencies)
+    outcomes = {}
+    for display in primary:
+        for kind, count in display.outcomes.items():
+            outcomes[kind] = outcomes.get(kind, 0) + count
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "elapsed_s": round(elapsed, 2),
+        "sent": sent,
+        "broadcast": len(latencies),
+        "scans_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+        "all_displays_p99_ms": percentile(fanout, 0.99),
+        "errors": {
+            "inject": inject_errors,
+            "lost": sum(d.pending_count() for d in primary),
+            "scan_failed": sum(s["scans"].get("failed", 0) for s in booth_stats.values()),
+            "scan_dropped": sum(s["scans"].get("dropped", 0) for s in booth_stats.values()),
+            "journal_pending": sum(s["journal"].get("pending", 0) for s in booth_stats.values()),
+            "replica_pending": sum(s["replica"].get("pending", 0) for s in booth_stats.values()),
+            "supabase_injected": fake_stats["injected_errors"],
+            "multiple_open": fake_stats["multiple_open"],
+        },
+        "scan_kinds": kinds,
+        "outcomes": outcomes,
+        "booths": booth_stats,
+        "fake_postgrest": fake_stats,
+    }
+
+
+def print_report(result: dict):
+    latency, errors = result["latency_ms"], result["errors"]
+    print(f"📈 {result['sent']} scans sent, {result['broadcast']} broadcast in {result['elapsed_s']}s "
+          f"→ {result['scans_per_s']} scans/s")
+    print(f"⏱️ scan→broadcast p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, "
+          f"max {latency['max']} ms (all displays p99 {result['all_displays_p99_ms']} ms)")
+    print(f"🧪 kinds {result['scan_kinds']}")
+    print(f"📺 outcomes {result['outcomes']}")
+    print(f"❗ errors {errors}")
+    for booth, stats in result["booths"].items():
+        total = stats["scans"].get("latency_ms", {}).get("total", {})
+        print(f"   {booth}: processed {stats['scans'].get('processed')}, queue total p95 {total.get('p95_ms')} ms, "
+              f"journal pending {stats['journal'].get('pending')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--booths", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=10.0, help="สแกนต่อวินาที (รวมทุกบูธ)")
+    parser.add_argument("--duration", type=float, default=30.0, help="วินาที")
+    parser.add_argument("--drain", type=float, default=10.0, help="วินาทีที่รอข้อความที่ค้างหลังหยุดส่ง")
+    parser.add_argument("--participants", type=int, default=200, help="ผู้เข้าร่วมที่เดินงานพร้อมกัน")
+    parser.add_argument("--uuids", type=int, default=5000, help="จำนวน QR ที่ถูกต้อง")
+    parser.add_argument("--hop", type=float, default=0.6, help="น้ำหนักการย้ายบูธ (auto-checkout)")
+    parser.add_argument("--checkout", type=float, default=0.4, help="น้ำหนักการ check-out ที่บูธเดิม")
+    parser.add_argument("--duplicate", type=float, default=0.05, help="สัดส่วนสแกนซ้ำทันที")
+    parser.add_argument("--invalid", type=float, default=0.02, help="สัดส่วน QR ปลอม")
+    parser.add_argument("--ws-clients", type=int, default=1, help="หน้าจอต่อบูธ")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latency ของ fake PostgREST")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="สัดส่วน request ที่ fake PostgREST ตอบ 503")
+    parser.add_argument("--replicate", action="store_true", help="บูธ replicate log การสแกนกันในวง LAN")
+    parser.add_argument("--outage", type=float, default=0, help="วินาทีที่ fake PostgREST ล่มกลางการทดสอบ")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="เขียนผลเป็น JSON (ใช้เทียบ regression)")
+    parser.add_argument("--keep", action="store_true", help="ไม่ลบโฟลเดอร์ log / state ของบูธหลังจบ")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="qrcheckin-load-"))
+    print(f"🗂️ Logs and state in {workdir}")
+    fake_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    processes = [start_process(
+        ["fake_postgrest.py", "--port", str(fake_port), "--uuids", str(args.uuids),
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--error-rate", str(args.error_rate)],
+        dict(os.environ), workdir / "fake_postgrest.log",
+    )]
+
+    ports = {f"Load-Booth-{i}": free_port() for i in range(1, args.booths + 1)}
+    booth_urls = {}
+    for booth, port in ports.items():
+        env = dict(os.environ)
+        if args.replicate:
+            env.setdefault("REPLICA_PULL_INTERVAL", "0.5")
+            env.update(
+                REPLICA_PEERS=",".join(f"http://127.0.0.1:{p}" for b, p in ports.items() if b != booth),
+                REPLICA_PATH=str(workdir / f"{booth}-replica.db"),
+                REPLICA_TOKEN=env.get("REPLICA_TOKEN") or "loadtest",
+            )
+        env.setdefault("STATE_SYNC_INTERVAL", "1")
+        env.setdefault("JOURNAL_FLUSH_INTERVAL", "0.5")
+        env.setdefault("RECORD_SCAN_RPC", "1")   # fake_postgrest มี rpc record_scans
+        env.update(
+            BASE_NAME=booth,
+            SUPABASE_URL=fake_url,
+            SUPABASE_KEY="loadtest",
+            SCAN_INJECT="1",
+            UUID_CACHE_PATH=str(workdir / f"{booth}-uuids.json"),
+            JOURNAL_PATH=str(workdir / f"{booth}-journal.db"),
+            STATE_PATH=str(workdir / f"{booth}-state.db"),
+        )
+        processes.append(start_process(
+            ["-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            env, workdir / f"{booth}.log",
+        ))
+        booth_urls[booth] = f"http://127.0.0.1:{port}"
+
+    async def _run():
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            await wait_until(client, f"{fake_url}/_stats", lambda _: True)
+            # รอให้ทุกบูธโหลด uuid ครบ ไม่งั้น QR ที่ถูกต้องจะถูกนับเป็น invalid
+            for url in booth_urls.values():
+                await wait_until(client, f"{url}/metrics/uuid-cache", lambda s: s.get("uuids", 0) >= args.uuids,
+                                 timeout=60)
+        return await run_load(args, booth_urls, fake_url)
+
+    try:
+        result = asyncio.run(_run())
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if args.keep:
+            print(f"🗂️ Kept logs and state in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(result)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2, ensure_ascii=False))
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
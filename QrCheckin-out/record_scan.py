@@ -0,0 +1,98 @@
+import datetime, sqlite3
+
+# =====================================================
+# 🗄️ SQLite schema (genqrcode / checkins แบบเดียวกับ Supabase)
+# =====================================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS genqrcode (
+    id    INTEGER PRIMARY KEY,
+    uuid  TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS checkins (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid           TEXT NOT NULL,
+    booth          TEXT,
+    status         TEXT,
+    checkin_time   TEXT,
+    checkout_time  TEXT,
+    last_updated   TEXT,
+    event_id       TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS checkins_uuid_open ON checkins (uuid, checkout_time);
+CREATE INDEX IF NOT EXISTS checkins_last_updated ON checkins (last_updated);
+"""
+
+
+def connect(path: str = ":memory:") -> sqlite3.Connection:
+    """เปิดฐานข้อมูล checkins ในเครื่อง (autocommit; record_scan เปิด transaction เอง)"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# =====================================================
+# 🧾 record_scan (เหมือน sql/002_record_scan.sql)
+# =====================================================
+def _record(conn: sqlite3.Connection, uuid: str, booth: str, status: str, event_id: str, at: str) -> dict:
+    status = (status or "IN").upper()
+    at = at or datetime.datetime.now().isoformat(timespec="seconds")
+    result = {"uuid": uuid, "booth": booth, "event_id": event_id}
+
+    if conn.execute("SELECT 1 FROM genqrcode WHERE uuid = ?", (uuid,)).fetchone() is None:
+        return {"result": "invalid", **result}
+    if event_id and conn.execute("SELECT 1 FROM checkins WHERE event_id = ?", (event_id,)).fetchone():
+        return {"result": "duplicate", **result}
+
+    previous = None
+    if status == "IN":
+        # ปิดทุก visit ที่เปิดค้าง (รวมแถวเก่าที่ค้าง); auto-checkout จากบูธอื่นของ visit ล่าสุด (id มากสุด)
+        closed = conn.execute(
+            "UPDATE checkins SET checkout_time = ? WHERE uuid = ? AND checkout_time IS NULL RETURNING id, booth",
+            (at, uuid),
+        ).fetchall()
+        previous = max(((row[0], row[1]) for row in closed if row[1] != booth), default=(None, None))[1]
+        conn.execute(
+            "INSERT INTO checkins (uuid, booth, status, checkin_time, checkout_time, last_updated, event_id) "
+            "VALUES (?, ?, 'IN', ?, NULL, ?, ?)",
+            (uuid, booth, at, at, event_id),
+        )
+        kind = "auto_checkout" if previous else "checkin"
+    else:
+        closed = conn.execute(
+            "UPDATE checkins SET checkout_time = ? WHERE uuid = ? AND checkout_time IS NULL AND booth = ? "
+            "AND status = 'IN' RETURNING id",
+            (at, uuid, booth),
+        ).fetchall()
+        conn.execute(
+            "INSERT INTO checkins (uuid, booth, status, checkin_time, checkout_time, last_updated, event_id) "
+            "VALUES (?, ?, ?, NULL, ?, ?, ?)",
+            (uuid, booth, status, at, at, event_id),
+        )
+        kind = "checkout"
+    return {"result": kind, **result, "status": status, "previous_booth": previous,
+            "closed": len(closed), "at": at}
+
+
+def record_scan(conn: sqlite3.Connection, uuid: str, booth: str, status: str = "IN",
+                event_id: str = None, at: str = None) -> dict:
+    """ตรวจ uuid, ปิด visit ที่เปิดค้าง และเปิด/ปิด visit ใหม่ใน transaction เดียว (BEGIN IMMEDIATE)"""
+    return record_scans(conn, [{"uuid": uuid, "booth": booth, "status": status,
+                                "event_id": event_id, "last_updated": at}])[0]
+
+
+def record_scans(conn: sqlite3.Connection, events: list) -> list:
+    """แถว checkins หลายแถว (จาก build_checkin_row) ตามลำดับ ทั้งชุดสำเร็จหรือไม่มีผลเลย"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        results = [
+            _record(conn, e.get("uuid"), e.get("booth"), e.get("status"), e.get("event_id"), e.get("last_updated"))
+            for e in events
+        ]
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return results
@@ -0,0 +1,105 @@
+import asyncio, os, time, zlib
+from dotenv import load_dotenv
+from supabase_async import CallMetrics
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 4))
+SCAN_QUEUE_SIZE = int(os.getenv("SCAN_QUEUE_SIZE", 256))   # ต่อ worker
+
+
+# =====================================================
+# 🧵 Scan queue + worker pool
+# =====================================================
+class ScanPipeline:
+    """
+    คิวรับ uuid จาก scanner thread แล้วกระจายให้ worker (asyncio task) บน event loop
+    - uuid เดียวกันลงคิวของ worker ตัวเดิมเสมอ (crc32 % workers) จึงถูกประมวลผลตามลำดับการสแกน
+      ส่วน uuid ต่างกันทำงานพร้อมกันได้
+    - submit() จาก thread ไหนก็ได้และไม่บล็อก scanner; คิวเต็มแล้วสแกนนั้นถูกทิ้ง (นับใน dropped)
+    - เก็บ latency ของการรอในคิว (wait) และการประมวลผล (process)
+    - tracer (ScanTracer): เปิด trace ให้แต่ละสแกนระหว่างที่ handler ทำงาน
+    """
+
+    def __init__(self, handler, workers: int = SCAN_WORKERS, queue_size: int = SCAN_QUEUE_SIZE, tracer=None):
+        self.handler = handler
+        self.tracer = tracer
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.loop = None
+        self.queues = []
+        self.tasks = []
+        self.metrics = CallMetrics()
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        """เรียกบน event loop (ตอน startup)"""
+        self.loop = asyncio.get_running_loop()
+        self.queues = [asyncio.Queue(self.queue_size) for _ in range(self.workers)]
+        self.tasks = [asyncio.create_task(self._worker(q)) for q in self.queues]
+
+    def _enqueue(self, uuid: str, scanned_at: float):
+        queue = self.queues[zlib.crc32(uuid.encode()) % self.workers]
+        try:
+            queue.put_nowait((uuid, scanned_at))
+            self.submitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"⚠️ Scan queue full, dropped: {uuid}")
+
+    def submit(self, uuid: str) -> bool:
+        """thread-safe: ส่ง uuid เข้าคิว คืน False ถ้า event loop ยังไม่พร้อม"""
+        if not (self.loop and self.loop.is_running()):
+            return False
+        self.loop.call_soon_threadsafe(self._enqueue, uuid, time.perf_counter())
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            uuid, scanned_at = await queue.get()
+            started = time.perf_counter()
+            wait_ms = (started - scanned_at) * 1000
+            self.metrics.record("wait", wait_ms, True)
+            trace = self.tracer.start(uuid, wait_ms) if self.tracer else None
+            ok = False
+            try:
+                await self.handler(uuid)
+                ok = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Scan handling failed for {uuid}: {e}")
+            finally:
+                now = time.perf_counter()
+                self.metrics.record("process", (now - started) * 1000, ok)
+                self.metrics.record("total", (now - scanned_at) * 1000, ok)
+                if trace:
+                    self.tracer.finish(*trace, ok=ok)
+                self.processed += 1
+                queue.task_done()
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "depth": self.depth(),
+            "depth_per_worker": [q.qsize() for q in self.queues],
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "latency_ms": self.metrics.snapshot(),
+        }
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
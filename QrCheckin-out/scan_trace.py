@@ -0,0 +1,163 @@
+import bisect, contextvars, datetime, os, time
+from collections import deque
+from dotenv import load_dotenv
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", 500))      # จำนวนสแกนล่าสุดที่เก็บ trace ไว้ดูใน /debug/slow-scans
+SLOW_SCAN_MS = float(os.getenv("SLOW_SCAN_MS", 500))      # สแกนที่ช้ากว่านี้ print เตือน (0 = ปิด)
+
+# วินาที: ตั้งแต่ lookup ในเครื่อง (~0.1 ms) ถึง Supabase call ที่ timeout (SUPABASE_TIMEOUT)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("scan_trace", default=None)
+
+
+# =====================================================
+# ⏱️ Per-scan trace
+# =====================================================
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is not None:
+            self.trace.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class ScanTrace:
+    """เวลาของแต่ละขั้นในการประมวลผลสแกนหนึ่งครั้ง (span ซ้อนกันได้ เช่น supabase.* อยู่ใน open_booth)"""
+
+    def __init__(self, uuid: str, wait_ms: float = 0.0):
+        self.uuid = uuid
+        self.wait_ms = wait_ms
+        self.started = time.perf_counter()
+        self.started_at = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.spans = []          # (name, start_ms จากต้นสแกน, duration_ms)
+        self.outcome = None      # type ของข้อความแรกที่ broadcast (checkin, cooldown, invalid, ...)
+        self.total_ms = 0.0
+        self.ok = True
+
+    def add(self, name: str, start: float, end: float):
+        self.spans.append((name, (start - self.started) * 1000, (end - start) * 1000))
+
+    def to_dict(self) -> dict:
+        return {
+            "uuid": self.uuid,
+            "outcome": self.outcome,
+            "ok": self.ok,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms, 2),
+            "wait_ms": round(self.wait_ms, 2),
+            "spans": [{"name": n, "at_ms": round(at, 2), "ms": round(ms, 2)} for n, at, ms in self.spans],
+        }
+
+
+def span(name: str) -> _Span:
+    """with span("x"): ... บันทึกเวลาลง trace ของสแกนที่กำลังประมวลผล (ไม่มี trace = ไม่ทำอะไร)"""
+    return _Span(_current.get(), name)
+
+
+def set_outcome(outcome: str):
+    trace = _current.get()
+    if trace is not None and trace.outcome is None:
+        trace.outcome = outcome
+
+
+# =====================================================
+# 📊 Histograms
+# =====================================================
+class Histogram:
+    """histogram bucket คงที่ (วินาที) แบบเดียวกับ Prometheus"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name: str, labels: str = "") -> list:
+        sep = "," if labels else ""
+        out, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            out.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{suffix} {self.sum!r}")
+        out.append(f"{name}_count{suffix} {self.count}")
+        return out
+
+
+# =====================================================
+# 🛰️ Scan tracer
+# =====================================================
+class ScanTracer:
+    """
+    เก็บ trace ของทุกสแกน (เรียกจาก worker ของ ScanPipeline บน event loop เท่านั้น)
+    - histogram ของเวลารวมแยกตามผลลัพธ์, เวลารอคิว และเวลาของแต่ละ span
+    - ring buffer ของ TRACE_HISTORY สแกนล่าสุด สำหรับดูสแกนที่ช้าที่สุดพร้อมรายละเอียด
+    """
+
+    def __init__(self, history: int = TRACE_HISTORY):
+        self.recent = deque(maxlen=history)
+        self.total = {}          # outcome -> Histogram
+        self.spans = {}          # span name -> Histogram
+        self.wait = Histogram()
+
+    def start(self, uuid: str, wait_ms: float = 0.0):
+        """เริ่ม trace ใน context ของ task ปัจจุบัน คืน (trace, token) ให้ส่งกลับมาที่ finish()"""
+        trace = ScanTrace(uuid, wait_ms)
+        return trace, _current.set(trace)
+
+    def finish(self, trace: ScanTrace, token, ok: bool = True):
+        _current.reset(token)
+        trace.total_ms = (time.perf_counter() - trace.started) * 1000
+        trace.ok = ok
+        if trace.outcome is None:
+            trace.outcome = "ok" if ok else "error"
+        self.total.setdefault(trace.outcome, Histogram()).observe(trace.total_ms / 1000)
+        self.wait.observe(trace.wait_ms / 1000)
+        for name, _, ms in trace.spans:
+            self.spans.setdefault(name, Histogram()).observe(ms / 1000)
+        self.recent.append(trace)
+        if SLOW_SCAN_MS and trace.total_ms >= SLOW_SCAN_MS:
+            slowest = max(trace.spans, key=lambda s: s[2], default=None)
+            detail = f", slowest {slowest[0]} {slowest[2]:.0f} ms" if slowest else ""
+            print(f"🐢 Slow scan {trace.uuid}: {trace.total_ms:.0f} ms ({trace.outcome}{detail})")
+
+    def slowest(self, limit: int = 20) -> list:
+        return [t.to_dict() for t in sorted(self.recent, key=lambda t: t.total_ms, reverse=True)[:limit]]
+
+    def prometheus_lines(self) -> list:
+        lines = [
+            "# HELP checkin_scan_duration_seconds Time to process one scan (after leaving the queue)",
+            "# TYPE checkin_scan_duration_seconds histogram",
+        ]
+        for outcome, histogram in self.total.items():
+            lines += histogram.lines("checkin_scan_duration_seconds", f'outcome="{outcome}"')
+        lines += [
+            "# HELP checkin_scan_queue_wait_seconds Time a scan waited in the scan queue",
+            "# TYPE checkin_scan_queue_wait_seconds histogram",
+            *self.wait.lines("checkin_scan_queue_wait_seconds"),
+            "# HELP checkin_scan_span_seconds Time spent in each step of a scan",
+            "# TYPE checkin_scan_span_seconds histogram",
+        ]
+        for name, histogram in self.spans.items():
+            lines += histogram.lines("checkin_scan_span_seconds", f'span="{name}"')
+        return lines
@@ -1,27 +1,200 @@
-from evdev import InputDevice, categorize, ecodes
+from evdev import InputDevice, ecodes, list_devices
+import errno, os, selectors, time
+from dotenv import load_dotenv
+
+# =====================================================
+# ⚙️ Scanner configuration
+# =====================================================
+load_dotenv()
+SCANNER_DEVICES = [p for p in os.getenv("SCANNER_DEVICES", "").split(",") if p]   # เช่น /dev/input/event0
+SCANNER_IDS = {                                   # vendor:product (hex) เช่น 0c2e:0b61,05e0:1200
+    tuple(int(part, 16) for part in pair.split(":"))
+    for pair in os.getenv("SCANNER_IDS", "").split(",") if ":" in pair
+}
+# auto-detect (ไม่ได้ตั้ง SCANNER_IDS): vendor ของเครื่องสแกนที่รู้จัก (Honeywell, Zebra, Datalogic, Newland)
+SCANNER_VENDORS = {int(v, 16) for v in os.getenv("SCANNER_VENDORS", "0c2e,05e0,05f9,1eab").split(",") if v.strip()}
+SCANNER_NAME_HINTS = ("barcode", "scanner")
+SCANNER_GRAB = os.getenv("SCANNER_GRAB", "0") == "1"                 # ไม่ให้ keystroke ไปถึง console
+SCANNER_FRAME_TIMEOUT = float(os.getenv("SCANNER_FRAME_TIMEOUT", 0.15))   # เงียบนานเท่านี้ถือว่าจบรหัส
+SCANNER_RESCAN_INTERVAL = float(os.getenv("SCANNER_RESCAN_INTERVAL", 2.0))
+MAX_CODE_LENGTH = 128
+
+KEY_MAP = {
+    2: "1", 3: "2", 4: "3", 5: "4", 6: "5", 7: "6", 8: "7", 9: "8", 10: "9", 11: "0",
+    16: "Q", 17: "W", 18: "E", 19: "R", 20: "T", 21: "Y", 22: "U", 23: "I", 24: "O", 25: "P",
+    30: "A", 31: "S", 32: "D", 33: "F", 34: "G", 35: "H", 36: "J", 37: "K", 38: "L",
+    44: "Z", 45: "X", 46: "C", 47: "V", 48: "B", 49: "N", 50: "M"
+}
+# ตาราง scancode → byte คำนวณครั้งเดียว (0 = ไม่ใช่ตัวอักษรของรหัส)
+SCANCODE_TABLE = bytes(ord(KEY_MAP[code]) if code in KEY_MAP else 0 for code in range(256))
+TERMINATORS = {ecodes.KEY_ENTER, ecodes.KEY_KPENTER, ecodes.KEY_TAB}
+
+
+# =====================================================
+# 🔎 Device discovery
+# =====================================================
+def is_scanner(dev: InputDevice) -> bool:
+    """
+    เลือกจาก vendor:product ถ้ากำหนด SCANNER_IDS ไม่งั้นต้องเป็น HID keyboard (ปุ่มตัวเลข + Enter)
+    ที่ vendor อยู่ใน SCANNER_VENDORS หรือชื่อมีคำว่า barcode / scanner (คีย์บอร์ดธรรมดาไม่ถูกเลือก)
+    """
+    if SCANNER_IDS:
+        return (dev.info.vendor, dev.info.product) in SCANNER_IDS
+    keys = set(dev.capabilities().get(ecodes.EV_KEY, []))
+    if not (ecodes.KEY_ENTER in keys and all(code in keys for code in range(2, 12))):
+        return False
+    name = (dev.name or "").lower()
+    return dev.info.vendor in SCANNER_VENDORS or any(hint in name for hint in SCANNER_NAME_HINTS)
+
+
+def _node_id(path: str):
+    """ตัวตนของ device node: เสียบใหม่แล้ว node ถูกสร้างใหม่ (ctime เปลี่ยน) แม้ path เดิม"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_rdev, stat.st_ctime_ns
+
+
+def candidate_paths() -> list:
+    if SCANNER_DEVICES:
+        return [p for p in SCANNER_DEVICES if os.path.exists(p)]
+    return list_devices()
+
+
+# =====================================================
+# 📟 Per-device frame decoder
+# =====================================================
+class ScanLane:
+    """buffer ที่จองไว้ล่วงหน้าต่อ 1 เครื่องสแกน: สะสม byte จนเจอ Enter หรือเงียบเกิน timeout"""
+
+    def __init__(self, dev: InputDevice):
+        self.dev = dev
+        self.path = dev.path
+        self.buffer = bytearray(MAX_CODE_LENGTH)
+        self.length = 0
+        self.last_key = 0.0
+
+    def feed(self, code: int, now: float):
+        """รับ scancode ของ key-down คืนรหัสที่ครบแล้ว (หรือ None)"""
+        if code in TERMINATORS:
+            return self.flush()
+        char = SCANCODE_TABLE[code] if code < 256 else 0
+        if char and self.length < MAX_CODE_LENGTH:
+            self.buffer[self.length] = char
+            self.length += 1
+            self.last_key = now
+        return None
+
+    def expired(self, now: float) -> bool:
+        return self.length > 0 and now - self.last_key >= SCANNER_FRAME_TIMEOUT
+
+    def flush(self):
+        if not self.length:
+            return None
+        code = self.buffer[:self.length].decode()
+        self.length = 0
+        return code
+
+
+# =====================================================
+# 🔁 Scanner loop
+# =====================================================
+def _rescan(selector, lanes: dict, ignored: dict):
+    """
+    เปิดเครื่องสแกนที่เพิ่งเสียบ ปิดตัวที่หายไป
+    device อื่นที่ตรวจแล้วจำไว้ใน ignored (path -> node id) และตรวจใหม่เมื่อถูกถอดแล้วเสียบกลับที่ path เดิม
+    """
+    paths = set(candidate_paths())
+    for path in set(lanes) - paths:
+        _close(path, selector, lanes, ignored)
+    for path in list(ignored):
+        if path not in paths or ignored[path] != _node_id(path):
+            del ignored[path]
+    for path in paths - lanes.keys() - ignored.keys():
+        try:
+            dev = InputDevice(path)
+        except OSError:
+            ignored.pop(path, None)
+            continue
+        if not SCANNER_DEVICES and not is_scanner(dev):
+            ignored[path] = _node_id(path)
+            dev.close()
+            continue
+        try:
+            if SCANNER_GRAB:
+                dev.grab()
+        except OSError as e:
+            print(f"⚠️ Cannot grab scanner {path}: {e}")
+        lanes[path] = ScanLane(dev)
+        selector.register(dev.fd, selectors.EVENT_READ, path)
+        print(f"🔍 Scanner connected: {path} ({dev.name}, {dev.info.vendor:04x}:{dev.info.product:04x})")
+
+
+def _close(path: str, selector, lanes: dict, ignored: dict = None):
+    if ignored is not None:
+        ignored.pop(path, None)
+    lane = lanes.pop(path, None)
+    if lane is None:
+        return
+    try:
+        selector.unregister(lane.dev.fd)
+    except (KeyError, ValueError):
+        pass
+    try:
+        lane.dev.close()
+    except OSError:
+        pass
+    print(f"🔌 Scanner disconnected: {path}")
+
 
 def scanner_loop(callback):
-    device_path = "/dev/input/event0"
-    print(f"🔍 Opening scanner device: {device_path}")
-    dev = InputDevice(device_path)
-
-    key_map = {
-        2: "1", 3: "2", 4: "3", 5: "4", 6: "5", 7: "6", 8: "7", 9: "8", 10: "9", 11: "0",
-        16: "Q", 17: "W", 18: "E", 19: "R", 20: "T", 21: "Y", 22: "U", 23: "I", 24: "O", 25: "P",
-        30: "A", 31: "S", 32: "D", 33: "F", 34: "G", 35: "H", 36: "J", 37: "K", 38: "L",
-        44: "Z", 45: "X", 46: "C", 47: "V", 48: "B", 49: "N", 50: "M"
-    }
-
-    uuid = ""
-    for event in dev.read_loop():
-        if event.type == ecodes.EV_KEY:
-            data = categorize(event)
-            if data.keystate == 1:  # key down
-                if data.keycode == "KEY_ENTER":
-                    if uuid:
-                        print(f"🔹 Scanned: {uuid}")
-                        callback(uuid)
-                        uuid = ""
+    """อ่านทุกเครื่องสแกนใน selector เดียว รองรับการถอด/เสียบใหม่ เรียก callback(uuid) เมื่ออ่านครบ"""
+    selector = selectors.DefaultSelector()
+    lanes = {}
+    ignored = {}
+    next_rescan = 0.0
+    print("🔍 Waiting for scanner devices...")
+
+    while True:
+        now = time.monotonic()
+        if now >= next_rescan:
+            _rescan(selector, lanes, ignored)
+            next_rescan = now + SCANNER_RESCAN_INTERVAL
+
+        # รอ event หรือจนถึงเวลาที่ต้องตัด frame / rescan
+        timeout = next_rescan - now
+        pending = [lane.last_key + SCANNER_FRAME_TIMEOUT - now for lane in lanes.values() if lane.length]
+        if pending:
+            timeout = min(timeout, max(0.0, min(pending)))
+        if lanes:
+            ready = selector.select(timeout)
+        else:
+            time.sleep(max(0.0, timeout))
+            ready = []
+
+        now = time.monotonic()
+        for key, _ in ready:
+            lane = lanes.get(key.data)
+            if lane is None:
+                continue
+            try:
+                for event in lane.dev.read():
+                    if event.type == ecodes.EV_KEY and event.value == 1:   # key down
+                        code = lane.feed(event.code, now)
+                        if code:
+                            print(f"🔹 Scanned: {code} ({lane.path})")
+                            callback(code)
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                if e.errno in (errno.ENODEV, errno.EIO, errno.EBADF):
+                    _close(lane.path, selector, lanes, ignored)
                 else:
-                    key = key_map.get(data.scancode, "")
-                    uuid += key
+                    raise
+
+        for lane in list(lanes.values()):
+            if lane.expired(now):
+                code = lane.flush()
+                print(f"🔹 Scanned: {code} ({lane.path}, timeout)")
+                callback(code)
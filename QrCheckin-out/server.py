@@ -1,13 +1,21 @@
-from fastapi import FastAPI, WebSocket, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, WebSocket, Request, HTTPException, Header
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from starlette.websockets import WebSocketDisconnect
-import threading, asyncio, datetime, socket, uvicorn, time, os
+import threading, asyncio, datetime, socket, uvicorn, time, os, uuid as uuid_lib
 from dotenv import load_dotenv
 from pathlib import Path
 from scanner import scanner_loop
-from supabase_client import check_uuid_exists, insert_checkin
+from supabase_async import AsyncSupabase, build_checkin_row
+from uuid_cache import UuidCache
+from checkin_journal import CheckinJournal
+from state_store import ParticipantStore
+from scan_pipeline import ScanPipeline
+from broadcaster import Broadcaster
+from scan_trace import ScanTracer, span, set_outcome
+from lan_replica import ScanReplica, REPLICA_PEERS
 from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.cors import CORSMiddleware
 
 
 # =====================================================
@@ -25,14 +33,27 @@ BOOTH_NAME = os.getenv("BASE_NAME", "CprE-Booth")
 # =====================================================
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
+# หน้า dashboard (WebsiteBackEnd) เรียก /stats ข้าม origin
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[o.strip() for o in os.getenv("STATS_CORS_ORIGINS", "*").split(",")],
+    allow_methods=["GET"],
+)
 templates = Jinja2Templates(directory="templates")
 
-clients = set()
-participants = {}
-event_loop = None  # Event loop for async broadcast
+broadcaster = Broadcaster()   # WebSocket fan-out ไปทุกหน้าจอ
+scan_tracer = ScanTracer()    # trace + histogram ของแต่ละสแกน
+participants = None  # ParticipantStore (SQLite) สร้างตอน startup
+db = None          # AsyncSupabase (สร้างตอน startup บน event loop)
+uuid_cache = None  # UuidCache: ดัชนี uuid ที่ถูกต้องในเครื่อง
+journal = None     # CheckinJournal: write-behind ของตาราง checkins
+scan_pipeline = None  # ScanPipeline: คิว + worker ประมวลผลสแกน
+replica = None     # ScanReplica: log การสแกนที่ replicate กับบูธอื่นในวง LAN (ตั้ง REPLICA_PEERS)
 
 SCAN_COOLDOWN = 5          # Minimum 5 seconds between scans
 CHECKOUT_COOLDOWN = 30     # Must wait 30 seconds before checkout
+SNAPSHOT_LIMIT = int(os.getenv("SNAPSHOT_LIMIT", 200))   # แถวล่าสุดที่ส่งให้หน้าจอตอนเชื่อมต่อ
+SCAN_INJECT = os.getenv("SCAN_INJECT", "0") == "1"       # เปิด POST /debug/scan (ใช้กับ loadtest.py เท่านั้น)
 
 
 # =====================================================
@@ -40,8 +61,41 @@ CHECKOUT_COOLDOWN = 30     # Must wait 30 seconds before checkout
 # =====================================================
 @app.on_event("startup")
 async def on_startup():
-    global event_loop
-    event_loop = asyncio.get_running_loop()
+    global db, uuid_cache, journal, participants, scan_pipeline, replica
+    db = AsyncSupabase(booth=BOOTH_NAME)
+    uuid_cache = UuidCache(db)
+    journal = CheckinJournal(db)
+    participants = ParticipantStore(BOOTH_NAME)
+    if REPLICA_PEERS:
+        replica = ScanReplica(BOOTH_NAME, journal, participants)
+    scan_pipeline = ScanPipeline(handle_scan_async, tracer=scan_tracer)
+    scan_pipeline.start()
+    asyncio.create_task(db.warmup())
+    asyncio.create_task(uuid_cache.run())
+    asyncio.create_task(journal.run())
+    asyncio.create_task(participants.run(db, journal))
+    if replica:
+        asyncio.create_task(replica.run())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if scan_pipeline:
+        await scan_pipeline.stop()
+    if replica:
+        # เหตุการณ์ที่ยังไม่นิ่งรอบูธอื่นอยู่ใน replica.db ส่งเข้า journal หลังรีสตาร์ท
+        replica.reconcile()
+        await replica.aclose()
+    if journal:
+        try:
+            await asyncio.wait_for(journal.flush(), timeout=5)
+        except Exception as e:
+            print(f"⚠️ Journal not fully flushed ({journal.pending_count()} pending): {e}")
+        journal.close()
+    if participants:
+        participants.close()
+    if db:
+        await db.aclose()
 
 
 # =====================================================
@@ -52,67 +106,175 @@ async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/stats")
+async def attendance_stats(date: str = None):
+    """ยอดเข้าร่วมต่อบูธ (และรายชั่วโมง) ของวันที่ระบุ (yyyy-MM-dd หรือ ALL) พร้อมรายการวันที่ทั้งหมด"""
+    dates = participants.attendance.dates()
+    if date is None:
+        date = dates[-1] if dates else "ALL"
+    summary = participants.attendance.summary(None if date == "ALL" else date)
+    return {"dates": dates, **summary}
+
+
+@app.get("/metrics/supabase")
+async def supabase_metrics():
+    """latency ของแต่ละ Supabase call (ms)"""
+    return db.metrics.snapshot() if db else {}
+
+
+@app.get("/metrics/uuid-cache")
+async def uuid_cache_metrics():
+    return uuid_cache.stats() if uuid_cache else {}
+
+
+@app.get("/metrics/journal")
+async def journal_metrics():
+    """จำนวนรายการที่ยังไม่ได้ส่งขึ้น Supabase และอายุของรายการที่ค้างนานที่สุด (lag_s)"""
+    return journal.stats() if journal else {}
+
+
+@app.get("/metrics/replica")
+async def replica_metrics():
+    """นาฬิกา HLC, watermark ของ reconciler และสถานะของแต่ละ peer ในวง LAN"""
+    return replica.stats() if replica else {}
+
+
+@app.get("/metrics/participants")
+async def participant_metrics():
+    return participants.stats() if participants else {}
+
+
+@app.get("/metrics/scans")
+async def scan_metrics():
+    """ความลึกของคิวสแกนและ latency (รอคิว / ประมวลผล / รวม)"""
+    return scan_pipeline.stats() if scan_pipeline else {}
+
+
+@app.get("/metrics/websocket")
+async def websocket_metrics():
+    return broadcaster.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """histogram ของสแกน (รวม / รอคิว / ต่อ span) และค่าปัจจุบันของคิว, journal, หน้าจอ ในรูปแบบ Prometheus"""
+    lines = scan_tracer.prometheus_lines()
+    gauges = [
+        ("checkin_scan_queue_depth", "Scans waiting in the scan queue", scan_pipeline.depth() if scan_pipeline else 0),
+        ("checkin_journal_pending", "Journal entries not yet written to Supabase",
+         journal.pending_count() if journal else 0),
+        ("checkin_websocket_clients", "Connected display WebSockets", len(broadcaster.channels)),
+        ("checkin_participants", "Participants in the local state store", len(participants) if participants else 0),
+        ("checkin_replica_pending", "LAN scan log events not yet handed to the journal",
+         replica.pending_count() if replica else 0),
+    ]
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/slow-scans")
+async def slow_scans(limit: int = 20):
+    """สแกนที่ช้าที่สุดจาก TRACE_HISTORY สแกนล่าสุด พร้อมเวลาของแต่ละ span"""
+    return scan_tracer.slowest(limit)
+
+
+@app.post("/debug/scan")
+async def inject_scan(uuid: str):
+    """ส่ง uuid เข้าคิวเหมือนอ่านจากเครื่องสแกน (เปิดด้วย SCAN_INJECT=1)"""
+    if not SCAN_INJECT:
+        raise HTTPException(status_code=404)
+    if not (scan_pipeline and scan_pipeline.submit(uuid)):
+        raise HTTPException(status_code=503, detail="scan pipeline not ready")
+    return {"queued": uuid}
+
+
+# =====================================================
+# 🛰️ LAN replication (บูธอื่นเรียก)
+# =====================================================
+def _replica_or_404(token: str) -> ScanReplica:
+    if replica is None:
+        raise HTTPException(status_code=404)
+    if not replica.authorized(token):
+        raise HTTPException(status_code=403)
+    return replica
+
+
+@app.get("/replica/log")
+async def replica_log(after: int = 0, limit: int = 500, x_replica_token: str = Header(None)):
+    """เหตุการณ์ใน log ที่ seq > after พร้อม HLC ปัจจุบันของบูธนี้ (อ่านก่อน entries)"""
+    source = _replica_or_404(x_replica_token)
+    clock = source.clock.peek()
+    return {"node": BOOTH_NAME, "clock": clock, "entries": source.entries_after(after, min(limit, 5000))}
+
+
+@app.post("/replica/push")
+async def replica_push(request: Request, x_replica_token: str = Header(None)):
+    """รับสแกนที่บูธอื่นเพิ่งบันทึก"""
+    target = _replica_or_404(x_replica_token)
+    try:
+        applied = target.apply((await request.json())["entries"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"bad replica entries: {e}")
+    return {"applied": applied}
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections"""
     await websocket.accept()
-    clients.add(websocket)
+    broadcaster.connect(websocket, booth_snapshot())
     print(f"🔗 WebSocket connected: {websocket.client}")
     try:
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        clients.remove(websocket)
         print("⚠️ WebSocket disconnected")
+    finally:
+        broadcaster.disconnect(websocket)
 
 
 # =====================================================
 # 🔄 Broadcast system
 # =====================================================
-async def _broadcast_async(data):
-    """Send data to all connected WebSocket clients"""
-    dead = []
-    for ws in clients:
-        try:
-            await ws.send_json(data)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        clients.remove(ws)
-
-
-def broadcast(data):
-    """Thread-safe broadcast"""
-    global event_loop
-    if event_loop and event_loop.is_running():
-        asyncio.run_coroutine_threadsafe(_broadcast_async(data), event_loop)
-    else:
-        print("⚠️ FastAPI event loop not ready yet!")
+def publish(data):
+    """ส่งผลการสแกนไปทุกหน้าจอ (เรียกบน event loop) และบันทึกเป็น span broadcast ของ trace"""
+    set_outcome(data.get("type"))
+    with span("broadcast"):
+        broadcaster.publish(data)
+
+
+def booth_snapshot():
+    """สถานะปัจจุบันของบูธ ส่งให้หน้าจอที่เพิ่งเชื่อมต่อ (หรือ reconnect)"""
+    rows = participants.booth_rows(BOOTH_NAME, SNAPSHOT_LIMIT) if participants else []
+    return {
+        "type": "snapshot",
+        "booth": BOOTH_NAME,
+        "in_count": sum(1 for r in rows if r["status"] in ("in", "completed")),
+        "out_count": sum(1 for r in rows if r["status"] == "completed"),
+        "participants": rows,
+    }
 
 
 # =====================================================
 # 🧩 Main QR logic
 # =====================================================
 def handle_scan(uuid: str):
+    """เรียกจาก scanner thread: แค่ใส่ uuid ลงคิวแล้วกลับไปอ่านสแกนถัดไปทันที"""
+    if not (scan_pipeline and scan_pipeline.submit(uuid)):
+        print("⚠️ FastAPI event loop not ready yet!")
+
+
+async def handle_scan_async(uuid: str):
     now = time.time()
     booth = BOOTH_NAME
 
-    # 🔍 Validate UUID
-    if not check_uuid_exists(uuid):
-        broadcast({
-            "message": f"⚠️ Invalid QR Code detected: {uuid}",
-            "type": "invalid",
-            "uuid": uuid
-        })
-        print(f"⚠️ Invalid QR: {uuid}")
-        return
-
     info = participants.get(uuid, {"status": None, "last_time": 0, "booth": None})
     last_status, last_time, last_booth = info["status"], info["last_time"], info["booth"]
 
-    # 🧱 ถ้า QR เคยเสร็จสิ้นแล้ว (completed)
+    # 🧱 ถ้า QR เคยเสร็จสิ้นแล้ว (completed) — ตัดสินจากหน่วยความจำได้เลย ไม่ต้องถาม Supabase
     if last_status == "completed":
-        broadcast({
+        publish({
             "message": f"🎉 This QR has already completed the process: {uuid}",
             "type": "completed",
             "uuid": uuid
@@ -123,7 +285,7 @@ def handle_scan(uuid: str):
     # 🕓 Prevent too frequent scans
     if now - last_time < SCAN_COOLDOWN:
         remaining = round(SCAN_COOLDOWN - (now - last_time), 1)
-        broadcast({
+        publish({
             "message": f"🕓 Please wait {remaining} seconds before scanning again: {uuid}",
             "type": "cooldown",
             "uuid": uuid
@@ -131,100 +293,60 @@ def handle_scan(uuid: str):
         print(f"⏳ Cooldown active for {uuid} ({remaining}s left)")
         return
 
-    # 🔁 Auto Check-out (Different booth detected) — ใช้ NULL เป็น open state
-    try:
-        from supabase_client import supabase
-
-        # หาแถวที่ยังไม่ checkout (checkout_time IS NULL)
-        open_record = (
-            supabase.table("checkins")
-            .select("*")
-            .eq("uuid", uuid)
-            .is_("checkout_time", None)
-            .order("last_updated", desc=True)# ✅ ตรงนี้สำคัญ
-            .limit(1)
-            .execute()
-        )
+    # 🔍 Validate UUID จาก cache ในเครื่อง (QR ที่ไม่ถูกต้องถูกปฏิเสธโดยไม่ต้องใช้ network)
+    with span("uuid_cache"):
+        valid = await uuid_cache.contains(uuid)
+    if not valid:
+        publish({
+            "message": f"⚠️ Invalid QR Code detected: {uuid}",
+            "type": "invalid",
+            "uuid": uuid
+        })
+        print(f"⚠️ Invalid QR: {uuid}")
+        return
 
-        if open_record.data:
-            old = open_record.data[0]
-            last_booth = old.get("booth")
-            now_iso   = datetime.datetime.now().isoformat(timespec="seconds")
-
-            if last_booth != booth:
-                # ปิดบูธเดิม
-                update_res = (
-                    supabase.table("checkins")
-                    .update({"checkout_time": now_iso})
-                    .eq("uuid", uuid)
-                    .eq("booth", last_booth)
-                    .is_("checkout_time", None)
-                    .execute()
-                )
-                updated = len(update_res.data) if getattr(update_res, "data", None) else 0
-                print(f"🟠 Auto-checkout {uuid} from {last_booth} → updated rows: {updated}")
-
-                # ตั้งสถานะฝั่งหน่วยความจำไว้เพื่อ broadcast
-                participants[uuid] = {
-                    "status": "in",
-                    "last_time": time.time(),
-                    "booth": booth,
-                    "checkin_time": datetime.datetime.now().strftime("%H:%M:%S"),
-                    "checkout_time": "-"
-                }
-
-                broadcast({
-                    "message": f"🔁 Auto-checkout from {last_booth}",
-                    "type": "auto_checkout",
-                    "uuid": uuid,
-                    "booth": last_booth,
-                    "checkout_time": datetime.datetime.now().strftime("%H:%M:%S"),
-                })
-
-                # insert check-in ใหม่ให้บูธปัจจุบัน (ใน DB ให้ checkout_time=None)
-                insert_checkin(uuid, "Check-in")
-
-                broadcast({
-                    "message": f"✅ Auto check-in at new booth: {booth}",
-                    "type": "checkin",
-                    "uuid": uuid,
-                    "booth": booth,
-                    "checkin_time": participants[uuid]["checkin_time"],
-                    "checkout_time": "-"
-                })
-                print(f"✅ Auto check-in {uuid} at {booth}")
-                return
-
-    except Exception as e:
-        print(f"⚠️ Supabase auto-checkout check failed: {e}")
+    # ✅ Check-in ผ่าน rpc record_scan (RECORD_SCAN_RPC=1): round trip เดียวตรวจ uuid, ปิด visit ที่เปิดค้าง
+    # (auto-checkout) และเปิด visit ใหม่ ผลจากฐานข้อมูลบอกบูธเดิมเอง ไม่ต้อง select open_checkin ก่อน
+    if journal.rpc and not replica and last_status != "in":
+        result = await record_checkin(uuid, "Check-in")
+        if result and result.get("result") == "invalid":
+            publish({
+                "message": f"⚠️ Invalid QR Code detected: {uuid}",
+                "type": "invalid",
+                "uuid": uuid
+            })
+            print(f"⚠️ Invalid QR (record_scan): {uuid}")
+            return
+        # เน็ตล่ม (result None): แถวรอใน journal และ record_scans ปิด visit เดิมตอนส่ง หน้าจอใช้สถานะในเครื่อง
+        previous = result.get("previous_booth") if result else participants.open_booth(uuid)
+        announce_checkin(uuid, booth, now, previous if previous != booth else None)
+        return
 
+    with span("open_booth"):
+        open_booth = await _open_booth(uuid)
+
+    # 🔁 Auto Check-out (Different booth detected) — ใช้ NULL เป็น open state
+    if open_booth and open_booth != booth:
+        now_iso = datetime.datetime.now().isoformat(timespec="seconds")
+
+        # ปิดบูธเดิมและ insert check-in ใหม่ให้บูธปัจจุบัน (ใน DB ให้ checkout_time=None) ผ่าน journal
+        with span("journal"):
+            journal.close_checkin(uuid, open_booth, now_iso)
+        await record_checkin(uuid, "Check-in")
+        announce_checkin(uuid, booth, now, open_booth)
+        return
 
     # ✅ Check-in
     if info.get("status") != "in":
-        participants[uuid] = {
-            "status": "in",
-            "last_time": now,
-            "booth": booth,
-            "checkin_time": datetime.datetime.now().strftime("%H:%M:%S"),
-            "checkout_time": "-"
-        }
-        insert_checkin(uuid, "Check-in")
-        broadcast({
-            "message": f"✅ Successfully checked in: {uuid}",
-            "type": "checkin",
-            "uuid": uuid,
-            "booth": booth,
-            "checkin_time": participants[uuid]["checkin_time"],
-            "checkout_time": "-"
-        })
-        print(f"✅ Check-in: {uuid}")
+        await record_checkin(uuid, "Check-in")
+        announce_checkin(uuid, booth, now, None)
         return
 
     # ❌ Check-out (after waiting at least 30s)
     elif last_status == "in":
         if now - last_time < CHECKOUT_COOLDOWN:
             remaining = int(CHECKOUT_COOLDOWN - (now - last_time))
-            broadcast({
+            publish({
                 "message": f"🕓 Please wait {remaining} seconds before checking out: {uuid}",
                 "type": "cooldown",
                 "uuid": uuid
@@ -233,11 +355,15 @@ def handle_scan(uuid: str):
             return
 
         # ✅ Proceed to check-out
-        participants[uuid]["status"] = "completed"
-        participants[uuid]["last_time"] = now
-        participants[uuid]["checkout_time"] = datetime.datetime.now().strftime("%H:%M:%S")
-        insert_checkin(uuid, "Check-out")
-        broadcast({
+        participants.update(
+            uuid,
+            status="completed",
+            last_time=now,
+            checkout_time=datetime.datetime.now().strftime("%H:%M:%S"),
+            open_booth=None,
+        )
+        await record_checkin(uuid, "Check-out")
+        publish({
             "message": f"❌ Successfully checked out: {uuid}",
             "type": "checkout",
             "uuid": uuid,
@@ -249,6 +375,81 @@ def handle_scan(uuid: str):
         return
 
 
+def announce_checkin(uuid: str, booth: str, now: float, previous_booth: str = None):
+    """ตั้งสถานะ check-in ในหน่วยความจำแล้ว broadcast (มี previous_booth = auto-checkout จากบูธนั้น)"""
+    participants[uuid] = {
+        "status": "in",
+        "last_time": now,
+        "booth": booth,
+        "checkin_time": datetime.datetime.now().strftime("%H:%M:%S"),
+        "checkout_time": "-",
+        "open_booth": booth
+    }
+    if previous_booth:
+        publish({
+            "message": f"🔁 Auto-checkout from {previous_booth}",
+            "type": "auto_checkout",
+            "uuid": uuid,
+            "booth": previous_booth,
+            "checkout_time": datetime.datetime.now().strftime("%H:%M:%S"),
+        })
+    publish({
+        "message": f"✅ Auto check-in at new booth: {booth}" if previous_booth else f"✅ Successfully checked in: {uuid}",
+        "type": "checkin",
+        "uuid": uuid,
+        "booth": booth,
+        "checkin_time": participants[uuid]["checkin_time"],
+        "checkout_time": "-"
+    })
+    print(f"✅ Auto check-in {uuid} at {booth}" if previous_booth else f"✅ Check-in: {uuid}")
+
+
+async def record_checkin(uuid: str, status: str):
+    """
+    เขียนเหตุการณ์และนับเข้า rollup ทันที คืนผลของ rpc record_scan (None ถ้าไม่ได้เขียนตรง)
+    - LAN replica: ลง log ซึ่งส่งเข้า journal ตามลำดับ HLC
+    - RECORD_SCAN_RPC=1: rpc record_scan หนึ่ง round trip ถ้าไม่สำเร็จ (เน็ตล่ม, timeout) เก็บแถวเดิม
+      ลง journal ด้วย event_id เดิม flusher ส่งซ้ำได้โดยไม่เกิดแถวซ้ำแม้ rpc จะเขียนสำเร็จไปแล้ว
+      ระหว่างที่ journal ยังมีแถวค้างส่ง ต่อคิวใน journal เลย (รักษาลำดับ และไม่ต้องรอ timeout ทุกสแกน)
+    - ไม่งั้น: journal (write-behind)
+    """
+    result = None
+    if replica:
+        with span("replica"):
+            row = replica.record(uuid, status)
+    else:
+        row = build_checkin_row(uuid, status, BOOTH_NAME)
+        row["event_id"] = uuid_lib.uuid4().hex
+        if journal.rpc and not journal.pending_count():
+            try:
+                with span("record_scan"):
+                    result = await db.record_scan(row)
+            except Exception as e:
+                print(f"⚠️ record_scan failed, queued in journal: {e.__class__.__name__}: {e}")
+        if result is None:
+            with span("journal"):
+                journal.append_scan(row)
+        elif result.get("result") == "invalid":
+            return result
+    with span("rollup"):
+        participants.attendance.record(row)
+    return result
+
+
+async def _open_booth(uuid: str):
+    """
+    บูธที่ uuid นี้ยังเปิด check-in ค้าง: ใช้ข้อมูลในเครื่องถ้า sync ล่าสุดยังสด ไม่งั้นถาม Supabase
+    (โหมด rpc ใช้เฉพาะตอน check-out: check-in ให้ record_scan ปิด visit เดิมเอง)
+    """
+    if replica:
+        # offline-first: log ในวง LAN (HLC) ตัดสินเอง, uuid ที่ไม่อยู่ใน log ใช้สถานะที่ sync ไว้ล่าสุด
+        return replica.open_booth(uuid) if uuid in replica else participants.open_booth(uuid)
+    if participants.fresh:
+        return participants.open_booth(uuid)
+    open_record = await db.open_checkin(uuid)
+    return open_record.get("booth") if open_record else participants.open_booth(uuid)
+
+
 # =====================================================
 # 🧰 Utility
 # =====================================================
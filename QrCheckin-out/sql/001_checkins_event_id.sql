@@ -0,0 +1,5 @@
+-- Idempotency key for check-in events written by checkin_journal.py.
+-- The journal upserts with on_conflict=event_id and ignore-duplicates, so a batch
+-- that is re-sent after a timeout does not create duplicate rows.
+alter table public.checkins add column if not exists event_id text;
+create unique index if not exists checkins_event_id_key on public.checkins (event_id);
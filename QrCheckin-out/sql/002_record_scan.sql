@@ -0,0 +1,99 @@
+-- Single-round-trip scan write used by checkin_journal.py (RECORD_SCAN_RPC=1) and
+-- AsyncSupabase.record_scan. One call validates the QR code, closes the open visit
+-- and inserts the new checkins row in one transaction:
+--   IN        closes every row still open (checkout_time is null) for the uuid, which is an
+--             auto-checkout when it was open at another booth, and opens a visit at p_booth.
+--             previous_booth is the booth of the most recent (highest id) open row at another booth
+--   OUT       closes the open visit at p_booth and inserts the OUT row. Unlike the plain
+--             insert path, the IN row of that visit gets checkout_time set too, so a
+--             completed visit no longer shows up as open (checkout_time is null).
+--   AUTO_OUT  same as OUT
+-- Scans of the same uuid are serialized with a transaction-level advisory lock, so two
+-- booths scanning the same code at once cannot both leave a visit open.
+-- p_event_id makes retries safe: an event that was already written returns 'duplicate'.
+-- record_scan.py implements the same function on SQLite (fake_postgrest.py, offline tests).
+-- Requires 001_checkins_event_id.sql.
+
+create or replace function public.record_scan(
+    p_uuid text,
+    p_booth text,
+    p_status text default 'IN',
+    p_event_id text default null,
+    p_at timestamp default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_status text := upper(coalesce(p_status, 'IN'));
+    v_at timestamp := coalesce(p_at, localtimestamp(0));
+    v_previous text;
+    v_closed integer := 0;
+    v_auto integer := 0;
+begin
+    if not exists (select 1 from public.genqrcode where uuid = p_uuid) then
+        return jsonb_build_object('result', 'invalid', 'uuid', p_uuid, 'booth', p_booth, 'event_id', p_event_id);
+    end if;
+
+    perform pg_advisory_xact_lock(hashtext('record_scan:' || p_uuid));
+
+    if p_event_id is not null and exists (select 1 from public.checkins where event_id = p_event_id) then
+        return jsonb_build_object('result', 'duplicate', 'uuid', p_uuid, 'booth', p_booth, 'event_id', p_event_id);
+    end if;
+
+    if v_status = 'IN' then
+        with closed as (
+            update public.checkins set checkout_time = v_at
+            where uuid = p_uuid and checkout_time is null
+            returning id, booth
+        )
+        select (array_agg(booth order by id desc) filter (where booth <> p_booth))[1],
+               count(*), count(*) filter (where booth <> p_booth)
+        into v_previous, v_closed, v_auto
+        from closed;
+
+        insert into public.checkins (uuid, booth, status, checkin_time, checkout_time, last_updated, event_id)
+        values (p_uuid, p_booth, 'IN', v_at, null, v_at, p_event_id);
+    else
+        update public.checkins set checkout_time = v_at
+        where uuid = p_uuid and checkout_time is null and booth = p_booth and status = 'IN';
+        get diagnostics v_closed = row_count;
+
+        insert into public.checkins (uuid, booth, status, checkin_time, checkout_time, last_updated, event_id)
+        values (p_uuid, p_booth, v_status, null, v_at, v_at, p_event_id);
+    end if;
+
+    return jsonb_build_object(
+        'result', case when v_status <> 'IN' then 'checkout' when v_auto > 0 then 'auto_checkout' else 'checkin' end,
+        'uuid', p_uuid,
+        'booth', p_booth,
+        'status', v_status,
+        'previous_booth', v_previous,
+        'closed', v_closed,
+        'event_id', p_event_id,
+        'at', v_at
+    );
+end;
+$$;
+
+-- Batch form for the journal flusher: applies checkins rows (as built by build_checkin_row)
+-- in order inside one transaction and returns one record_scan result per row.
+create or replace function public.record_scans(p_events jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_event jsonb;
+    v_results jsonb := '[]'::jsonb;
+begin
+    for v_event in select value from jsonb_array_elements(p_events) loop
+        v_results := v_results || jsonb_build_array(public.record_scan(
+            v_event->>'uuid',
+            v_event->>'booth',
+            v_event->>'status',
+            v_event->>'event_id',
+            (v_event->>'last_updated')::timestamp
+        ));
+    end loop;
+    return v_results;
+end;
+$$;
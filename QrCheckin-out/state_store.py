@@ -0,0 +1,259 @@
+import asyncio, datetime, os, sqlite3, threading, time
+from pathlib import Path
+from dotenv import load_dotenv
+from attendance_stats import AttendanceStats
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+STATE_PATH = os.getenv("STATE_PATH", str(Path(__file__).resolve().parent / "participants.db"))
+STATE_TTL = float(os.getenv("STATE_TTL", 43200))                 # วินาทีที่ไม่มีความเคลื่อนไหวก่อนลบผู้เข้าร่วม
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", 10))
+STATE_FRESH = float(os.getenv("STATE_FRESH", 60))                 # sync ภายในกี่วินาทีถือว่าข้อมูลบูธอื่นสด
+STATE_SYNC_PAGE = int(os.getenv("STATE_SYNC_PAGE", 1000))
+STATE_SYNC_OVERLAP = int(os.getenv("STATE_SYNC_OVERLAP", 200))    # อ่าน id ล่าสุดซ้ำกี่แถว (transaction ที่ commit ช้ากว่า id)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    uuid          TEXT PRIMARY KEY,
+    status        TEXT,               -- in | completed | NULL (รู้แค่ว่าเปิดค้างที่บูธอื่น)
+    last_time     REAL NOT NULL DEFAULT 0,
+    booth         TEXT,
+    checkin_time  TEXT,
+    checkout_time TEXT,
+    open_booth    TEXT,               -- บูธที่มีแถว checkins เปิดค้าง (checkout_time IS NULL)
+    updated_at    REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS participants_booth ON participants (booth);
+CREATE INDEX IF NOT EXISTS participants_open_booth ON participants (open_booth);
+CREATE INDEX IF NOT EXISTS participants_updated ON participants (updated_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+FIELDS = ("status", "last_time", "booth", "checkin_time", "checkout_time", "open_booth", "updated_at")
+
+
+def _epoch(iso: str) -> float:
+    try:
+        return datetime.datetime.fromisoformat(iso).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _clock(iso: str) -> str:
+    return iso[11:19] if iso and len(iso) >= 19 else "-"
+
+
+# =====================================================
+# 🗃️ Participant state store
+# =====================================================
+class ParticipantStore:
+    """
+    สถานะผู้เข้าร่วมของบูธนี้ (แทน dict participants เดิม) เก็บใน SQLite และ cache ใน dict
+    - อ่านจาก dict (O(1)) เขียนทะลุลง SQLite ทันที สถานะจึงอยู่รอดหลังรีสตาร์ท
+    - open_booth: บูธที่ uuid นี้ยังเปิด check-in ค้างอยู่ อัปเดตจากการสแกนในเครื่อง
+      และ sync แถว checkins ใหม่จาก Supabase ตาม cursor ของ checkins.id (server เป็นผู้ออก เพิ่มขึ้นเสมอ)
+      last_updated เป็นเวลาของบูธ: แถวที่ส่งขึ้นช้า (journal หลังเน็ตล่ม) หรือบูธที่นาฬิกาเพี้ยนมีค่าเก่ากว่าแถวที่ sync แล้ว
+    - ผู้เข้าร่วมที่จบแล้ว (ไม่มี visit เปิดค้าง) และไม่ได้อัปเดตนานกว่า STATE_TTL ถูกลบออก
+    """
+
+    def __init__(self, booth: str, path: str = STATE_PATH):
+        self.booth = booth
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.rows = {}
+        for row in self.conn.execute(f"SELECT uuid, {', '.join(FIELDS)} FROM participants"):
+            self.rows[row[0]] = dict(zip(FIELDS, row[1:]))
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.cursor = int(meta.get("cursor_id", 0))   # checkins.id ล่าสุดที่ sync แล้ว
+        self.last_sync = 0.0
+        self.evicted = 0
+        self.attendance = AttendanceStats(self)   # rollup ยอดเข้าร่วม (ทุกบูธ) ในไฟล์เดียวกัน
+        if "cursor" in meta and "cursor_id" not in meta:
+            # cursor เดิมตาม last_updated อาจข้ามแถวไปแล้ว: sync ใหม่ตั้งแต่ id แรกและนับ rollup ใหม่ทั้งหมด
+            self.attendance.reset()
+            with self._lock:
+                self.conn.execute("DELETE FROM meta WHERE key IN ('cursor', 'cursor_skip')")
+        if self.rows:
+            print(f"🗃️ Loaded {len(self.rows)} participants from {path}")
+
+    # -------------------------------------------------
+    # 🔍 Read
+    # -------------------------------------------------
+    def get(self, uuid: str, default=None):
+        row = self.rows.get(uuid)
+        return dict(row) if row is not None else default
+
+    def __getitem__(self, uuid: str) -> dict:
+        return dict(self.rows[uuid])
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self.rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def open_booth(self, uuid: str):
+        row = self.rows.get(uuid)
+        return row.get("open_booth") if row else None
+
+    def at_booth(self, booth: str) -> list:
+        """uuid ที่ยังเปิด check-in ค้างที่บูธนี้ (ใช้ index open_booth)"""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT uuid FROM participants WHERE open_booth = ?", (booth,))]
+
+    def booth_rows(self, booth: str, limit: int) -> list:
+        """ผู้เข้าร่วมของบูธนี้ล่าสุดก่อน (ใช้ index booth) สำหรับ snapshot ของหน้าจอ"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT uuid, status, checkin_time, checkout_time FROM participants "
+                "WHERE booth = ? AND status IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+                (booth, limit),
+            ).fetchall()
+        return [dict(zip(("uuid", "status", "checkin_time", "checkout_time"), r)) for r in rows]
+
+    @property
+    def fresh(self) -> bool:
+        return self.last_sync > 0 and time.monotonic() - self.last_sync < STATE_FRESH
+
+    # -------------------------------------------------
+    # ✍️ Write
+    # -------------------------------------------------
+    def update(self, uuid: str, **fields):
+        """แก้เฉพาะ field ที่ระบุ (สร้างแถวใหม่ถ้ายังไม่มี) แล้วเขียนลง SQLite"""
+        row = self.rows.get(uuid) or {"status": None, "last_time": 0, "booth": None, "checkin_time": None,
+                                      "checkout_time": None, "open_booth": None, "updated_at": 0}
+        row.update(fields)
+        if "updated_at" not in fields:
+            row["updated_at"] = time.time()
+        self.rows[uuid] = row
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO participants (uuid, {', '.join(FIELDS)}) VALUES (?{', ?' * len(FIELDS)})",
+                (uuid, *(row[f] for f in FIELDS)),
+            )
+
+    def __setitem__(self, uuid: str, fields: dict):
+        self.update(uuid, **fields)
+
+    def apply_checkin_row(self, row: dict):
+        """นำแถว checkins (จาก Supabase หรือ journal) มาปรับสถานะ ข้ามแถวที่เก่ากว่าที่รู้อยู่แล้ว"""
+        uuid, booth, status = row.get("uuid"), row.get("booth"), (row.get("status") or "").upper()
+        updated_at = _epoch(row.get("last_updated"))
+        current = self.rows.get(uuid)
+        if not uuid or (current and updated_at < current["updated_at"]):
+            return
+
+        fields = {"updated_at": updated_at}
+        if status == "IN" and not row.get("checkout_time"):
+            fields["open_booth"] = booth
+        elif current and current.get("open_booth") == booth:
+            fields["open_booth"] = None
+
+        if booth == self.booth:
+            if status == "IN":
+                fields.update(status="in", last_time=updated_at, booth=booth,
+                              checkin_time=_clock(row.get("checkin_time")), checkout_time="-")
+            elif status == "OUT":
+                fields.update(status="completed", last_time=updated_at, booth=booth,
+                              checkout_time=_clock(row.get("checkout_time")))
+        self.update(uuid, **fields)
+
+    def _save_cursor(self):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("cursor_id", str(self.cursor))],
+            )
+
+    # -------------------------------------------------
+    # 🔄 Rebuild / sync
+    # -------------------------------------------------
+    def rebuild_from_journal(self, journal):
+        """ไฟล์สถานะหายหรือว่าง: เล่นเหตุการณ์ใน journal ซ้ำ (รวมที่ยังไม่ได้ส่งขึ้น Supabase)"""
+        if self.rows:
+            return
+        count = 0
+        for row in journal.checkin_rows():
+            self.apply_checkin_row(row)
+            count += 1
+        if count:
+            print(f"🗃️ Rebuilt {len(self.rows)} participants from {count} journal events")
+
+    async def sync(self, db) -> int:
+        """
+        ดึงแถว checkins ที่ id > cursor ตามลำดับ id คืนจำนวนแถวใหม่
+        อ่าน STATE_SYNC_OVERLAP แถวก่อน cursor ซ้ำด้วย: id ออกตอน insert แต่ transaction อาจ commit ทีหลัง id ที่มากกว่า
+        เล่นซ้ำตามลำดับ id ได้ผลเดิม (apply_checkin_row ข้ามแถวที่เก่ากว่า, rollup ข้ามแถวที่นับแล้ว)
+        """
+        start = self.cursor
+        after = max(0, start - STATE_SYNC_OVERLAP)
+        applied = 0
+        while True:
+            rows = await db.fetch_checkins(after, STATE_SYNC_PAGE)
+            for row in rows:
+                self.apply_checkin_row(row)
+                self.attendance.record(row)
+                if row["id"] > start:
+                    applied += 1
+                self.cursor = max(self.cursor, row["id"])
+            if len(rows) < STATE_SYNC_PAGE:
+                break
+            after = rows[-1]["id"]
+        if self.cursor != start:
+            self._save_cursor()
+        self.last_sync = time.monotonic()
+        return applied
+
+    def evict(self, ttl: float = STATE_TTL) -> int:
+        """ลบผู้เข้าร่วมที่จบแล้ว (ไม่มี visit เปิดค้าง) และไม่มีการเปลี่ยนแปลงนานกว่า ttl"""
+        cutoff = time.time() - ttl
+        expired = [uuid for uuid, row in self.rows.items()
+                   if row["updated_at"] < cutoff and not row.get("open_booth")]
+        for uuid in expired:
+            del self.rows[uuid]
+        with self._lock:
+            self.conn.execute("DELETE FROM participants WHERE updated_at < ? AND open_booth IS NULL", (cutoff,))
+        self.evicted += len(expired)
+        return len(expired)
+
+    async def run(self, db, journal=None):
+        """rebuild ตอน startup แล้ว sync ทุก STATE_SYNC_INTERVAL วินาที และ evict ทุกชั่วโมง"""
+        if journal is not None:
+            self.rebuild_from_journal(journal)
+        last_evict = 0.0
+        while True:
+            try:
+                applied = await self.sync(db)
+                if applied:
+                    print(f"🔄 Participant state synced {applied} checkins rows (cursor={self.cursor})")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Participant state sync failed: {e}")
+            if time.monotonic() - last_evict > 3600:
+                evicted = self.evict()
+                if evicted:
+                    print(f"🧹 Evicted {evicted} finished participants")
+                last_evict = time.monotonic()
+            await asyncio.sleep(STATE_SYNC_INTERVAL)
+
+    def stats(self) -> dict:
+        statuses = {}
+        for row in self.rows.values():
+            statuses[row["status"] or "other_booth"] = statuses.get(row["status"] or "other_booth", 0) + 1
+        return {
+            "participants": len(self.rows),
+            "by_status": statuses,
+            "cursor": self.cursor,
+            "fresh": self.fresh,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
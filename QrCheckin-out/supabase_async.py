@@ -0,0 +1,248 @@
+import datetime, os, time
+from collections import deque
+import httpx
+from dotenv import load_dotenv
+from scan_trace import span
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+BASE_NAME = os.getenv("BASE_NAME", "CprE-Booth")
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 5.0))
+SUPABASE_KEEPALIVE = float(os.getenv("SUPABASE_KEEPALIVE", 120.0))   # วินาทีที่เก็บ connection ว่างไว้
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 4))
+
+METRIC_WINDOW = 500   # จำนวน latency ล่าสุดที่ใช้คำนวณ percentile ต่อ call
+
+
+# =====================================================
+# 🧾 สร้างแถวสำหรับตาราง checkins
+# =====================================================
+def build_checkin_row(uuid: str, status: str, booth: str = BASE_NAME) -> dict:
+    """แปลงสถานะ Check-in / Check-out / Auto-checkout เป็นแถวของตาราง checkins"""
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+
+    if status.lower().startswith("auto"):
+        # Auto Checkout หรือ Auto Check-in
+        return {
+            "uuid": uuid,
+            "booth": booth,
+            "status": "AUTO_OUT",
+            "checkout_time": now,
+            "checkin_time": None,           # ✅ เพิ่มเพื่อความชัดเจน
+            "last_updated": now,
+        }
+
+    if status.lower() == "check-in":
+        return {
+            "uuid": uuid,
+            "booth": booth,
+            "status": "IN",
+            "checkin_time": now,
+            "checkout_time": None,          # ✅ สำคัญ — ทำให้ server.py หาเจอว่าเปิดค้างอยู่
+            "last_updated": now,
+        }
+
+    return {
+        "uuid": uuid,
+        "booth": booth,
+        "status": "OUT",
+        "checkin_time": None,               # ✅ เพิ่มเพื่อความชัดเจน
+        "checkout_time": now,
+        "last_updated": now,
+    }
+
+
+# =====================================================
+# ⏱️ Latency metrics ต่อ call
+# =====================================================
+class CallMetrics:
+    """เก็บจำนวนครั้ง / error / latency ล่าสุดของแต่ละ call"""
+
+    def __init__(self, window: int = METRIC_WINDOW):
+        self.window = window
+        self.calls = {}
+
+    def record(self, name: str, elapsed_ms: float, ok: bool):
+        entry = self.calls.get(name)
+        if entry is None:
+            entry = self.calls[name] = {"count": 0, "errors": 0, "latencies": deque(maxlen=self.window)}
+        entry["count"] += 1
+        if not ok:
+            entry["errors"] += 1
+        entry["latencies"].append(elapsed_ms)
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, entry in self.calls.items():
+            latencies = sorted(entry["latencies"])
+            summary = {"count": entry["count"], "errors": entry["errors"]}
+            if latencies:
+                summary.update({
+                    "avg_ms": round(sum(latencies) / len(latencies), 1),
+                    "p50_ms": round(latencies[len(latencies) // 2], 1),
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                    "max_ms": round(latencies[-1], 1),
+                })
+            result[name] = summary
+        return result
+
+
+# =====================================================
+# ⚡ Async Supabase (PostgREST) client
+# =====================================================
+class AsyncSupabase:
+    """
+    เรียก PostgREST ของ Supabase ผ่าน httpx.AsyncClient บน event loop ของ FastAPI
+    - ใช้ HTTP/2 + keep-alive: ทุก call วิ่งบน connection เดียว ไม่ต้อง handshake ใหม่ทุกครั้ง
+    - call ที่ไม่ขึ้นต่อกันยิงพร้อมกันได้ (asyncio.gather)
+    - query ฝั่งอ่าน log error แล้วคืนค่าว่าง (False / None), ฝั่งเขียนโยน error ให้ผู้เรียก (journal) retry
+    """
+
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_KEY, booth: str = BASE_NAME,
+                 timeout: float = SUPABASE_TIMEOUT, transport=None):
+        self.booth = booth
+        self.metrics = CallMetrics()
+        self.client = httpx.AsyncClient(
+            base_url=f"{(url or '').rstrip('/')}/rest/v1",
+            headers={
+                "apikey": key or "",
+                "Authorization": f"Bearer {key or ''}",
+                "Content-Type": "application/json",
+            },
+            http2=True,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+                keepalive_expiry=SUPABASE_KEEPALIVE,
+            ),
+            transport=transport,
+        )
+
+    async def _request(self, name: str, method: str, table: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        ok = False
+        try:
+            with span(f"supabase.{name}"):
+                response = await self.client.request(method, f"/{table}", **kwargs)
+            response.raise_for_status()
+            ok = True
+            return response
+        finally:
+            self.metrics.record(name, (time.perf_counter() - started) * 1000, ok)
+
+    async def warmup(self):
+        """เปิด connection ไว้ล่วงหน้า การสแกนครั้งแรกจะได้ไม่ต้องรอ TLS handshake"""
+        try:
+            await self._request("warmup", "GET", "genqrcode", params={"select": "uuid", "limit": 1})
+            print("🔌 Supabase connection ready")
+        except Exception as e:
+            print(f"⚠️ Supabase warmup failed: {e}")
+
+    # -------------------------------------------------
+    # 🔍 Queries
+    # -------------------------------------------------
+    async def uuid_exists(self, uuid: str) -> bool:
+        """ตรวจสอบว่า UUID อยู่ใน genqrcode หรือไม่"""
+        try:
+            response = await self._request(
+                "uuid_exists", "GET", "genqrcode",
+                params={"select": "uuid", "uuid": f"eq.{uuid}", "limit": 1},
+            )
+            return len(response.json()) > 0
+        except Exception as e:
+            print(f"❌ Error checking UUID: {e}")
+            return False
+
+    async def open_checkin(self, uuid: str):
+        """แถว checkins ล่าสุดที่ยังไม่ checkout (checkout_time IS NULL) หรือ None"""
+        try:
+            response = await self._request(
+                "open_checkin", "GET", "checkins",
+                params={
+                    "select": "*",
+                    "uuid": f"eq.{uuid}",
+                    "checkout_time": "is.null",
+                    "order": "last_updated.desc",
+                    "limit": 1,
+                },
+            )
+            rows = response.json()
+            return rows[0] if rows else None
+        except Exception as e:
+            print(f"⚠️ Supabase open check-in lookup failed: {e}")
+            return None
+
+    async def fetch_uuids(self, after_id: int, limit: int) -> list:
+        """แถว genqrcode (id, uuid) ที่ id > after_id เรียงตาม id (ให้ผู้เรียกจัดการ error เอง)"""
+        response = await self._request(
+            "fetch_uuids", "GET", "genqrcode",
+            params={"select": "id,uuid", "id": f"gt.{after_id}", "order": "id.asc", "limit": limit},
+        )
+        return response.json()
+
+    async def fetch_checkins(self, after: int, limit: int) -> list:
+        """แถว checkins ที่ id > after เรียงตาม id (ให้ผู้เรียกจัดการ error เอง)"""
+        response = await self._request(
+            "fetch_checkins", "GET", "checkins",
+            params={
+                "select": "id,uuid,booth,status,checkin_time,checkout_time,last_updated,event_id",
+                "id": f"gt.{after}",
+                "order": "id.asc",
+                "limit": limit,
+            },
+        )
+        return response.json()
+
+    # -------------------------------------------------
+    # 🧾 Writes
+    # -------------------------------------------------
+    async def close_checkin(self, uuid: str, booth: str, checkout_time: str) -> int:
+        """ปิดแถวที่ยังเปิดค้างของบูธเดิม คืนจำนวนแถวที่ถูกอัปเดต (PATCH ซ้ำได้ไม่มีผลข้างเคียง)"""
+        response = await self._request(
+            "close_checkin", "PATCH", "checkins",
+            params={"uuid": f"eq.{uuid}", "booth": f"eq.{booth}", "checkout_time": "is.null"},
+            json={"checkout_time": checkout_time},
+            headers={"Prefer": "return=representation"},
+        )
+        return len(response.json())
+
+    async def insert_checkins(self, rows: list):
+        """bulk insert ลงตาราง checkins; แถวที่ event_id ซ้ำ (ส่งซ้ำหลัง retry) ถูกข้าม"""
+        await self._request(
+            "insert_checkins", "POST", "checkins",
+            params={"on_conflict": "event_id"},
+            json=rows,
+            headers={"Prefer": "resolution=ignore-duplicates,return=minimal"},
+        )
+
+    async def record_scan(self, row: dict) -> dict:
+        """
+        สแกนเดียว (แถวจาก build_checkin_row + event_id) ผ่าน rpc record_scan:
+        ตรวจ uuid + ปิด visit ที่เปิดค้าง + เขียนแถวใหม่ ใน round trip เดียว
+        คืน dict ผลลัพธ์ (result, previous_booth, ...) ให้ผู้เรียกจัดการ error เอง
+        """
+        response = await self._request("record_scan", "POST", "rpc/record_scan", json={
+            "p_uuid": row["uuid"],
+            "p_booth": row["booth"],
+            "p_status": row["status"],
+            "p_event_id": row.get("event_id"),
+            "p_at": row["last_updated"],
+        })
+        return response.json()
+
+    async def record_scans(self, rows: list) -> list:
+        """
+        ส่งแถว checkins หลายแถวเข้า rpc record_scans (sql/002_record_scan.sql) ในคำขอเดียว
+        ฐานข้อมูลตรวจ uuid, ปิด visit ที่เปิดค้าง และเขียนแถวใหม่ของทุกแถวใน transaction เดียว
+        คืนผลของแต่ละแถว (result = checkin | auto_checkout | checkout | duplicate | invalid)
+        """
+        response = await self._request("record_scans", "POST", "rpc/record_scans", json={"p_events": rows})
+        return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# โมดูลของ QrCheckin-out เป็นไฟล์เดี่ยวในโฟลเดอร์หลัก (import แบบเดียวกับ server.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import broadcaster
+from broadcaster import Broadcaster, ClientChannel
+
+
+class FakeWebSocket:
+    """WebSocket ของหน้าจอหนึ่งเครื่อง: stall=True ค้างตอนส่ง, fail=True ส่งแล้ว error"""
+
+    def __init__(self, name: str, stall: bool = False, fail: bool = False):
+        self.client = name
+        self.stall = stall
+        self.fail = fail
+        self.received = []
+        self.release = asyncio.Event()
+        self.closed = False
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise ConnectionResetError("gone")
+        if self.stall:
+            await self.release.wait()
+        self.received.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+async def settle(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def test_new_client_gets_snapshot_then_events():
+    async def main():
+        hub = Broadcaster()
+        first, second = FakeWebSocket("a"), FakeWebSocket("b")
+        hub.connect(first, snapshot={"type": "snapshot", "rows": []})
+        hub.connect(second)
+        hub.publish({"type": "checkin", "uuid": "U1"})
+        hub.publish({"type": "checkout", "uuid": "U1"})
+        await settle(lambda: len(first.received) == 3 and len(second.received) == 2)
+        return hub, first, second
+
+    hub, first, second = asyncio.run(main())
+    assert [m["type"] for m in first.received] == ["snapshot", "checkin", "checkout"]
+    assert [m["type"] for m in second.received] == ["checkin", "checkout"]
+    assert hub.stats()["published"] == 2
+
+
+def test_stalled_client_is_evicted_without_delaying_others(monkeypatch):
+    monkeypatch.setattr(broadcaster, "WS_SEND_TIMEOUT", 0.05)
+
+    async def main():
+        hub = Broadcaster()
+        slow, fast = FakeWebSocket("slow", stall=True), FakeWebSocket("fast")
+        hub.connect(slow)
+        hub.connect(fast)
+        for n in range(5):
+            hub.publish({"n": n})
+            await asyncio.sleep(0)
+        # หน้าจอปกติได้ครบทันที ไม่ต้องรอ timeout ของหน้าจอที่ค้าง
+        await settle(lambda: len(fast.received) == 5, timeout=0.04)
+        await settle(lambda: slow not in hub.channels)
+        hub.publish({"n": 5})
+        await settle(lambda: len(fast.received) == 6)
+        return hub, slow, fast
+
+    hub, slow, fast = asyncio.run(main())
+    assert [m["n"] for m in fast.received] == list(range(6))
+    assert slow.received == [] and slow.closed
+    assert hub.stats()["clients"] == 1
+
+
+def test_failed_send_closes_and_disconnects_client():
+    async def main():
+        hub = Broadcaster()
+        broken = FakeWebSocket("broken", fail=True)
+        hub.connect(broken)
+        hub.publish({"n": 1})
+        await settle(lambda: not hub.channels)
+        return broken
+
+    assert asyncio.run(main()).closed
+
+
+def test_full_queue_drops_oldest_message():
+    async def main():
+        ws = FakeWebSocket("slow", stall=True)
+        channel = ClientChannel(ws, on_close=lambda _: None, queue_size=2)
+        channel.put('{"n":0}')
+        await asyncio.sleep(0)          # writer รับข้อความแรกไปแล้วค้างอยู่ที่ send
+        for n in range(1, 5):
+            channel.put(json.dumps({"n": n}))
+        ws.release.set()
+        await settle(lambda: len(ws.received) == 3)
+        channel.close()
+        return ws, channel
+
+    ws, channel = asyncio.run(main())
+    assert [m["n"] for m in ws.received] == [0, 3, 4]
+    assert channel.dropped == 2
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import httpx
+import pytest
+import checkin_journal
+from checkin_journal import CheckinJournal
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.supabase.co/rest/v1/checkins")
+    response = httpx.Response(status, text="rejected", request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+class FakeDB:
+    """checkins บน Supabase แบบย่อ: upsert ตาม event_id (on_conflict=event_id) และ error ที่สั่งได้"""
+
+    def __init__(self):
+        self.booth = "A"
+        self.rows = {}
+        self.calls = []
+        self.errors = []          # exception ที่จะโยนในการเรียกครั้งถัดๆ ไป (None = สำเร็จ)
+        self.apply_then_fail = False
+        self.poisoned = set()     # uuid ที่ทำให้ทั้งชุดถูกปฏิเสธ (400)
+
+    def _maybe_fail(self):
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+
+    async def insert_checkins(self, rows):
+        self.calls.append(("insert", [row["uuid"] for row in rows]))
+        if self.apply_then_fail:
+            # เขียนสำเร็จแต่คำตอบหายระหว่างทาง (timeout)
+            self.apply_then_fail = False
+            self.rows.update((row["event_id"], row) for row in rows)
+            raise httpx.ReadTimeout("timed out")
+        self._maybe_fail()
+        if any(row["uuid"] in self.poisoned for row in rows):
+            raise http_error(400)
+        self.rows.update((row["event_id"], row) for row in rows)
+
+    async def close_checkin(self, uuid, booth, checkout_time):
+        self.calls.append(("close", [uuid]))
+        self._maybe_fail()
+        return 1
+
+
+@pytest.fixture
+def db():
+    return FakeDB()
+
+
+@pytest.fixture
+def journal(db, tmp_path):
+    journal = CheckinJournal(db, path=str(tmp_path / "journal.db"), rpc=False)
+    yield journal
+    journal.close()
+
+
+def states(journal) -> list:
+    return [tuple(r) for r in journal.conn.execute("SELECT state, attempts FROM journal ORDER BY id")]
+
+
+def test_flush_batches_inserts_in_journal_order(journal, db):
+    journal.checkin("U1", "Check-in")
+    journal.checkin("U2", "Check-in")
+    journal.close_checkin("U1", "B", "2026-10-17T10:00:00")
+    journal.checkin("U3", "Check-in")
+
+    assert asyncio.run(journal.flush()) == 4
+    assert db.calls == [("insert", ["U1", "U2"]), ("close", ["U1"]), ("insert", ["U3"])]
+    assert journal.pending_count() == 0
+
+
+def test_transient_error_keeps_events_pending(journal, db):
+    journal.checkin("U1", "Check-in")
+    journal.checkin("U2", "Check-in")
+    db.errors = [http_error(503)]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(journal.flush())
+    assert states(journal) == [("pending", 1), ("pending", 1)]
+    assert db.rows == {}
+
+    assert asyncio.run(journal.flush()) == 2
+    assert states(journal) == [("sent", 2), ("sent", 2)]
+    assert sorted(row["uuid"] for row in db.rows.values()) == ["U1", "U2"]
+
+
+def test_resend_after_lost_response_reuses_event_id(journal, db):
+    journal.checkin("U1", "Check-in")
+    db.apply_then_fail = True
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(journal.flush())
+    assert asyncio.run(journal.flush()) == 1
+
+    # ส่งสองครั้งด้วย event_id เดิม ฝั่ง Supabase จึงมีแถวเดียว
+    assert db.calls == [("insert", ["U1"]), ("insert", ["U1"])]
+    assert len(db.rows) == 1
+    event_id = journal.conn.execute("SELECT event_id FROM journal").fetchone()[0]
+    assert list(db.rows) == [event_id]
+
+
+def test_every_event_gets_its_own_event_id(journal):
+    journal.checkin("U1", "Check-in")
+    journal.checkin("U1", "Check-out")
+    journal.close_checkin("U1", "B", "2026-10-17T10:00:00")
+    event_ids = [r[0] for r in journal.conn.execute("SELECT event_id FROM journal ORDER BY id")]
+    assert len(set(event_ids)) == 3
+    payload = json.loads(journal.conn.execute("SELECT payload FROM journal ORDER BY id").fetchone()[0])
+    assert payload["event_id"] == event_ids[0]
+
+
+def test_rejected_event_is_failed_without_blocking_the_queue(journal, db):
+    journal.close_checkin("U1", "B", "2026-10-17T10:00:00")
+    journal.checkin("U2", "Check-in")
+    db.errors = [http_error(400)]
+
+    assert asyncio.run(journal.flush()) == 1
+    assert [s for s, _ in states(journal)] == ["failed", "sent"]
+    assert journal.stats()["failed"] == 1
+
+
+def test_rejected_batch_is_retried_one_event_at_a_time(journal, db):
+    for uuid in ("U1", "BAD", "U3"):
+        journal.checkin(uuid, "Check-in")
+    db.poisoned.add("BAD")
+
+    assert asyncio.run(journal.flush()) == 2
+    assert db.calls == [("insert", ["U1", "BAD", "U3"]),
+                        ("insert", ["U1"]), ("insert", ["BAD"]), ("insert", ["U3"])]
+    assert [s for s, _ in states(journal)] == ["sent", "failed", "sent"]
+
+    # หลังแยกส่งครบแล้ว กลับไปส่งเป็นชุดตามปกติ
+    journal.checkin("U4", "Check-in")
+    journal.checkin("U5", "Check-in")
+    assert asyncio.run(journal.flush()) == 2
+    assert db.calls[-1] == ("insert", ["U4", "U5"])
+
+
+def test_unsent_events_survive_restart(db, tmp_path):
+    path = str(tmp_path / "journal.db")
+    first = CheckinJournal(db, path=path, rpc=False)
+    first.checkin("U1", "Check-in")
+    first.close()
+
+    second = CheckinJournal(db, path=path, rpc=False)
+    try:
+        assert second.pending_count() == 1
+        assert asyncio.run(second.flush()) == 1
+        assert [row["uuid"] for row in db.rows.values()] == ["U1"]
+    finally:
+        second.close()
+
+
+def test_run_backs_off_and_retries_until_sent(journal, db, monkeypatch):
+    monkeypatch.setattr(checkin_journal.random, "uniform", lambda a, b: 0.05)
+    monkeypatch.setattr(checkin_journal, "JOURNAL_MAX_BACKOFF", 0.05)
+    db.errors = [httpx.ConnectError("offline"), httpx.ConnectError("offline")]
+    journal.checkin("U1", "Check-in")
+
+    async def run_until_sent():
+        task = asyncio.create_task(journal.run())
+        try:
+            for _ in range(200):
+                if journal.pending_count() == 0:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run_until_sent())
+    stats = journal.stats()
+    assert stats["pending"] == 0 and stats["sent"] == 1
+    assert stats["retries"] == 2
+    assert stats["backoff_s"] == 0.0 and stats["last_error"] is None
@@ -0,0 +1,168 @@
+import asyncio
+import pytest
+from lan_replica import HybridClock, ScanReplica
+from state_store import ParticipantStore
+
+BASE = 1_760_000_000_000
+
+
+class FakeJournal:
+    def __init__(self, rpc=True):
+        self.rpc = rpc
+        self.rows = []
+        self.history = []
+
+    def append_scan(self, row: dict, history: bool = False):
+        (self.history if history else self.rows).append(row)
+
+
+class Wall:
+    def __init__(self, millis: int):
+        self.millis = millis
+
+    def __call__(self) -> int:
+        return self.millis
+
+
+@pytest.fixture
+def make_replica(tmp_path):
+    replicas = []
+
+    def make(booth: str, skew: int = 0, peers=(), journal=None):
+        replica = ScanReplica(
+            booth, journal or FakeJournal(), ParticipantStore(booth, str(tmp_path / f"state-{booth}.db")),
+            peers=list(peers), path=str(tmp_path / f"replica-{booth}.db"), token="secret",
+        )
+        replica.clock = HybridClock(booth, wall=Wall(BASE + skew))
+        replicas.append(replica)
+        return replica
+
+    yield make
+    for replica in replicas:
+        asyncio.run(replica.aclose())
+
+
+# =====================================================
+# 🕰️ HybridClock
+# =====================================================
+def test_clock_is_monotonic_when_wall_goes_back():
+    wall = Wall(BASE)
+    clock = HybridClock("A", wall=wall)
+    first = clock.now()
+    wall.millis -= 5000
+    second = clock.now()
+    wall.millis += 10000
+    third = clock.now()
+    assert first < second < third
+    assert HybridClock.decode(second) == (BASE, 1, "A")
+
+
+def test_update_catches_up_with_remote_ahead():
+    clock = HybridClock("A", wall=Wall(BASE))
+    remote = HybridClock.encode(BASE + 10000, 3, "B")
+    clock.update(remote)
+    assert clock.now() > remote
+    assert HybridClock.decode(clock.peek())[:2] == (BASE + 10000, 5)
+
+
+def test_encode_round_trip_and_sort_order():
+    stamp = HybridClock.encode(BASE, 7, "booth-1")
+    assert HybridClock.decode(stamp) == (BASE, 7, "booth-1")
+    stamps = [HybridClock.encode(m, c, n) for m, c, n in
+              [(BASE + 1, 0, "A"), (BASE, 10, "A"), (BASE, 2, "B"), (BASE, 2, "A"), (999, 0, "Z")]]
+    assert sorted(stamps) == [stamps[4], stamps[3], stamps[2], stamps[1], stamps[0]]
+
+
+# =====================================================
+# 🛰️ ScanReplica merge
+# =====================================================
+def test_later_scan_wins_despite_clock_skew(make_replica):
+    a = make_replica("A", skew=10000)
+    b = make_replica("B")
+    a.record("U1", "Check-in")
+    b.apply(a.entries_after(0))
+    b.record("U1", "Check-in")
+    a.apply(b.entries_after(0))
+    assert a.open_booth("U1") == b.open_booth("U1") == "B"
+
+
+def test_out_of_order_delivery_converges(make_replica):
+    a = make_replica("A", skew=10000)
+    b = make_replica("B")
+    c = make_replica("C")
+    a.record("U1", "Check-in")
+    b.apply(a.entries_after(0))
+    b.record("U1", "Check-in")
+    c.apply(b.entries_after(0))
+    c.apply(a.entries_after(0))
+    assert c.open_booth("U1") == "B"
+    assert c.participants.get("U1")["open_booth"] == "B"
+
+
+def test_apply_ignores_duplicates(make_replica):
+    a = make_replica("A")
+    b = make_replica("B")
+    a.record("U1", "Check-in")
+    assert b.apply(a.entries_after(0)) == 1
+    assert b.apply(a.entries_after(0)) == 0
+    assert b.last_seq() == 1
+
+
+def test_reconcile_sends_rows_in_hlc_order(make_replica):
+    journal = FakeJournal()
+    a = make_replica("A", skew=10000)
+    b = make_replica("B", journal=journal)
+    first = a.record("U1", "Check-in")
+    b.apply(a.entries_after(0))
+    second = b.record("U1", "Check-in")
+    assert b.reconcile() == 2
+    assert [row["event_id"] for row in journal.rows] == [first["event_id"], second["event_id"]]
+    assert b.reconcile() == 0
+
+
+def test_watermark_waits_for_live_peer(make_replica):
+    a = make_replica("A", peers=["http://booth-b:8000"])
+    a.record("U1", "Check-in")
+    assert a.watermark() is None
+    assert a.reconcile() == 0
+    peer_clock = HybridClock.encode(BASE - 1000, 0, "B")
+    a.peers[0].clock = peer_clock
+    assert a.watermark() == peer_clock
+    assert a.reconcile() == 0
+
+
+def test_late_events_from_dead_peer_become_history(make_replica):
+    journal = FakeJournal()
+    c = make_replica("C", skew=-60000)
+    b = make_replica("B", peers=["http://booth-c:8000"], journal=journal)
+    b.started -= 10 * 3600                            # C ไม่ตอบนานเกิน REPLICA_PEER_DEAD
+    stale = c.record("U1", "Check-in")
+    c.record("U2", "Check-in")
+    newer = b.record("U1", "Check-in")
+    assert b.reconcile() == 1
+
+    assert b.apply(c.entries_after(0)) == 2           # C กลับมาพร้อมเหตุการณ์ที่เก่ากว่า watermark
+    assert b.reconcile() == 2
+    assert [row["event_id"] for row in journal.rows] == [newer["event_id"], c.entries_after(1)[0]["row"]["event_id"]]
+    assert [row["event_id"] for row in journal.history] == [stale["event_id"]]
+    assert journal.history[0]["checkout_time"] == newer["last_updated"]
+    assert b.open_booth("U1") == "B"
+    assert b.stats()["late"] == 1
+
+
+# =====================================================
+# 🔐 Guards
+# =====================================================
+def test_requires_token_and_rpc(tmp_path):
+    participants = ParticipantStore("A", str(tmp_path / "state.db"))
+    with pytest.raises(RuntimeError, match="REPLICA_TOKEN"):
+        ScanReplica("A", FakeJournal(), participants, peers=[], path=str(tmp_path / "r.db"), token="")
+    with pytest.raises(RuntimeError, match="RECORD_SCAN_RPC"):
+        ScanReplica("A", FakeJournal(rpc=False), participants, peers=[], path=str(tmp_path / "r.db"), token="t")
+
+
+def test_authorized_compares_token(make_replica):
+    a = make_replica("A")
+    assert a.authorized("secret")
+    assert not a.authorized("wrong")
+    assert not a.authorized(None)
@@ -0,0 +1,97 @@
+import threading
+import pytest
+import record_scan
+
+
+@pytest.fixture
+def conn():
+    conn = record_scan.connect()
+    conn.executemany("INSERT INTO genqrcode (uuid) VALUES (?)", [("U1",), ("U2",)])
+    return conn
+
+
+def open_rows(conn, uuid: str) -> list:
+    return [tuple(r) for r in conn.execute(
+        "SELECT booth, status FROM checkins WHERE uuid = ? AND checkout_time IS NULL", (uuid,))]
+
+
+def test_checkin_opens_a_visit(conn):
+    result = record_scan.record_scan(conn, "U1", "A", "IN", "e1", "2026-10-17T10:00:00")
+    assert result["result"] == "checkin"
+    assert result["previous_booth"] is None
+    assert open_rows(conn, "U1") == [("A", "IN")]
+
+
+def test_checkin_at_other_booth_auto_checks_out(conn):
+    record_scan.record_scan(conn, "U1", "A", "IN", "e1", "2026-10-17T10:00:00")
+    result = record_scan.record_scan(conn, "U1", "B", "IN", "e2", "2026-10-17T10:05:00")
+    assert result["result"] == "auto_checkout"
+    assert result["previous_booth"] == "A"
+    assert result["closed"] == 1
+    assert open_rows(conn, "U1") == [("B", "IN")]
+    closed = conn.execute("SELECT checkout_time FROM checkins WHERE event_id = 'e1'").fetchone()[0]
+    assert closed == "2026-10-17T10:05:00"
+
+
+def test_checkout_closes_the_in_row_at_same_booth(conn):
+    record_scan.record_scan(conn, "U1", "A", "IN", "e1", "2026-10-17T10:00:00")
+    result = record_scan.record_scan(conn, "U1", "A", "OUT", "e2", "2026-10-17T10:30:00")
+    assert result["result"] == "checkout"
+    assert result["closed"] == 1
+    assert open_rows(conn, "U1") == []
+
+
+def test_duplicate_event_id_is_not_written_twice(conn):
+    record_scan.record_scan(conn, "U1", "A", "IN", "e1", "2026-10-17T10:00:00")
+    again = record_scan.record_scan(conn, "U1", "B", "IN", "e1", "2026-10-17T10:01:00")
+    assert again["result"] == "duplicate"
+    assert conn.execute("SELECT COUNT(*) FROM checkins").fetchone()[0] == 1
+    assert open_rows(conn, "U1") == [("A", "IN")]
+
+
+def test_invalid_uuid_writes_nothing(conn):
+    result = record_scan.record_scan(conn, "FORGED", "A", "IN", "e1")
+    assert result["result"] == "invalid"
+    assert conn.execute("SELECT COUNT(*) FROM checkins").fetchone()[0] == 0
+
+
+def test_record_scans_batch_in_order(conn):
+    results = record_scan.record_scans(conn, [
+        {"uuid": "U1", "booth": "A", "status": "IN", "event_id": "e1", "last_updated": "2026-10-17T10:00:00"},
+        {"uuid": "U1", "booth": "B", "status": "IN", "event_id": "e2", "last_updated": "2026-10-17T10:01:00"},
+        {"uuid": "BAD", "booth": "B", "status": "IN", "event_id": "e3", "last_updated": "2026-10-17T10:02:00"},
+        {"uuid": "U1", "booth": "A", "status": "IN", "event_id": "e1", "last_updated": "2026-10-17T10:03:00"},
+    ])
+    assert [r["result"] for r in results] == ["checkin", "auto_checkout", "invalid", "duplicate"]
+    assert open_rows(conn, "U1") == [("B", "IN")]
+
+
+def test_concurrent_booths_leave_one_open_visit(tmp_path):
+    path = str(tmp_path / "checkins.db")
+    record_scan.connect(path).execute("INSERT INTO genqrcode (uuid) VALUES ('U1')")
+
+    def booth(name: str):
+        conn = record_scan.connect(path)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        for i in range(30):
+            record_scan.record_scan(conn, "U1", name, "IN", f"{name}-{i}")
+
+    threads = [threading.Thread(target=booth, args=(name,)) for name in "ABC"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    conn = record_scan.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM checkins").fetchone()[0] == 90
+    assert len(open_rows(conn, "U1")) == 1
+
+
+def test_checkin_reports_most_recent_open_booth(conn):
+    conn.executemany(
+        "INSERT INTO checkins (uuid, booth, status, checkin_time, last_updated) VALUES ('U1', ?, 'IN', ?, ?)",
+        [("Z", "2026-10-17T09:00:00", "2026-10-17T09:00:00"), ("B", "2026-10-17T10:00:00", "2026-10-17T10:00:00")],
+    )
+    result = record_scan.record_scan(conn, "U1", "A", "IN", "e1", "2026-10-17T10:05:00")
+    assert result["previous_booth"] == "B"
+    assert result["closed"] == 2
+    assert open_rows(conn, "U1") == [("A", "IN")]
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import zlib
+from scan_pipeline import ScanPipeline
+
+UUIDS = [f"U{i:02d}" for i in range(12)]
+
+
+def shard(uuid: str, workers: int) -> int:
+    return zlib.crc32(uuid.encode()) % workers
+
+
+def test_submit_before_start_is_refused():
+    async def handler(uuid):
+        pass
+
+    assert ScanPipeline(handler).submit("U1") is False
+
+
+def test_each_uuid_is_processed_in_scan_order_one_at_a_time():
+    workers = 4
+    assert len({shard(uuid, workers) for uuid in UUIDS}) > 1
+    rng = random.Random(7)
+    scans = [(rng.choice(UUIDS), n) for n in range(200)]
+    processed, active, overlap = [], set(), []
+
+    async def main():
+        numbers = {}
+
+        async def handler(uuid):
+            if uuid in active:
+                overlap.append(uuid)
+            active.add(uuid)
+            await asyncio.sleep(rng.random() / 1000)
+            processed.append((uuid, numbers[uuid].pop(0)))
+            active.discard(uuid)
+
+        pipeline = ScanPipeline(handler, workers=workers, queue_size=len(scans))
+        pipeline.start()
+
+        def scanner_thread():
+            # เหมือน scanner.py: submit จากเธรดอื่นตามลำดับการสแกน
+            for uuid, n in scans:
+                numbers.setdefault(uuid, []).append(n)
+                assert pipeline.submit(uuid)
+
+        await asyncio.get_running_loop().run_in_executor(None, scanner_thread)
+        while pipeline.processed < len(scans):
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+        return pipeline.stats()
+
+    stats = asyncio.run(main())
+    assert overlap == []
+    assert stats["processed"] == stats["submitted"] == len(scans)
+    for uuid in UUIDS:
+        expected = [n for u, n in scans if u == uuid]
+        assert [n for u, n in processed if u == uuid] == expected
+    # แต่ละ worker ทำงานตามลำดับคิวของตัวเอง
+    for worker in range(workers):
+        assert [n for u, n in processed if shard(u, workers) == worker] == \
+               [n for u, n in scans if shard(u, workers) == worker]
+
+
+def test_slow_uuid_does_not_block_other_shards():
+    slow, fast = "U00", next(u for u in UUIDS if shard(u, 4) != shard("U00", 4))
+    done = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(uuid):
+            if uuid == slow:
+                await release.wait()
+            done.append(uuid)
+
+        pipeline = ScanPipeline(handler, workers=4)
+        pipeline.start()
+        pipeline.submit(slow)
+        pipeline.submit(fast)
+        for _ in range(100):
+            if done:
+                break
+            await asyncio.sleep(0.01)
+        release.set()
+        while pipeline.processed < 2:
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+
+    asyncio.run(main())
+    assert done == [fast, slow]
+
+
+def test_full_queue_drops_scan_and_failures_do_not_stop_worker():
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(uuid):
+            if uuid == "first":
+                await release.wait()
+            if uuid == "boom":
+                raise RuntimeError("db down")
+            handled.append(uuid)
+
+        pipeline = ScanPipeline(handler, workers=1, queue_size=2)
+        pipeline.start()
+        pipeline.submit("first")
+        while not pipeline.stats()["submitted"] or pipeline.depth():
+            await asyncio.sleep(0.01)   # worker รับ "first" ไปแล้วและค้างอยู่
+        for uuid in ("boom", "second", "dropped"):
+            pipeline.submit(uuid)
+        await asyncio.sleep(0.05)
+        assert pipeline.depth() == 2
+        release.set()
+        while pipeline.processed < 3:
+            await asyncio.sleep(0.01)
+        await pipeline.stop()
+        return pipeline.stats()
+
+    stats = asyncio.run(main())
+    assert handled == ["first", "second"]
+    assert (stats["submitted"], stats["dropped"], stats["failed"], stats["processed"]) == (3, 1, 1, 3)
@@ -0,0 +1,183 @@
+import pytest
+import scanner
+from evdev import ecodes
+from scanner import ScanLane
+
+DIGITS = list(range(2, 12))
+CODES = {char: code for code, char in scanner.KEY_MAP.items()}
+
+
+class FakeInfo:
+    def __init__(self, vendor: int, product: int):
+        self.vendor = vendor
+        self.product = product
+
+
+class FakeDevice:
+    """InputDevice แบบย่อ: พอสำหรับ is_scanner / ScanLane / _rescan"""
+    next_fd = 100
+
+    def __init__(self, path: str, name: str, keys, vendor: int = 0x0c2e, product: int = 0x0b61):
+        self.path = path
+        self.name = name
+        self.info = FakeInfo(vendor, product)
+        self.keys = list(keys)
+        self.fd = FakeDevice.next_fd
+        FakeDevice.next_fd += 1
+        self.closed = False
+
+    def capabilities(self):
+        return {ecodes.EV_KEY: self.keys}
+
+    def grab(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSelector:
+    def __init__(self):
+        self.registered = {}
+
+    def register(self, fd, events, data):
+        self.registered[fd] = data
+
+    def unregister(self, fd):
+        del self.registered[fd]
+
+
+def scanner_device(path, name="Honeywell Imager", vendor=0x0c2e):
+    return FakeDevice(path, name, DIGITS + [ecodes.KEY_ENTER], vendor=vendor)
+
+
+def lane_for(code_feed):
+    lane = ScanLane(scanner_device("/dev/input/event0"))
+    return lane, [lane.feed(code, t) for t, code in code_feed]
+
+
+# =====================================================
+# 📟 ScanLane
+# =====================================================
+def test_feed_decodes_scancodes_until_enter():
+    codes = [CODES[c] for c in "AB12Z9"] + [ecodes.KEY_ENTER]
+    lane, results = lane_for(enumerate(codes))
+    assert results == [None] * 6 + ["AB12Z9"]
+    assert lane.length == 0
+
+
+def test_feed_ignores_keys_outside_the_code_alphabet():
+    codes = [ecodes.KEY_LEFTSHIFT, CODES["Q"], ecodes.KEY_MINUS, CODES["1"], 300, ecodes.KEY_KPENTER]
+    _, results = lane_for(enumerate(codes))
+    assert results[-1] == "Q1"
+
+
+def test_tab_also_terminates_and_empty_frames_are_skipped():
+    _, results = lane_for(enumerate([ecodes.KEY_ENTER, CODES["7"], ecodes.KEY_TAB, ecodes.KEY_ENTER]))
+    assert results == [None, None, "7", None]
+
+
+def test_code_is_cut_at_max_length():
+    codes = [CODES["5"]] * (scanner.MAX_CODE_LENGTH + 10) + [ecodes.KEY_ENTER]
+    _, results = lane_for(enumerate(codes))
+    assert results[-1] == "5" * scanner.MAX_CODE_LENGTH
+
+
+def test_frame_without_terminator_expires_after_silence():
+    lane, _ = lane_for([(10.0, CODES["4"]), (10.01, CODES["2"])])
+    assert not lane.expired(10.01 + scanner.SCANNER_FRAME_TIMEOUT / 2)
+    assert lane.expired(10.01 + scanner.SCANNER_FRAME_TIMEOUT)
+    assert lane.flush() == "42"
+    assert not lane.expired(100.0)
+
+
+def test_lanes_decode_interleaved_scanners_independently():
+    a = ScanLane(scanner_device("/dev/input/event0"))
+    b = ScanLane(scanner_device("/dev/input/event1"))
+    out = []
+    for lane, char in ((a, "1"), (b, "X"), (a, "2"), (b, "Y"), (b, None), (a, None)):
+        code = lane.feed(CODES[char] if char else ecodes.KEY_ENTER, 0.0)
+        if code:
+            out.append(code)
+    assert out == ["XY", "12"]
+
+
+# =====================================================
+# 🔁 Hot-plug
+# =====================================================
+@pytest.fixture
+def bus(monkeypatch):
+    """/dev/input จำลอง: path -> FakeDevice (ลบ = ถอด, ใส่ object ใหม่ = เสียบใหม่)"""
+    devices = {}
+    opened = []
+
+    def open_device(path):
+        if path not in devices:
+            raise OSError(19, "No such device")
+        opened.append(path)
+        return devices[path]
+
+    monkeypatch.setattr(scanner, "SCANNER_DEVICES", [])
+    monkeypatch.setattr(scanner, "SCANNER_IDS", set())
+    monkeypatch.setattr(scanner, "list_devices", lambda: list(devices))
+    monkeypatch.setattr(scanner, "InputDevice", open_device)
+    monkeypatch.setattr(scanner, "_node_id", lambda path: id(devices[path]) if path in devices else None)
+    return devices, opened
+
+
+def test_rescan_opens_plugged_scanners_and_closes_unplugged(bus):
+    devices, _ = bus
+    selector, lanes, ignored = FakeSelector(), {}, {}
+    first = devices["/dev/input/event3"] = scanner_device("/dev/input/event3")
+
+    scanner._rescan(selector, lanes, ignored)
+    assert list(lanes) == ["/dev/input/event3"]
+    assert selector.registered == {first.fd: "/dev/input/event3"}
+
+    del devices["/dev/input/event3"]
+    scanner._rescan(selector, lanes, ignored)
+    assert lanes == {} and selector.registered == {}
+    assert first.closed
+
+    second = devices["/dev/input/event3"] = scanner_device("/dev/input/event3")
+    scanner._rescan(selector, lanes, ignored)
+    assert lanes["/dev/input/event3"].dev is second
+    assert selector.registered == {second.fd: "/dev/input/event3"}
+
+
+def test_non_scanner_devices_are_checked_once(bus):
+    devices, opened = bus
+    selector, lanes, ignored = FakeSelector(), {}, {}
+    devices["/dev/input/mouse"] = FakeDevice("/dev/input/mouse", "USB Mouse", [ecodes.BTN_LEFT])
+
+    for _ in range(3):
+        scanner._rescan(selector, lanes, ignored)
+    assert opened == ["/dev/input/mouse"]
+    assert lanes == {}
+    assert devices["/dev/input/mouse"].closed
+
+
+def test_replugged_device_at_an_ignored_path_is_checked_again(bus):
+    devices, opened = bus
+    selector, lanes, ignored = FakeSelector(), {}, {}
+    devices["/dev/input/event5"] = FakeDevice("/dev/input/event5", "USB Mouse", [ecodes.BTN_LEFT])
+    scanner._rescan(selector, lanes, ignored)
+    assert lanes == {}
+
+    # ถอดเมาส์แล้วเสียบเครื่องสแกนที่ได้ path เดิมก่อน rescan รอบถัดไป
+    devices["/dev/input/event5"] = scanner_device("/dev/input/event5")
+    scanner._rescan(selector, lanes, ignored)
+    assert list(lanes) == ["/dev/input/event5"]
+    assert opened == ["/dev/input/event5", "/dev/input/event5"]
+
+
+def test_auto_detect_skips_plain_keyboards(bus):
+    devices, _ = bus
+    selector, lanes, ignored = FakeSelector(), {}, {}
+    keys = DIGITS + [ecodes.KEY_ENTER]
+    devices["/dev/input/event1"] = FakeDevice("/dev/input/event1", "Dell USB Keyboard", keys, vendor=0x413c)
+    devices["/dev/input/event2"] = FakeDevice("/dev/input/event2", "Honeywell Imager", keys, vendor=0x0c2e)
+    devices["/dev/input/event4"] = FakeDevice("/dev/input/event4", "USB Barcode Scanner", keys, vendor=0x1234)
+
+    scanner._rescan(selector, lanes, ignored)
+    assert sorted(lanes) == ["/dev/input/event2", "/dev/input/event4"]
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+import uuid_cache
+from uuid_cache import BloomFilter, UuidCache
+
+
+class FakeGenqrcode:
+    """genqrcode ในหน่วยความจำ: fetch_uuids แบบเดียวกับ AsyncSupabase และจำ cursor ที่ถูกขอ"""
+
+    def __init__(self, count: int = 0):
+        self.rows = []
+        self.calls = []
+        self.online = True
+        self.add(count)
+
+    def add(self, count: int):
+        start = len(self.rows)
+        self.rows += [{"id": i, "uuid": f"uuid-{i}"} for i in range(start + 1, start + count + 1)]
+
+    async def fetch_uuids(self, after_id: int, limit: int) -> list:
+        if not self.online:
+            raise ConnectionError("offline")
+        self.calls.append(after_id)
+        return [r for r in self.rows if r["id"] > after_id][:limit]
+
+    async def uuid_exists(self, uuid: str) -> bool:
+        return any(r["uuid"] == uuid for r in self.rows)
+
+
+def test_bloom_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(5000)
+    for i in range(5000):
+        bloom.add(f"member-{i}")
+    assert all(f"member-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.005          # ออกแบบไว้ 0.1%
+
+
+def test_bloom_grows_past_capacity(tmp_path, monkeypatch):
+    monkeypatch.setattr(uuid_cache, "BLOOM_CAPACITY", 10)
+    cache = UuidCache(FakeGenqrcode(), path=tmp_path / "uuids.json")
+    cache._add(f"uuid-{i}" for i in range(100))
+    assert cache.bloom.capacity >= 100
+    assert all(cache._known(f"uuid-{i}") for i in range(100))
+
+
+def test_sync_pages_by_id_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(uuid_cache, "UUID_SYNC_PAGE", 1000)
+    db = FakeGenqrcode(2500)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+
+    assert asyncio.run(cache.sync()) == 2500
+    assert cache.cursor == 2500
+    assert db.calls == [0, 1000, 2000]
+
+    db.add(10)
+    db.calls.clear()
+    assert asyncio.run(cache.sync()) == 10
+    assert db.calls == [2500]                         # incremental: เริ่มจาก cursor เดิม
+    assert cache.cursor == 2510
+
+
+def test_snapshot_restores_uuids_and_cursor(tmp_path):
+    path = tmp_path / "uuids.json"
+    first = UuidCache(FakeGenqrcode(30), path=path)
+    asyncio.run(first.sync())
+
+    second = UuidCache(FakeGenqrcode(), path=path)
+    second.load()
+    assert second.loaded and second.cursor == 30
+    assert asyncio.run(second.contains("uuid-7"))
+
+
+def test_contains_just_synced_rejects_without_network(tmp_path):
+    db = FakeGenqrcode(5)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+    asyncio.run(cache.sync())
+    db.calls.clear()
+    assert asyncio.run(cache.contains("uuid-3"))
+    assert not asyncio.run(cache.contains("forged"))
+    assert db.calls == []
+    assert (cache.hits, cache.rejects) == (1, 1)
+
+
+def test_contains_fresh_cache_syncs_for_new_qr(tmp_path, monkeypatch):
+    db = FakeGenqrcode(5)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+    asyncio.run(cache.sync())
+    monkeypatch.setattr(uuid_cache, "UUID_MISS_SYNC_INTERVAL", 0.0)
+    db.add(1)                                         # QR ที่สร้างหลัง sync ล่าสุด
+    db.calls.clear()
+    assert cache.fresh
+    assert asyncio.run(cache.contains("uuid-6"))
+    assert db.calls == [5]
+
+
+def test_contains_unknown_uuids_sync_at_most_once_per_interval(tmp_path, monkeypatch):
+    db = FakeGenqrcode(5)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+    asyncio.run(cache.sync())
+    monkeypatch.setattr(cache, "last_sync", cache.last_sync - uuid_cache.UUID_MISS_SYNC_INTERVAL)
+    db.calls.clear()
+
+    async def burst():
+        return await asyncio.gather(*(cache.contains(f"forged-{i}") for i in range(20)))
+
+    assert not any(asyncio.run(burst()))
+    assert db.calls == [5]
+    assert cache.rejects == 20
+
+
+def test_contains_stale_cache_syncs_once(tmp_path, monkeypatch):
+    db = FakeGenqrcode(5)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+    asyncio.run(cache.sync())
+    monkeypatch.setattr(cache, "last_sync", 0.0)      # cache เก่า
+    db.add(1)
+    assert asyncio.run(cache.contains("uuid-6"))
+    assert cache.fallbacks == 1
+
+
+def test_contains_offline_answers_from_snapshot(tmp_path, monkeypatch):
+    db = FakeGenqrcode(5)
+    cache = UuidCache(db, path=tmp_path / "uuids.json")
+    asyncio.run(cache.sync())
+    monkeypatch.setattr(cache, "last_sync", 0.0)
+    db.online = False
+    assert not asyncio.run(cache.contains("unknown-1"))   # sync ล้มเหลวหนึ่งครั้ง
+    assert not asyncio.run(cache.contains("unknown-2"))   # ไม่ลอง sync ซ้ำทันที
+    assert cache.fallbacks == 1
+    assert asyncio.run(cache.contains("uuid-2"))
@@ -0,0 +1,206 @@
+import asyncio, hashlib, json, math, os, time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# =====================================================
+# 🌐 Load environment variables
+# =====================================================
+load_dotenv()
+UUID_CACHE_PATH = os.getenv("UUID_CACHE_PATH", str(Path(__file__).resolve().parent / "uuid_cache.json"))
+UUID_SYNC_INTERVAL = float(os.getenv("UUID_SYNC_INTERVAL", 15))     # วินาทีระหว่าง incremental sync
+UUID_CACHE_FRESH = float(os.getenv("UUID_CACHE_FRESH", 60))         # cache ที่ sync ภายในกี่วินาทีถือว่าสด
+UUID_MISS_SYNC_INTERVAL = float(os.getenv("UUID_MISS_SYNC_INTERVAL", 2))   # uuid ที่ไม่รู้จัก sync เพิ่มได้ไม่บ่อยกว่านี้
+UUID_SYNC_PAGE = int(os.getenv("UUID_SYNC_PAGE", 1000))
+BLOOM_CAPACITY = int(os.getenv("UUID_BLOOM_CAPACITY", 50000))
+BLOOM_ERROR_RATE = 0.001
+
+
+# =====================================================
+# 🌸 Bloom filter
+# =====================================================
+class BloomFilter:
+    """bit array + k hash จาก blake2b ตัวเดียว (double hashing) ตอบ "ไม่มีแน่นอน" ได้ทันที"""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+# =====================================================
+# 🗂️ Local UUID index
+# =====================================================
+class UuidCache:
+    """
+    ดัชนี uuid ที่ถูกต้องจาก genqrcode เก็บในหน่วยความจำ + snapshot บนดิสก์
+    - bloom filter ตัด uuid ที่ไม่มีแน่นอนโดยไม่ต้องแตะ network, set ยืนยันตัวที่ bloom บอกว่ามี
+    - sync ทีละหน้าตาม cursor ของคอลัมน์ id (genqrcode.id เพิ่มขึ้นเสมอ)
+    - uuid ที่ไม่รู้จัก (เช่น QR ที่เพิ่งสร้างหลัง sync ล่าสุด) sync แบบ incremental หนึ่งรอบก่อนตัดสิน
+      แต่ไม่บ่อยกว่าทุก UUID_MISS_SYNC_INTERVAL วินาที QR ปลอมที่สแกนรัว ๆ จึงไม่ยิง Supabase ทุกครั้ง
+    """
+
+    def __init__(self, db, path: str = UUID_CACHE_PATH):
+        self.db = db
+        self.path = Path(path)
+        self.uuids = set()
+        self.cursor = 0
+        self.bloom = BloomFilter(BLOOM_CAPACITY)
+        self.last_sync = 0.0        # time.monotonic() ของ sync ที่สำเร็จล่าสุด
+        self.last_failure = 0.0     # time.monotonic() ของ sync ที่ล้มเหลวล่าสุด
+        self.loaded = False         # มีข้อมูลจาก snapshot หรือ sync อย่างน้อยหนึ่งครั้ง
+        self.hits = 0
+        self.rejects = 0
+        self.fallbacks = 0
+        self._sync_lock = asyncio.Lock()
+
+    # -------------------------------------------------
+    # 💾 Snapshot
+    # -------------------------------------------------
+    def load(self):
+        """โหลด snapshot จากดิสก์ (ถ้ามี)"""
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ UUID cache snapshot unreadable ({self.path}): {e}")
+            return
+        self._add(data.get("uuids", []))
+        self.cursor = data.get("cursor", 0)
+        self.loaded = True
+        print(f"💾 Loaded {len(self.uuids)} UUIDs from snapshot (cursor={self.cursor})")
+
+    def save(self):
+        """เขียน snapshot แบบ atomic (ไฟล์ชั่วคราวแล้ว rename)"""
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"cursor": self.cursor, "uuids": sorted(self.uuids)}))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ Failed to write UUID cache snapshot: {e}")
+
+    def _add(self, uuids):
+        for uuid in uuids:
+            if uuid and uuid not in self.uuids:
+                self.uuids.add(uuid)
+                if self.bloom.count >= self.bloom.capacity:
+                    self._rebuild_bloom()
+                else:
+                    self.bloom.add(uuid)
+
+    def _rebuild_bloom(self):
+        """ขยาย bloom filter เป็นสองเท่าเมื่อเกินความจุ (ไม่ให้อัตรา false positive สูงขึ้น)"""
+        bloom = BloomFilter(max(self.bloom.capacity * 2, len(self.uuids)))
+        for uuid in self.uuids:
+            bloom.add(uuid)
+        self.bloom = bloom
+
+    # -------------------------------------------------
+    # 🔄 Sync
+    # -------------------------------------------------
+    async def sync(self, min_age: float = 0.0) -> int:
+        """ดึงแถวใหม่จาก genqrcode ตั้งแต่ cursor ล่าสุด คืนจำนวน uuid ที่เพิ่ม (ข้ามถ้า sync ไปแล้วภายใน min_age วินาที)"""
+        async with self._sync_lock:
+            if min_age and self.last_sync and time.monotonic() - self.last_sync < min_age:
+                return 0
+            added = 0
+            while True:
+                rows = await self.db.fetch_uuids(self.cursor, UUID_SYNC_PAGE)
+                if not rows:
+                    break
+                before = len(self.uuids)
+                self._add(row["uuid"] for row in rows)
+                added += len(self.uuids) - before
+                self.cursor = max(self.cursor, max(row["id"] for row in rows))
+                if len(rows) < UUID_SYNC_PAGE:
+                    break
+            self.last_sync = time.monotonic()
+            self.loaded = True
+            if added:
+                self.save()
+            return added
+
+    async def run(self):
+        """warm cache ตอน startup แล้ว sync แบบ incremental ทุก UUID_SYNC_INTERVAL วินาที"""
+        self.load()
+        while True:
+            try:
+                added = await self.sync()
+                if added:
+                    print(f"🔄 UUID cache +{added} (total {len(self.uuids)}, cursor={self.cursor})")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_failure = time.monotonic()
+                print(f"⚠️ UUID cache sync failed: {e}")
+            await asyncio.sleep(UUID_SYNC_INTERVAL)
+
+    @property
+    def fresh(self) -> bool:
+        return self.last_sync > 0 and time.monotonic() - self.last_sync < UUID_CACHE_FRESH
+
+    # -------------------------------------------------
+    # 🔍 Lookup
+    # -------------------------------------------------
+    def _known(self, uuid: str) -> bool:
+        return uuid in self.bloom and uuid in self.uuids
+
+    async def contains(self, uuid: str) -> bool:
+        """uuid นี้อยู่ใน genqrcode หรือไม่ (ปกติไม่ต้องใช้ network)"""
+        if self._known(uuid):
+            self.hits += 1
+            return True
+        now = time.monotonic()
+        # เพิ่ง sync ไป: uuid ที่ไม่รู้จักไม่มีอยู่จริง
+        if self.last_sync and now - self.last_sync < UUID_MISS_SYNC_INTERVAL:
+            self.rejects += 1
+            return False
+
+        # เน็ตล่ม (sync เพิ่งล้มเหลว) และมี snapshot แล้ว: ตัดสินจาก snapshot ไม่ต้องรอ timeout ทุกสแกน
+        if self.loaded and self.last_failure and now - self.last_failure < UUID_SYNC_INTERVAL:
+            self.rejects += 1
+            return False
+
+        # QR ที่สร้างหลัง sync ล่าสุด หรือ cache เก่า/ยังว่าง: sync หนึ่งรอบก่อน
+        # ถ้า sync ไม่ได้และไม่มีข้อมูลเลยถาม Supabase ตรงๆ
+        self.fallbacks += 1
+        try:
+            await self.sync(min_age=UUID_MISS_SYNC_INTERVAL)
+        except Exception as e:
+            self.last_failure = time.monotonic()
+            print(f"⚠️ UUID cache sync failed: {e}")
+            if not self.loaded:
+                return await self.db.uuid_exists(uuid)
+        if self._known(uuid):
+            return True
+        self.rejects += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "uuids": len(self.uuids),
+            "cursor": self.cursor,
+            "fresh": self.fresh,
+            "last_sync_age_s": round(time.monotonic() - self.last_sync, 1) if self.last_sync else None,
+            "bloom_bits": self.bloom.bits,
+            "bloom_hashes": self.bloom.hashes,
+            "hits": self.hits,
+            "rejects": self.rejects,
+            "fallbacks": self.fallbacks,
+        }
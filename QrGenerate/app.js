@@ -7,6 +7,15 @@ const out = (obj) => {
     }
 };
 
+// เส้นเชื่อม landmarks ของมือ (เหมือน mp.solutions.hands.HAND_CONNECTIONS)
+const HAND_CONNECTIONS = [
+    [0, 1], [1, 2], [2, 3], [3, 4],
+    [0, 5], [5, 6], [6, 7], [7, 8],
+    [5, 9], [9, 10], [10, 11], [11, 12],
+    [9, 13], [13, 14], [14, 15], [15, 16],
+    [13, 17], [0, 17], [17, 18], [18, 19], [19, 20]
+];
+
 class QRCheckInSystem {
     constructor() {
         this.mqttClient = null;
@@ -20,6 +29,7 @@ class QRCheckInSystem {
         this.sensorDefaultStatus = { text: 'รอตรวจจับ', className: 'status-waiting' };
         this.cameraDefaultStatus = { text: 'รอตรวจจับ', className: 'status-waiting' };
         this.thumbHoldSeconds = 3;
+        this.streamPassthrough = false;
         this.thumbInProgress = false;
         this.thumbCompleted = false;
         clearTimeout(this.qrFallbackTimer);
@@ -194,6 +204,7 @@ class QRCheckInSystem {
                     this.mqttClient.subscribe("gateA/esp32-01/ui/cancel");
                     this.mqttClient.subscribe("gateA/esp32-01/ui/session_status");
                     this.mqttClient.subscribe("gateA/esp32-01/status/online");
+                    this.mqttClient.subscribe("gateA/esp32-01/ui/landmarks", { qos: 0 });
                 },
                 onFailure: (error) => {
                     console.error('MQTT connection failed:', error);
@@ -245,7 +256,7 @@ class QRCheckInSystem {
         const topic = message.destinationName;
         const payload = JSON.parse(message.payloadString);
         
-        console.log(`MQTT: ${topic}`, payload);
+        if (topic !== "gateA/esp32-01/ui/landmarks") console.log(`MQTT: ${topic}`, payload);
         this.processTopicEvent(topic, payload);
     }
 
@@ -269,6 +280,63 @@ class QRCheckInSystem {
             case "gateA/esp32-01/status/online":
                 this.handleDeviceStatus(payload);
                 break;
+            case "gateA/esp32-01/ui/landmarks":
+                this.handleLandmarks(payload);
+                break;
+        }
+    }
+
+    handleLandmarks(data) {
+        // โหมด pass-through: กล้องส่งภาพดิบ browser ต้อง mirror และวาด landmarks เอง
+        const passthrough = Boolean(data?.passthrough);
+        if (passthrough !== this.streamPassthrough) {
+            this.streamPassthrough = passthrough;
+            const frame = document.querySelector('.camera-frame');
+            if (frame) frame.classList.toggle('passthrough', passthrough);
+        }
+        this.drawLandmarks(passthrough && Array.isArray(data?.hands) ? data.hands : []);
+    }
+
+    drawLandmarks(hands) {
+        const canvas = el('camera-landmarks');
+        const image = el('camera-feed');
+        if (!canvas || !image) return;
+
+        const width = canvas.clientWidth;
+        const height = canvas.clientHeight;
+        if (canvas.width !== width) canvas.width = width;
+        if (canvas.height !== height) canvas.height = height;
+        const ctx = canvas.getContext('2d');
+        ctx.clearRect(0, 0, width, height);
+        if (!hands.length || !image.naturalWidth) return;
+
+        // ภาพใช้ object-fit: cover จึงต้องคำนวณส่วนที่ถูกครอปเหมือนกัน
+        const scale = Math.max(width / image.naturalWidth, height / image.naturalHeight);
+        const drawW = image.naturalWidth * scale;
+        const drawH = image.naturalHeight * scale;
+        const offsetX = (width - drawW) / 2;
+        const offsetY = (height - drawH) / 2;
+        const point = (coords, i) => [offsetX + coords[i * 2] * drawW, offsetY + coords[i * 2 + 1] * drawH];
+
+        ctx.lineWidth = 2;
+        ctx.strokeStyle = '#22c55e';
+        ctx.fillStyle = '#ef4444';
+        for (const coords of hands) {
+            if (!Array.isArray(coords) || coords.length < 42) continue;
+            ctx.beginPath();
+            for (const [a, b] of HAND_CONNECTIONS) {
+                const [ax, ay] = point(coords, a);
+                const [bx, by] = point(coords, b);
+                ctx.moveTo(ax, ay);
+                ctx.lineTo(bx, by);
+            }
+            ctx.stroke();
+            for (let i = 0; i < 21; i++) {
+                const [x, y] = point(coords, i);
+                ctx.beginPath();
+                ctx.arc(x, y, 3, 0, Math.PI * 2);
+                ctx.fill();
+            }
         }
     }
 
@@ -3,15 +3,23 @@ import os
 import time
 import json
 import logging
-from dataclasses import dataclass
-from http.server import BaseHTTPRequestHandler, HTTPServer
-import socket
-import socketserver
+import asyncio
+import struct
+from dataclasses import dataclass, field
 import threading
-from typing import Optional, Dict
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+from typing import Optional, Dict, List
 import cv2
+import numpy as np
 import mediapipe as mp
 import paho.mqtt.client as mqtt
+from mediapipe.framework.formats import landmark_pb2
+
+from frame_sources import create_frame_source
+from inference_pool import InferencePool
+from thumb_metrics import CONTENT_TYPE, HOLD_BUCKETS, METRICS, Sample
+from thumb_recording import LandmarkRecorder
 
 # ===================== Configuration =====================
 SITE = os.getenv('SITE', 'gateA')
@@ -23,15 +31,70 @@ MQTT_PASS = os.getenv('MQTT_PASS', '12345678')
 
 TOPIC_THUMB = f"{SITE}/{DEVICE_ID}/ui/thumb"
 TOPIC_SESSION = f"{SITE}/{DEVICE_ID}/ui/session_status"
+TOPIC_ARMED = f"{SITE}/{DEVICE_ID}/ui/armed"
+TOPIC_CANCEL = f"{SITE}/{DEVICE_ID}/ui/cancel"
+TOPIC_LANDMARKS = f"{SITE}/{DEVICE_ID}/ui/landmarks"
+
+# MQTT publisher: progress/landmarks ต่อ topic ถูกรวมให้ส่งไม่ถี่กว่าช่วงนี้ (ms)
+MQTT_COALESCE_MS = int(os.getenv('MQTT_COALESCE_MS', '100'))
+# ส่งสถานะนิ้วโป้งแบบ binary ขนาดเล็กที่ <topic thumb>/bin ด้วย (ดู THUMB_BINARY_FORMAT)
+MQTT_BINARY = os.getenv('MQTT_BINARY', '0') == '1'
 
 # Camera settings
 CAM_INDEX = int(os.getenv('CAM_INDEX', '0'))
 FRAME_W = int(os.getenv('FRAME_W', '640'))
 FRAME_H = int(os.getenv('FRAME_H', '480'))
+CAMERA_FPS = float(os.getenv('CAMERA_FPS', '30'))
+# แหล่งภาพ: opencv / v4l2 / gstreamer / file / synthetic
+CAMERA_SOURCE = os.getenv('CAMERA_SOURCE', 'opencv').lower()
+CAMERA_DEVICE = os.getenv('CAMERA_DEVICE', f'/dev/video{CAM_INDEX}')
+CAMERA_SOURCE_PATH = os.getenv('CAMERA_SOURCE_PATH', '')
+GST_JPEG_DECODER = os.getenv('GST_JPEG_DECODER', 'v4l2jpegdec')
 STREAM_PORT = int(os.getenv('STREAM_PORT', '9101'))
 STREAM_ENABLED = os.getenv('STREAM_ENABLED', '1') != '0'
 STREAM_JPEG_QUALITY = int(os.getenv('STREAM_JPEG_QUALITY', '80'))
+# Extra stream variants as name:quality[:width], e.g. "low:50:320,mid:65:480"
+STREAM_VARIANTS = os.getenv('STREAM_VARIANTS', 'low:50:320')
+# Client ที่มีข้อมูลค้างส่งเกินค่านี้ (bytes) จะถูกข้ามเฟรมจนกว่าจะตามทัน
+STREAM_CLIENT_MAX_BUFFER = int(os.getenv('STREAM_CLIENT_MAX_BUFFER', str(256 * 1024)))
 SHOW_WINDOW = os.getenv('SHOW_WINDOW', '0') == '1'
+# Pass-through: ส่ง JPEG จากกล้องเข้าสตรีมตรงๆ ไม่ decode/flip/วาด overlay/encode ใหม่
+# browser จะ mirror ภาพและวาด landmarks เองจาก TOPIC_LANDMARKS
+STREAM_PASSTHROUGH = os.getenv('STREAM_PASSTHROUGH', '0') == '1'
+# ตอน pass-through ให้ decode เพื่อ inference แบบย่อ 1/2/4/8 เท่า (libjpeg ย่อระหว่าง decode)
+INFERENCE_DECODE_SCALE = int(os.getenv('INFERENCE_DECODE_SCALE', '2'))
+
+# Pipeline settings
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'threaded').lower()  # 'threaded' หรือ 'serial'
+STATS_LOG_INTERVAL = float(os.getenv('STATS_LOG_INTERVAL', '30'))
+
+# Adaptive inference: รัน MediaPipe เต็มอัตราเฉพาะตอน session armed หรือเพิ่งเห็นมือ
+ADAPTIVE_INFERENCE = os.getenv('ADAPTIVE_INFERENCE', '1') != '0'
+IDLE_INFER_FPS = float(os.getenv('IDLE_INFER_FPS', '2'))
+IDLE_MOTION_THRESHOLD = float(os.getenv('IDLE_MOTION_THRESHOLD', '6'))  # 0 = ปิด motion check
+ACTIVE_HOLDOVER_MS = int(os.getenv('ACTIVE_HOLDOVER_MS', '1500'))
+ARMED_DEFAULT_TTL_MS = int(os.getenv('SESSION_TTL_MS', '6000'))
+
+# ROI tracking: หลังเจอมือแล้วให้ MediaPipe ทำงานบนภาพ crop รอบมือที่ย่อเหลือ ROI_INPUT_SIZE
+ROI_TRACKING = os.getenv('ROI_TRACKING', '1') != '0'
+ROI_INPUT_SIZE = int(os.getenv('ROI_INPUT_SIZE', '256'))
+ROI_EXPAND = float(os.getenv('ROI_EXPAND', '1.8'))
+
+# หลายกล้อง/หลาย gate ในโปรเซสเดียว: JSON list ใน CAMERAS หรือไฟล์ CAMERAS_FILE
+# (ดู cameras.example.json) ว่างไว้ = กล้องเดียวตามค่าด้านบน
+CAMERAS = os.getenv('CAMERAS', '')
+CAMERAS_FILE = os.getenv('CAMERAS_FILE', '')
+# จำนวน inference worker ที่ใช้ร่วมกันทุกกล้อง (MediaPipe แยกชุดต่อกล้อง ไม่ขึ้นกับจำนวน worker)
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '1'))
+# วินาทีก่อนลองเริ่ม capture/encode ของกล้องที่หยุดไปใหม่ (โหมดหลายกล้อง)
+GATE_RESTART_INTERVAL = float(os.getenv('GATE_RESTART_INTERVAL', '5'))
+# รัน MediaPipe ใน N โปรเซสแยก (โหมด threaded กล้องเดียว) 0 = รันในเธรด inference เหมือนเดิม
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '0'))
+INFERENCE_SLOTS = int(os.getenv('INFERENCE_SLOTS', '2'))  # ช่องเฟรมใน shared memory ต่อโปรเซส
+
+# บันทึก landmarks (และเฟรม) ไว้ replay ด้วย thumb_replay.py
+RECORD_PATH = os.getenv('RECORD_PATH', '')
+RECORD_FRAMES = os.getenv('RECORD_FRAMES', '0') == '1'
 
 # ===================== Logging Setup =====================
 logging.basicConfig(
@@ -42,93 +105,408 @@ logger = logging.getLogger(__name__)
 
 # ===================== Streaming Helpers =====================
 
+@dataclass(frozen=True)
+class StreamVariant:
+    name: str
+    quality: int
+    width: Optional[int] = None  # None = ขนาดเต็มของเฟรม
+
+
+def parse_stream_variants(spec: str) -> Dict[str, StreamVariant]:
+    """แปลงค่า STREAM_VARIANTS เป็น dict ของ StreamVariant (มี 'default' เสมอ)"""
+    variants = {"default": StreamVariant("default", STREAM_JPEG_QUALITY)}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            fields = item.split(':')
+            name = fields[0]
+            quality = int(fields[1]) if len(fields) > 1 else STREAM_JPEG_QUALITY
+            width = int(fields[2]) if len(fields) > 2 else None
+            variants[name] = StreamVariant(name, quality, width)
+        except ValueError:
+            logger.warning(f"Invalid stream variant spec: {item}")
+    return variants
+
+
+def frame_chunk(jpeg: bytes) -> memoryview:
+    """สร้าง multipart chunk ที่มี boundary + headers + JPEG ไว้ใน buffer เดียว"""
+    header = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(jpeg)
+    return memoryview(b''.join((header, jpeg, b'\r\n')))
+
+
 class FrameBuffer:
-    def __init__(self):
+    """
+    เก็บเฟรมล่าสุดเป็น multipart chunk สำเร็จรูปแยกตาม variant
+    ทุก client ที่ดู variant เดียวกันจะใช้ chunk ก้อนเดียวกัน (encode ครั้งเดียวต่อเฟรม)
+    และจะ encode เฉพาะ variant ที่มี client ดูอยู่เท่านั้น
+    """
+    def __init__(self, variants: Optional[Dict[str, StreamVariant]] = None):
         self._lock = threading.Lock()
         self._cond = threading.Condition(self._lock)
-        self._frame = None
+        self.variants = variants or parse_stream_variants(STREAM_VARIANTS)
+        self._chunks: Dict[str, memoryview] = {}
+        self._subscribers: Dict[str, int] = {name: 0 for name in self.variants}
         self._sequence = 0
+        self._listeners = []
+
+    def add_listener(self, callback) -> None:
+        """เรียก callback() ทุกครั้งที่มีเฟรมใหม่ (ถูกเรียกจากเธรดของผู้ encode)"""
+        self._listeners.append(callback)
+
+    def acquire(self, name: str) -> StreamVariant:
+        """ลงทะเบียน client ให้ variant (variant ที่ไม่รู้จักจะใช้ 'default')"""
+        with self._cond:
+            if name not in self.variants:
+                name = "default"
+            self._subscribers[name] += 1
+            return self.variants[name]
+
+    def release(self, name: str) -> None:
+        with self._cond:
+            if self._subscribers.get(name, 0) > 0:
+                self._subscribers[name] -= 1
+                if self._subscribers[name] == 0:
+                    self._chunks.pop(name, None)
+
+    def active_variants(self):
+        with self._cond:
+            return [self.variants[name] for name, count in self._subscribers.items() if count > 0]
+
+    def has_subscribers(self) -> bool:
+        with self._cond:
+            return any(self._subscribers.values())
 
-    def update(self, frame_bytes: bytes):
+    def is_active(self, name: str) -> bool:
         with self._cond:
-            self._frame = frame_bytes
+            return self._subscribers.get(name, 0) > 0
+
+    def update(self, frame_bytes: bytes, variant: str = "default"):
+        self.update_variants({variant: frame_bytes})
+
+    def update_variants(self, encoded: Dict[str, bytes]):
+        """อัปเดต JPEG ของหลาย variant พร้อมกันภายใต้ sequence เดียว"""
+        chunks = {name: frame_chunk(jpeg) for name, jpeg in encoded.items()}
+        with self._cond:
+            self._chunks.update(chunks)
             self._sequence += 1
             self._cond.notify_all()
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as exc:
+                logger.debug(f"Frame listener failed: {exc}")
+
+    def latest(self, variant: str = "default") -> Optional[memoryview]:
+        with self._cond:
+            return self._chunks.get(variant)
 
-    def wait_for_frame(self, last_sequence: int, timeout: float = 1.0):
+    def wait_for_frame(self, last_sequence: int, timeout: float = 1.0, variant: str = "default"):
         with self._cond:
-            if last_sequence == -1 and self._frame is not None:
-                return self._frame, self._sequence
+            if last_sequence == -1 and variant in self._chunks:
+                return self._chunks[variant], self._sequence
 
             updated = self._cond.wait_for(
                 lambda: self._sequence != last_sequence,
                 timeout=timeout
             )
-            if not updated or self._frame is None:
+            chunk = self._chunks.get(variant)
+            if not updated or chunk is None:
                 return None, last_sequence
 
-            return self._frame, self._sequence
+            return chunk, self._sequence
 
 
-def make_stream_handler(frame_buffer: FrameBuffer):
-    class StreamingHandler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            if self.path not in ('/', '/stream'):
-                self.send_error(404)
-                return
+STREAM_RESPONSE_HEADERS = (
+    b'HTTP/1.0 200 OK\r\n'
+    b'Age: 0\r\n'
+    b'Cache-Control: no-cache, private\r\n'
+    b'Pragma: no-cache\r\n'
+    b'Content-Type: multipart/x-mixed-replace; boundary=frame\r\n'
+    b'\r\n'
+)
 
-            try:
-                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            except OSError:
-                pass
 
-            self.send_response(200)
-            self.send_header('Age', '0')
-            self.send_header('Cache-Control', 'no-cache, private')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
-            self.end_headers()
+class AsyncStreamServer:
+    """
+    MJPEG stream server บน asyncio ใช้เธรดเดียวรองรับ client จำนวนมาก
+    เฟรมใหม่จะถูกกระจายไปทุก client จาก event loop; client ที่ส่งไม่ทัน
+    (write buffer เกิน STREAM_CLIENT_MAX_BUFFER) จะถูกข้ามเฟรมแทนการสะสม buffer
+    แต่ละ gate มี FrameBuffer ของตัวเองที่ /stream/<gate> ส่วน /stream คือ gate แรก
+    /metrics ส่ง METRICS ของทุก gate เป็น Prometheus text
+    """
+    def __init__(self, frame_buffer: Optional[FrameBuffer] = None, host: str = '0.0.0.0',
+                 port: int = STREAM_PORT, gate: str = DEVICE_ID):
+        self.frame_buffers: Dict[str, FrameBuffer] = {}
+        self.default_gate: Optional[str] = None
+        self.host = host
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[BaseException] = None
+        self._clients: Dict[tuple, set] = {}  # (gate, variant) -> writers
+        self._fanout_pending = set()
+        self.frames_skipped = 0
+        self.bytes_sent: Dict[str, int] = {}
+        self.frames_sent: Dict[str, int] = {}
+        METRICS.add_collector(self.collect_metrics)
+        if frame_buffer is not None:
+            self.add_gate(gate, frame_buffer)
+
+    def add_gate(self, gate: str, frame_buffer: FrameBuffer) -> None:
+        self.frame_buffers[gate] = frame_buffer
+        self.bytes_sent.setdefault(gate, 0)
+        self.frames_sent.setdefault(gate, 0)
+        if self.default_gate is None:
+            self.default_gate = gate
+        frame_buffer.add_listener(lambda: self._on_new_frame(gate))
 
-            try:
-                last_sequence = -1
-                while True:
-                    frame, last_sequence = frame_buffer.wait_for_frame(last_sequence, timeout=1.5)
-                    if frame is None:
-                        continue
-
-                    self.wfile.write(b'--frame\r\n')
-                    self.wfile.write(b'Content-Type: image/jpeg\r\n')
-                    self.wfile.write(f'Content-Length: {len(frame)}\r\n\r\n'.encode('utf-8'))
-                    self.wfile.write(frame)
-                    self.wfile.write(b'\r\n')
-                    try:
-                        self.wfile.flush()
-                    except ValueError:
-                        break
-            except BrokenPipeError:
-                logger.debug('Stream client disconnected')
-            except Exception as exc:
-                logger.error(f'Streaming error: {exc}')
+    def start(self):
+        self._thread = threading.Thread(target=self._run_loop, name="mjpeg-stream", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5.0)
+        if self._start_error is not None:
+            raise self._start_error
 
-        def log_message(self, format, *args):  # noqa: N802 - suppress default logging
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port, reuse_address=True)
+            )
+        except Exception as exc:
+            self._start_error = exc
+            self._ready.set()
+            self.loop.close()
             return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
 
-    return StreamingHandler
+    def client_count(self) -> int:
+        return sum(len(writers) for writers in self._clients.values())
 
+    def collect_metrics(self):
+        """จำนวน client และ bytes ที่ส่งต่อ gate (ถูกเรียกตอน render /metrics บน event loop)"""
+        clients: Dict[str, int] = {gate: 0 for gate in self.frame_buffers}
+        for (gate, _), writers in list(self._clients.items()):
+            clients[gate] = clients.get(gate, 0) + len(writers)
+        for gate, count in clients.items():
+            yield Sample("thumb_stream_clients", "gauge", "Connected MJPEG clients", {"gate": gate}, count)
+        for gate, sent in self.bytes_sent.items():
+            yield Sample("thumb_stream_bytes_total", "counter", "MJPEG bytes written to clients",
+                         {"gate": gate}, sent)
+        for gate, sent in self.frames_sent.items():
+            yield Sample("thumb_stream_frames_sent_total", "counter", "MJPEG frames written to clients",
+                         {"gate": gate}, sent)
+        yield Sample("thumb_stream_frames_skipped_total", "counter",
+                     "Frames skipped for clients with a full write buffer", {}, self.frames_skipped)
 
-class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
-    daemon_threads = True
-    allow_reuse_address = True
+    def _on_new_frame(self, gate: str):
+        # ถูกเรียกจากเธรด encode: ปลุก event loop ครั้งเดียวต่อเฟรมของแต่ละ gate
+        loop = self.loop
+        if loop is None or gate in self._fanout_pending or not self._clients:
+            return
+        self._fanout_pending.add(gate)
+        try:
+            loop.call_soon_threadsafe(self._fan_out, gate)
+        except RuntimeError:
+            self._fanout_pending.discard(gate)
+
+    def _fan_out(self, gate: str):
+        self._fanout_pending.discard(gate)
+        frame_buffer = self.frame_buffers[gate]
+        for (client_gate, variant), writers in self._clients.items():
+            if client_gate != gate:
+                continue
+            chunk = frame_buffer.latest(variant)
+            if chunk is None:
+                continue
+            for writer in writers:
+                self._send(writer, chunk, gate)
+
+    def _send(self, writer: asyncio.StreamWriter, chunk: memoryview, gate: str):
+        transport = writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > STREAM_CLIENT_MAX_BUFFER:
+            self.frames_skipped += 1
+            return
+        writer.write(chunk)
+        self.bytes_sent[gate] += len(chunk)
+        self.frames_sent[gate] += 1
+
+    def _resolve_gate(self, path: str) -> Optional[str]:
+        if path in ('/', '/stream'):
+            return self.default_gate
+        if path.startswith('/stream/'):
+            gate = path[len('/stream/'):].strip('/')
+            if gate in self.frame_buffers:
+                return gate
+        return None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        variant: Optional[StreamVariant] = None
+        frame_buffer: Optional[FrameBuffer] = None
+        gate = None
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=5.0)
+            request_line = request.split(b'\r\n', 1)[0].decode('latin-1')
+            parts = request_line.split(' ')
+            target = parts[1] if len(parts) >= 2 else ''
+            path, _, query = target.partition('?')
+
+            if parts[0] == 'GET' and path == '/metrics':
+                body = METRICS.render().encode('utf-8')
+                writer.write(
+                    b'HTTP/1.0 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n'
+                    % (CONTENT_TYPE.encode('ascii'), len(body)) + body
+                )
+                await writer.drain()
+                return
+
+            gate = self._resolve_gate(path)
+            if parts[0] != 'GET' or gate is None:
+                writer.write(b'HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                await writer.drain()
+                return
+
+            frame_buffer = self.frame_buffers[gate]
+            variant = frame_buffer.acquire(parse_qs(query).get('variant', ['default'])[0])
+            writer.write(STREAM_RESPONSE_HEADERS)
+            chunk = frame_buffer.latest(variant.name)
+            if chunk is not None:
+                self._send(writer, chunk, gate)
+            self._clients.setdefault((gate, variant.name), set()).add(writer)
+
+            # รอจน client ตัดการเชื่อมต่อ (ข้อมูลเฟรมถูกส่งจาก _fan_out)
+            while await reader.read(1024):
+                pass
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.CancelledError:
+            # ปิด server: จบ handler เงียบๆ
+            pass
+        except (ConnectionResetError, BrokenPipeError):
+            logger.debug('Stream client disconnected')
+        except Exception as exc:
+            logger.error(f'Streaming error: {exc}')
+        finally:
+            if variant is not None:
+                self._clients.get((gate, variant.name), set()).discard(writer)
+                frame_buffer.release(variant.name)
+            writer.close()
+
+    def shutdown(self):
+        loop = self.loop
+        if loop is None or not loop.is_running():
+            return
+
+        async def _stop():
+            self._server.close()
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            loop.stop()
+
+        METRICS.remove_collector(self.collect_metrics)
+        asyncio.run_coroutine_threadsafe(_stop(), loop)
+        if self._thread:
+            self._thread.join(timeout=2.0)
 
 
 def start_stream_server(frame_buffer: FrameBuffer):
-    handler = make_stream_handler(frame_buffer)
-    server = ThreadedHTTPServer(('0.0.0.0', STREAM_PORT), handler)
-    thread = threading.Thread(target=server.serve_forever, daemon=True)
-    thread.start()
-    logger.info("📡 MJPEG stream ready at http://0.0.0.0:%s/stream", STREAM_PORT)
+    server = AsyncStreamServer(frame_buffer)
+    server.start()
+    logger.info("📡 MJPEG stream ready at http://0.0.0.0:%s/stream (metrics at /metrics)", STREAM_PORT)
     return server
 
+# ===================== Pipeline Stages =====================
+
+class LatestFrameQueue:
+    """
+    คิวขนาด 1 แบบ latest-frame-wins: ถ้ามีของค้างอยู่จะถูกแทนที่ด้วยเฟรมใหม่
+    เพื่อให้ stage ถัดไปทำงานกับเฟรมล่าสุดเสมอ และผู้ส่งไม่ต้องรอ
+    on_put ถูกเรียกหลัง put ทุกครั้ง (ใช้ปลุก worker ที่รอหลายคิวพร้อมกัน)
+    """
+    def __init__(self, on_put=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self.dropped = 0
+        self.on_put = on_put
+
+    def put(self, item) -> None:
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+        if self.on_put:
+            self.on_put()
+
+    def get(self, timeout: float = 0.5):
+        """คืนค่า (True, item) หรือ (False, None) เมื่อหมดเวลา/คิวถูกปิด"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._has_item or self._closed, timeout=timeout):
+                return False, None
+            if not self._has_item:
+                return False, None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return True, item
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """นับจำนวนเฟรมและคำนวณ FPS ของแต่ละ stage"""
+
+    def __init__(self, name: str, queue=None):
+        self.name = name
+        self.queue = queue  # อะไรก็ได้ที่มี attribute .dropped (LatestFrameQueue, FrameSource)
+        self.frames = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+        self._fps = 0.0
+
+    def tick(self) -> None:
+        with self._lock:
+            self.frames += 1
+            self._window_frames += 1
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= 1.0:
+                self._fps = self._window_frames / elapsed
+                self._window_start = now
+                self._window_frames = 0
+
+    def skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "fps": round(self._fps, 2),
+                "frames": self.frames,
+                "dropped": self.queue.dropped if self.queue else 0,
+                "skipped": self.skipped,
+            }
+
 # ===================== Pipeline Components =====================
 @dataclass
 class TemporalParams:
@@ -136,9 +514,28 @@ class TemporalParams:
     debounce_ms: int = 2000
     max_gesture_gap_ms: int = 800
 
+# index ของ landmark นิ้วชี้/กลาง/นาง/ก้อย (tip, pip, mcp)
+FINGER_TIPS = np.array([8, 12, 16, 20])
+FINGER_PIPS = np.array([6, 10, 14, 18])
+FINGER_MCPS = np.array([5, 9, 13, 17])
+
+
+def landmarks_to_array(hand_lms) -> np.ndarray:
+    """แปลง landmarks ของ MediaPipe เป็น array (21, 3) float32 แบบ normalized (x, y, z)"""
+    return np.array([(point.x, point.y, point.z) for point in hand_lms.landmark], dtype=np.float32)
+
+
+def array_to_landmarks(landmarks: np.ndarray):
+    """แปลง array (21, 3) กลับเป็น NormalizedLandmarkList (ใช้กับผลจาก InferencePool)"""
+    return landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=float(x), y=float(y), z=float(z)) for x, y, z in landmarks
+    ])
+
+
 class ThumbsUpRule:
     """
     ตรวจจับท่าชูนิ้วโป้งแบบ optimized สำหรับ RPi
+    คำนวณแบบ vectorized ด้วย NumPy ใช้ได้ทั้งมือเดียวและแบบ batch (N, 21, 3)
     """
     def __init__(self, lift_margin_px: float = 12.0, curl_margin_px: float = 6.0):
         self.lift_margin_px = lift_margin_px
@@ -146,45 +543,50 @@ class ThumbsUpRule:
 
     def __call__(self, hand_lms, h: int, w: int) -> bool:
         try:
-            lm = hand_lms.landmark
-            y_vals = [point.y * h for point in lm]
-            x_vals = [point.x * w for point in lm]
-
-            hand_top = min(y_vals)
-            hand_bottom = max(y_vals)
-            hand_span = max(hand_bottom - hand_top, 1.0)
-            lift_margin = max(self.lift_margin_px, hand_span * 0.12)
-            curl_margin = max(self.curl_margin_px, hand_span * 0.08)
-
-            wrist_y = y_vals[0]
-            thumb_tip_y = y_vals[4]
-            thumb_ip_y = y_vals[3]
-            thumb_mcp_y = y_vals[2]
-
-            thumb_up = (
-                thumb_tip_y + lift_margin * 0.4 < thumb_ip_y and
-                thumb_tip_y + lift_margin * 0.6 < thumb_mcp_y and
-                thumb_tip_y + lift_margin < wrist_y
-            )
+            return self.classify(landmarks_to_array(hand_lms), h, w)
+        except Exception as e:
+            logger.error(f"Error in thumb detection: {e}")
+            return False
 
-            thumb_vertical = abs(thumb_tip_y - thumb_ip_y) > abs(x_vals[4] - x_vals[3]) * 0.5
+    def classify(self, landmarks: np.ndarray, h: int, w: int) -> bool:
+        """ตรวจมือเดียวจาก array (21, 3)"""
+        return bool(self.classify_batch(landmarks[np.newaxis], h, w)[0])
 
-            finger_sets = ((8, 6, 5), (12, 10, 9), (16, 14, 13), (20, 18, 17))
-            curled_count = 0
-            for tip, pip, mcp in finger_sets:
-                tip_y = y_vals[tip]
-                pip_y = y_vals[pip]
-                mcp_y = y_vals[mcp]
-                if tip_y > min(pip_y, mcp_y) + curl_margin * 0.6:
-                    curled_count += 1
+    def classify_batch(self, landmarks: np.ndarray, h, w) -> np.ndarray:
+        """
+        ตรวจหลายมือพร้อมกันจาก array (N, 21, 3) ของพิกัด normalized
+        h, w เป็น scalar หรือ array (N,) ก็ได้ คืนค่า boolean mask (N,)
+        """
+        lm = np.asarray(landmarks, dtype=np.float32)
+        h = np.asarray(h, dtype=np.float32).reshape(-1, 1)
+        w = np.asarray(w, dtype=np.float32).reshape(-1, 1)
+        y_vals = lm[..., 1] * h
+        x_vals = lm[..., 0] * w
 
-            index_suppressed = y_vals[8] > thumb_tip_y + curl_margin * 0.6
-            others_curled = curled_count >= 3 or (curled_count >= 2 and index_suppressed)
+        hand_span = np.maximum(y_vals.max(axis=1) - y_vals.min(axis=1), 1.0)
+        lift_margin = np.maximum(self.lift_margin_px, hand_span * 0.12)
+        curl_margin = np.maximum(self.curl_margin_px, hand_span * 0.08)
 
-            return bool(thumb_up and thumb_vertical and others_curled)
-        except Exception as e:
-            logger.error(f"Error in thumb detection: {e}")
-            return False
+        wrist_y = y_vals[:, 0]
+        thumb_tip_y = y_vals[:, 4]
+        thumb_ip_y = y_vals[:, 3]
+        thumb_mcp_y = y_vals[:, 2]
+
+        thumb_up = (
+            (thumb_tip_y + lift_margin * 0.4 < thumb_ip_y) &
+            (thumb_tip_y + lift_margin * 0.6 < thumb_mcp_y) &
+            (thumb_tip_y + lift_margin < wrist_y)
+        )
+
+        thumb_vertical = np.abs(thumb_tip_y - thumb_ip_y) > np.abs(x_vals[:, 4] - x_vals[:, 3]) * 0.5
+
+        curl_threshold = np.minimum(y_vals[:, FINGER_PIPS], y_vals[:, FINGER_MCPS]) + (curl_margin * 0.6)[:, np.newaxis]
+        curled_count = np.count_nonzero(y_vals[:, FINGER_TIPS] > curl_threshold, axis=1)
+
+        index_suppressed = y_vals[:, 8] > thumb_tip_y + curl_margin * 0.6
+        others_curled = (curled_count >= 3) | ((curled_count >= 2) & index_suppressed)
+
+        return thumb_up & thumb_vertical & others_curled
 
 class TemporalFilter:
     """
@@ -196,8 +598,8 @@ class TemporalFilter:
         self._last_emit_ms = 0
         self._last_true_ms = 0
 
-    def step(self, detected: bool) -> bool:
-        now = int(time.time() * 1000)
+    def step(self, detected: bool, now_ms: Optional[int] = None) -> bool:
+        now = int(time.time() * 1000) if now_ms is None else now_ms
 
         if detected:
             if now - self._last_true_ms > self.p.max_gesture_gap_ms:
@@ -212,24 +614,314 @@ class TemporalFilter:
             return True
         return False
 
+class InferenceScheduler:
+    """
+    ตัดสินใจว่าเฟรมไหนควรส่งเข้า MediaPipe
+    - armed (จาก MQTT bridge) หรือเพิ่งเห็นมือ/มีการเคลื่อนไหว: รันทุกเฟรม
+    - idle: ตรวจ motion แบบถูกๆ บนภาพย่อ และรัน inference แค่ IDLE_INFER_FPS
+    """
+    ARM_STATUSES = ("armed", "sensor_detected")
+    DISARM_STATUSES = ("idle", "qr_generated")
+
+    def __init__(
+        self,
+        idle_fps: float = IDLE_INFER_FPS,
+        motion_threshold: float = IDLE_MOTION_THRESHOLD,
+        holdover_ms: int = ACTIVE_HOLDOVER_MS,
+    ):
+        self.idle_interval_ms = 1000.0 / idle_fps if idle_fps > 0 else float('inf')
+        self.motion_threshold = motion_threshold
+        self.holdover_ms = holdover_ms
+        self._lock = threading.Lock()
+        self._armed_until_ms = 0
+        self._last_activity_ms = 0
+        self._last_idle_infer_ms = 0
+        self._prev_small = None
+
+    def on_ui_event(self, topic: str, payload: Dict[str, object]) -> None:
+        """รับข้อความจาก MQTT bridge (armed / cancel / session_status)"""
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            # MQTTManager ส่งเฉพาะ topic ของ gate ตัวเอง จึงดูแค่ส่วนท้ายของ topic
+            if topic.endswith('/ui/armed'):
+                ttl = payload.get("ttl", ARMED_DEFAULT_TTL_MS)
+                self._armed_until_ms = now_ms + int(ttl if isinstance(ttl, (int, float)) else ARMED_DEFAULT_TTL_MS)
+            elif topic.endswith('/ui/cancel'):
+                self._armed_until_ms = 0
+            elif topic.endswith('/ui/session_status'):
+                status = payload.get("status")
+                if status in self.ARM_STATUSES:
+                    self._armed_until_ms = max(self._armed_until_ms, now_ms + ARMED_DEFAULT_TTL_MS)
+                elif status in self.DISARM_STATUSES:
+                    self._armed_until_ms = 0
+
+    def report_hand(self, now_ms: int) -> None:
+        with self._lock:
+            self._last_activity_ms = now_ms
+
+    def is_active(self, now_ms: int) -> bool:
+        with self._lock:
+            return now_ms < self._armed_until_ms or now_ms - self._last_activity_ms < self.holdover_ms
+
+    def should_infer(self, frame, now_ms: int) -> bool:
+        if self.is_active(now_ms):
+            self._prev_small = None
+            return True
+
+        if self.motion_threshold > 0 and self._motion_detected(frame):
+            self.report_hand(now_ms)
+            return True
+
+        if now_ms - self._last_idle_infer_ms >= self.idle_interval_ms:
+            self._last_idle_infer_ms = now_ms
+            return True
+        return False
+
+    def _motion_detected(self, frame) -> bool:
+        small = cv2.cvtColor(cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        prev, self._prev_small = self._prev_small, small
+        if prev is None:
+            return False
+        return float(cv2.absdiff(small, prev).mean()) > self.motion_threshold
+
+class HandRoiTracker:
+    """
+    เก็บกรอบสี่เหลี่ยมจัตุรัสรอบมือจาก landmarks เฟรมก่อนหน้า
+    ใช้ crop + ย่อภาพให้ MediaPipe แล้ว map landmarks กลับเป็นพิกัดของเฟรมเต็ม
+    """
+    def __init__(self, input_size: int = ROI_INPUT_SIZE, expand: float = ROI_EXPAND):
+        self.input_size = input_size
+        self.expand = expand
+        self.box = None  # (x0, y0, side) หน่วย pixel ของเฟรมเต็ม
+
+    def crop(self, frame):
+        """คืนค่า (ภาพ crop ขนาด input_size, box) หรือ None ถ้ายังไม่มีมือที่ติดตามอยู่"""
+        if self.box is None:
+            return None
+        x0, y0, side = self.box
+        region = frame[y0:y0 + side, x0:x0 + side]
+        if region.size == 0:
+            self.box = None
+            return None
+        resized = cv2.resize(region, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+        return resized, self.box
+
+    def update(self, hand_lms, h: int, w: int) -> None:
+        """คำนวณกรอบใหม่จาก landmarks (พิกัด normalized ของเฟรมเต็ม)"""
+        xs = [point.x * w for point in hand_lms.landmark]
+        ys = [point.y * h for point in hand_lms.landmark]
+        cx = (min(xs) + max(xs)) / 2
+        cy = (min(ys) + max(ys)) / 2
+        side = int(max(max(xs) - min(xs), max(ys) - min(ys)) * self.expand)
+        side = max(min(side, w, h), 32)
+        x0 = int(min(max(cx - side / 2, 0), w - side))
+        y0 = int(min(max(cy - side / 2, 0), h - side))
+        self.box = (x0, y0, side)
+
+    def lost(self) -> None:
+        self.box = None
+
+    @staticmethod
+    def map_to_frame(hand_lms, box, h: int, w: int) -> None:
+        """แปลง landmarks ของภาพ crop เป็นพิกัดของเฟรมเต็ม (แก้ไขในตัว object)"""
+        x0, y0, side = box
+        for point in hand_lms.landmark:
+            point.x = (x0 + point.x * side) / w
+            point.y = (y0 + point.y * side) / h
+            point.z = point.z * side / w
+
+# flags (bit0 thumb, bit1 hold_complete, bit2 มี progress, bit3 มี distance),
+# progress x10000, distance (cm, NaN ถ้าไม่มี), timestamp (epoch วินาที) = 15 bytes
+THUMB_BINARY_FORMAT = struct.Struct('<BHfd')
+
+
+def encode_thumb_binary(thumb: bool, progress: Optional[float], hold_complete: Optional[bool],
+                        distance: Optional[float], timestamp: float) -> bytes:
+    flags = (
+        (1 if thumb else 0)
+        | (2 if hold_complete else 0)
+        | (4 if progress is not None else 0)
+        | (8 if distance is not None else 0)
+    )
+    return THUMB_BINARY_FORMAT.pack(
+        flags,
+        int(round((progress or 0.0) * 10000)),
+        float('nan') if distance is None else float(distance),
+        timestamp,
+    )
+
+
+class MQTTPublisher:
+    """
+    publish จากเธรดของตัวเอง
+    - ข้อความ coalesce (progress, landmarks) เก็บไว้แค่ล่าสุดต่อ topic และส่งไม่ถี่กว่า interval
+    - ข้อความอื่น (hold_complete, session) ส่งตามลำดับทันที และแทนที่ข้อความ coalesce ที่ค้างของ topic เดียวกัน
+    """
+
+    def __init__(self, client, interval_ms: int = MQTT_COALESCE_MS):
+        self.client = client
+        self.interval = interval_ms / 1000.0
+        self._cond = threading.Condition()
+        self._urgent = []
+        self._latest: Dict[str, tuple] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._running = True
+        self.published = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.published_by_topic: Dict[str, int] = {}
+        METRICS.add_collector(self.collect_metrics)
+        self._thread = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False, coalesce: bool = False):
+        with self._cond:
+            message = (topic, payload, qos, retain)
+            if coalesce:
+                if topic in self._latest:
+                    self.coalesced += 1
+                self._latest[topic] = message
+            else:
+                if self._latest.pop(topic, None) is not None:
+                    self.coalesced += 1
+                self._urgent.append(message)
+            self._cond.notify()
+
+    def _next_batch(self):
+        """รอจนมีข้อความที่ถึงเวลาส่ง คืน list ของข้อความ (ว่าง = หยุดทำงาน)"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                batch, self._urgent = self._urgent, []
+                wait = None
+                for topic in list(self._latest):
+                    due = self._last_sent.get(topic, 0.0) + self.interval
+                    if due <= now or not self._running:
+                        batch.append(self._latest.pop(topic))
+                    else:
+                        wait = due - now if wait is None else min(wait, due - now)
+                if batch or not self._running:
+                    for message in batch:
+                        self._last_sent[message[0]] = now
+                    return batch
+                self._cond.wait(timeout=wait)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            for topic, payload, qos, retain in batch:
+                try:
+                    self.client.publish(topic, payload, qos=qos, retain=retain)
+                    self.published += 1
+                    self.published_by_topic[topic] = self.published_by_topic.get(topic, 0) + 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to publish to {topic}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"published": self.published, "coalesced": self.coalesced, "failed": self.failed}
+
+    def collect_metrics(self):
+        for topic, count in list(self.published_by_topic.items()):
+            yield Sample("thumb_mqtt_published_total", "counter", "MQTT messages published",
+                         {"topic": topic}, count)
+        yield Sample("thumb_mqtt_coalesced_total", "counter",
+                     "MQTT messages replaced by a newer one before sending", {}, self.coalesced)
+        yield Sample("thumb_mqtt_publish_errors_total", "counter", "MQTT publish calls that raised", {},
+                     self.failed)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """ส่งข้อความที่ค้างทั้งหมดแล้วหยุดเธรด"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        METRICS.remove_collector(self.collect_metrics)
+
+
 class MQTTManager:
-    """จัดการการเชื่อมต่อ MQTT และการส่งสถานะ"""
+    """
+    จัดการการเชื่อมต่อ MQTT และการส่งสถานะของ gate หนึ่ง (site/device_id)
+    gate อื่นในโปรเซสเดียวกันใช้การเชื่อมต่อและ MQTTPublisher เดียวกันผ่าน add_gate()
+    """
 
-    def __init__(self):
-        self.client = None
+    def __init__(self, site: str = SITE, device_id: str = DEVICE_ID, client=None, publisher=None):
+        self.topic_thumb = f"{site}/{device_id}/ui/thumb"
+        self.topic_session = f"{site}/{device_id}/ui/session_status"
+        self.topic_landmarks = f"{site}/{device_id}/ui/landmarks"
+        self.ui_topics = (
+            f"{site}/{device_id}/ui/armed",
+            f"{site}/{device_id}/ui/cancel",
+            self.topic_session,
+        )
+        self.client = client
+        self.owns_client = client is None
         self.last_thumb_payload = None
-        self.setup_mqtt()
+        self.ui_listeners = []
+        self._peers: List["MQTTManager"] = []
+        if client is None:
+            self.setup_mqtt()
+        else:
+            self._register_callbacks(client)
+        self.publisher = publisher or MQTTPublisher(self.client)
+
+    def add_gate(self, site: str, device_id: str) -> "MQTTManager":
+        """MQTTManager ของอีก gate ที่ใช้การเชื่อมต่อ MQTT เดียวกับตัวนี้"""
+        peer = MQTTManager(site, device_id, client=self.client, publisher=self.publisher)
+        self._peers.append(peer)
+        if self.client is not None and self.client.is_connected():
+            peer._subscribe(self.client)
+        return peer
+
+    def _register_callbacks(self, client) -> None:
+        if client is None:
+            return
+        for topic in self.ui_topics:
+            client.message_callback_add(topic, self._on_message)
+
+    def _subscribe(self, client) -> None:
+        client.subscribe([(topic, 0) for topic in self.ui_topics])
+
+    def close(self) -> None:
+        if not self.owns_client:
+            return
+        self.publisher.close()
+        if self.client:
+            self.client.loop_stop()
+            self.client.disconnect()
 
     def setup_mqtt(self):
         try:
             self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
             self.client.username_pw_set(MQTT_USER, MQTT_PASS)
+            self.client.on_connect = self._on_connect
+            self._register_callbacks(self.client)
             self.client.connect(MQTT_HOST, MQTT_PORT, keepalive=60)
             self.client.loop_start()
             logger.info("MQTT client connected successfully")
         except Exception as e:
             logger.error(f"MQTT connection failed: {e}")
 
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # subscribe ใหม่ทุกครั้งที่ (re)connect รวมถึง gate ที่ใช้การเชื่อมต่อร่วมกัน
+        for manager in [self] + self._peers:
+            manager._subscribe(client)
+
+    def _on_message(self, client, userdata, message):
+        try:
+            payload = json.loads(message.payload.decode('utf-8') or '{}')
+        except (ValueError, UnicodeDecodeError):
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+        for listener in self.ui_listeners:
+            try:
+                listener(message.topic, payload)
+            except Exception as e:
+                logger.error(f"UI event handler failed: {e}")
+
     def send_thumb_state(
         self,
         detected: bool,
@@ -238,61 +930,83 @@ class MQTTManager:
         hold_complete: Optional[bool] = None,
         distance: Optional[float] = None,
     ) -> None:
-        """ส่งสถานะนิ้วโป้งไปยัง MQTT"""
+        """
+        ส่งสถานะนิ้วโป้งไปยัง MQTT
+        progress/reset ใช้ QoS 0 และถูกรวมตาม MQTT_COALESCE_MS ส่วน hold_complete ใช้ QoS 1 ส่งทันที
+        """
+        if progress is not None:
+            progress = round(max(0.0, min(progress, 1.0)), 4)
+        if hold_complete is not None:
+            hold_complete = bool(hold_complete)
+        if distance is not None:
+            distance = float(distance)
+
+        # dedupe จากค่าของ field (ไม่รวม timestamp)
+        state = (bool(detected), progress, hold_complete, distance)
+        if state == self.last_thumb_payload:
+            return
+        self.last_thumb_payload = state
+
+        timestamp = time.time()
         payload: Dict[str, object] = {
             "thumb": bool(detected),
-            "timestamp": time.time(),
+            "timestamp": timestamp,
             "camera": "rpi_camera"
         }
-
         if progress is not None:
-            clamped = max(0.0, min(progress, 1.0))
-            payload["progress"] = round(clamped, 4)
-
+            payload["progress"] = progress
         if hold_complete is not None:
-            payload["hold_complete"] = bool(hold_complete)
-
+            payload["hold_complete"] = hold_complete
         if distance is not None:
-            payload["distance"] = float(distance)
-
-        payload_key = json.dumps(payload, sort_keys=True)
-        if payload_key == self.last_thumb_payload:
-            return
-        self.last_thumb_payload = payload_key
+            payload["distance"] = distance
 
-        try:
-            self.client.publish(TOPIC_THUMB, json.dumps(payload), qos=1)
-            logger.info(
-                "📸 ส่งสถานะนิ้วโป้ง: %s (progress=%.2f, hold_complete=%s)",
-                payload["thumb"],
-                payload.get("progress", 0.0),
-                payload.get("hold_complete", False)
+        complete = bool(hold_complete)
+        qos = 1 if complete else 0
+        self.publisher.publish(self.topic_thumb, json.dumps(payload), qos=qos, coalesce=not complete)
+        if MQTT_BINARY:
+            self.publisher.publish(
+                f"{self.topic_thumb}/bin",
+                encode_thumb_binary(bool(detected), progress, hold_complete, distance, timestamp),
+                qos=qos,
+                coalesce=not complete,
             )
-        except Exception as e:
-            logger.error(f"Failed to send MQTT message: {e}")
+
+        log = logger.info if complete else logger.debug
+        log(
+            "📸 ส่งสถานะนิ้วโป้ง: %s (progress=%.2f, hold_complete=%s)",
+            payload["thumb"],
+            payload.get("progress", 0.0),
+            payload.get("hold_complete", False)
+        )
 
     def send_session_status(self, status: str):
-        """ส่งสถานะ session ไปยัง frontend"""
+        """ส่งสถานะ session ไปยัง frontend (QoS 1)"""
         payload = json.dumps({
             "status": status,
             "camera": "active",
             "timestamp": time.time()
         })
-        try:
-            self.client.publish(TOPIC_SESSION, payload, qos=1)
-        except Exception as e:
-            logger.error(f"Failed to send session status: {e}")
+        self.publisher.publish(self.topic_session, payload, qos=1)
 
-# ===================== Main Pipeline =====================
-class ThumbDetectionPipeline:
-    def __init__(self):
-        self.mqtt = MQTTManager()
-        self.cap = None
-        self.hands = None
-        self.gesture_detector = ThumbsUpRule(lift_margin_px=10, curl_margin_px=6)
-        self.is_running = False
-        self.frame_buffer = FrameBuffer() if STREAM_ENABLED else None
-        self.stream_server = None
+    def send_landmarks(self, hands, *, retain: bool = False):
+        """ส่งพิกัด landmarks (x, y แบบ normalized ต่อกันเป็น list เดียวต่อมือ) ให้ browser วาด overlay"""
+        payload = json.dumps({
+            "hands": hands,
+            "passthrough": STREAM_PASSTHROUGH,
+            "timestamp": time.time()
+        }, separators=(',', ':'))
+        self.publisher.publish(self.topic_landmarks, payload, qos=0, retain=retain, coalesce=not retain)
+
+class ThumbHoldStateMachine:
+    """
+    state machine การชูนิ้วค้าง: นับเฟรมที่ตรวจเจอติดกัน เริ่มจับเวลา
+    ส่ง progress ทีละ step และส่ง hold_complete เมื่อค้างครบ
+    hold_latency: histogram (วินาที) ของเวลาตั้งแต่เฟรมแรกที่เห็นท่าจนส่ง hold_complete
+    """
+    def __init__(self, mqtt_manager, hold_latency=None):
+        self.mqtt = mqtt_manager
+        self.hold_latency = hold_latency
+        self.gesture_start_ms: Optional[int] = None  # เวลาของเฟรมแรกที่เห็นท่า
         self.thumb_hold_duration_ms = 3000
         self.thumb_release_grace_ms = 600
         self.thumb_progress_step = 0.05
@@ -304,31 +1018,214 @@ class ThumbDetectionPipeline:
         self.consecutive_detect_frames = 0
         self.last_progress_bucket = -1
 
+    def update(self, detected: bool, now_ms: int):
+        """อัปเดต state machine การชูนิ้วค้างและส่ง progress ผ่าน MQTT"""
+        if detected:
+            if self.consecutive_detect_frames == 0 and self.thumb_hold_start_ms is None:
+                self.gesture_start_ms = now_ms
+            self.consecutive_detect_frames += 1
+            self.last_detected_ms = now_ms
+        else:
+            if self.thumb_hold_start_ms is None:
+                self.consecutive_detect_frames = 0
+                self.last_detected_ms = None
+
+        if self.thumb_hold_start_ms is None:
+            if self.consecutive_detect_frames >= self.detect_stable_frames:
+                self.thumb_hold_start_ms = now_ms
+                self.last_progress_sent = 0.0
+                self.thumb_hold_completed = False
+                self.last_progress_bucket = 0
+                self.mqtt.send_thumb_state(True, progress=0.0, hold_complete=False)
+                logger.info("👆 เริ่มตรวจจับนิ้วโป้ง (เริ่มจับเวลา)")
+        else:
+            if self.last_detected_ms is not None and (now_ms - self.last_detected_ms) > self.thumb_release_grace_ms:
+                logger.debug("Thumb hold released (timeout)")
+                self.reset()
+            else:
+                hold_ms = max(0, now_ms - (self.thumb_hold_start_ms or now_ms))
+                progress = min(hold_ms / self.thumb_hold_duration_ms, 1.0)
+                bucket = int(progress / self.thumb_progress_step)
+                max_bucket = int(1 / self.thumb_progress_step)
+
+                if not self.thumb_hold_completed:
+                    if progress >= 1.0:
+                        self.thumb_hold_completed = True
+                        self.last_progress_sent = 1.0
+                        self.last_progress_bucket = max_bucket
+                        self.mqtt.send_thumb_state(True, progress=1.0, hold_complete=True)
+                        self.mqtt.send_session_status("thumb_detected")
+                        if self.hold_latency is not None and self.gesture_start_ms is not None:
+                            self.hold_latency.observe((now_ms - self.gesture_start_ms) / 1000)
+                        logger.info("🎯 นิ้วโป้งค้างครบ %.1f วินาที", self.thumb_hold_duration_ms / 1000)
+                    elif bucket > self.last_progress_bucket:
+                        self.last_progress_bucket = bucket
+                        self.last_progress_sent = progress
+                        self.mqtt.send_thumb_state(True, progress=progress, hold_complete=False)
+
+    def reset(self):
+        """ยกเลิกการชูนิ้วค้างที่กำลังจับเวลา และแจ้ง frontend ถ้ามีสถานะค้างอยู่"""
+        has_state = (
+            self.thumb_hold_start_ms is not None or
+            self.thumb_hold_completed or
+            self.last_progress_sent > 0.0
+        )
+        if has_state:
+            self.mqtt.send_thumb_state(False, progress=0.0, hold_complete=False)
+            self.mqtt.last_thumb_payload = None
+
+        self.thumb_hold_start_ms = None
+        self.last_progress_sent = 0.0
+        self.thumb_hold_completed = False
+        self.last_detected_ms = None
+        self.consecutive_detect_frames = 0
+        self.last_progress_bucket = -1
+        self.gesture_start_ms = None
+
+# ===================== Main Pipeline =====================
+@dataclass
+class CameraConfig:
+    """กล้องหนึ่งตัวผูกกับ gate หนึ่ง (topic MQTT และ /stream/<gate> ของตัวเอง)"""
+    gate: str
+    site: str = SITE
+    device_id: str = DEVICE_ID
+    source: str = CAMERA_SOURCE
+    options: Dict[str, object] = field(default_factory=dict)  # override ค่าของ FrameSource
+
+
+def load_camera_configs() -> List[CameraConfig]:
+    """อ่านรายการกล้องจาก CAMERAS (JSON) หรือ CAMERAS_FILE; คืน [] ถ้าไม่ได้ตั้งค่า"""
+    if CAMERAS_FILE:
+        with open(CAMERAS_FILE, encoding='utf-8') as f:
+            entries = json.load(f)
+    elif CAMERAS:
+        entries = json.loads(CAMERAS)
+    else:
+        return []
+
+    configs = []
+    for entry in entries:
+        entry = dict(entry)
+        device_id = entry.pop('device_id', DEVICE_ID)
+        configs.append(CameraConfig(
+            gate=str(entry.pop('gate', device_id)),
+            site=entry.pop('site', SITE),
+            device_id=device_id,
+            source=str(entry.pop('source', CAMERA_SOURCE)).lower(),
+            options=entry,
+        ))
+    gates = [config.gate for config in configs]
+    if len(set(gates)) != len(gates):
+        raise ValueError(f"Duplicate gate names in camera config: {gates}")
+    return configs
+
+
+def build_frame_source(camera: Optional[CameraConfig] = None):
+    """สร้าง FrameSource ตาม CAMERA_SOURCE (หรือตาม CameraConfig ของ gate)"""
+    kind = camera.source if camera else CAMERA_SOURCE
+    decode_scale = INFERENCE_DECODE_SCALE if STREAM_PASSTHROUGH else 1
+    options = {
+        'opencv': dict(index=CAM_INDEX, width=FRAME_W, height=FRAME_H, fps=CAMERA_FPS,
+                       raw_mjpeg=STREAM_PASSTHROUGH, decode_scale=decode_scale),
+        'v4l2': dict(device=CAMERA_DEVICE, width=FRAME_W, height=FRAME_H, fps=CAMERA_FPS,
+                     decode_scale=decode_scale),
+        'gstreamer': dict(device=CAMERA_DEVICE, width=FRAME_W, height=FRAME_H, fps=CAMERA_FPS,
+                          decoder=GST_JPEG_DECODER),
+        'file': dict(path=CAMERA_SOURCE_PATH, fps=CAMERA_FPS, decode_scale=decode_scale),
+        'synthetic': dict(width=FRAME_W, height=FRAME_H, fps=CAMERA_FPS),
+    }.get(kind, {})
+    if camera:
+        options.update(camera.options)
+    return create_frame_source(kind, **options)
+
+
+HAND_MODEL_OPTIONS = dict(
+    model_complexity=0,  # ใช้ model ง่ายๆ สำหรับ RPi
+    max_num_hands=1,     # ตรวจจับมือเดียวเพื่อประสิทธิภาพ
+    min_detection_confidence=0.45,
+    min_tracking_confidence=0.25
+)
+
+
+class HandModels:
+    """MediaPipe Hands ชุดหนึ่ง (เฟรมเต็ม + ROI) ใช้ได้ทีละเธรด"""
+
+    def __init__(self, roi: bool = ROI_TRACKING):
+        self.hands = mp.solutions.hands.Hands(**HAND_MODEL_OPTIONS)
+        # instance แยกสำหรับภาพ crop เพื่อให้ tracking ภายในของ MediaPipe
+        # เห็นภาพขนาดคงที่ต่อเนื่องกัน
+        self.roi_hands = mp.solutions.hands.Hands(**HAND_MODEL_OPTIONS) if roi else None
+
+    def close(self) -> None:
+        self.hands.close()
+        if self.roi_hands:
+            self.roi_hands.close()
+
+
+class ThumbDetectionPipeline:
+    def __init__(self, mqtt_manager=None, camera: Optional[CameraConfig] = None):
+        self.camera = camera
+        self.gate = camera.gate if camera else DEVICE_ID
+        if mqtt_manager is None:
+            mqtt_manager = MQTTManager(camera.site, camera.device_id) if camera else MQTTManager()
+        self.mqtt = mqtt_manager
+        self.source = build_frame_source(camera)
+        self.mp_hands = mp.solutions.hands
+        self.mp_draw = mp.solutions.drawing_utils
+        self.hands = None
+        self.gesture_detector = ThumbsUpRule(lift_margin_px=10, curl_margin_px=6)
+        self.is_running = False
+        self.frame_buffer = FrameBuffer() if STREAM_ENABLED else None
+        self.stream_server = None
+        self.hold = ThumbHoldStateMachine(self.mqtt, METRICS.histogram(
+            "thumb_hold_complete_seconds", "Time from the first thumbs-up frame to hold_complete",
+            HOLD_BUCKETS, gate=self.gate,
+        ))
+        self.max_read_failures = 10
+        self._infer_queue = LatestFrameQueue()
+        self._encode_queue = LatestFrameQueue()
+        self._display_queue = LatestFrameQueue()
+        self._workers = []
+        self.stage_stats = {
+            "capture": StageStats("capture", self.source),
+            "inference": StageStats("inference", self._infer_queue),
+            "encode": StageStats("encode", self._encode_queue),
+        }
+        # เวลาต่อเฟรมของแต่ละขั้น (perf_counter) ใน histogram ของ METRICS
+        self.timers = {
+            stage: METRICS.histogram(
+                "thumb_stage_seconds", "Per-frame time spent in each pipeline stage",
+                gate=self.gate, stage=stage,
+            )
+            for stage in ("read", "cvt_color", "hands_process", "hands_process_roi",
+                          "draw_landmarks", "flip", "resize", "imencode")
+        }
+        METRICS.add_collector(self.collect_metrics)
+        self._last_stats_log = time.monotonic()
+        self.roi_hands = None
+        self.pool = None
+        if INFERENCE_PROCESSES > 0 and PIPELINE_MODE != 'serial' and camera is None:
+            # worker แต่ละโปรเซสเห็นเฟรมสลับกัน ROI tracking จึงใช้ไม่ได้ในโหมดนี้
+            self.pool = InferencePool(INFERENCE_PROCESSES, INFERENCE_SLOTS, HAND_MODEL_OPTIONS)
+        self.roi_tracker = HandRoiTracker() if ROI_TRACKING and self.pool is None else None
+        self.scheduler = InferenceScheduler() if ADAPTIVE_INFERENCE else None
+        self.recorder = None
+        if RECORD_PATH:
+            # หลายกล้อง: แยก recording ตาม gate
+            record_path = os.path.join(RECORD_PATH, self.gate) if camera else RECORD_PATH
+            self.recorder = LandmarkRecorder(record_path, record_frames=RECORD_FRAMES)
+        self._landmarks_visible = False
+        if self.scheduler:
+            self.mqtt.ui_listeners.append(self.scheduler.on_ui_event)
+
     def setup_camera(self):
         """ตั้งค่ากล้อง"""
         try:
-            backends = [cv2.CAP_V4L2, cv2.CAP_ANY, None]
-            for backend in backends:
-                cap = cv2.VideoCapture(CAM_INDEX) if backend is None else cv2.VideoCapture(CAM_INDEX, backend)
-                if cap.isOpened():
-                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_W)
-                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_H)
-                    cap.set(cv2.CAP_PROP_FPS, 30)
-                    buffer_prop = getattr(cv2, 'CAP_PROP_BUFFERSIZE', None)
-                    if buffer_prop is not None:
-                        cap.set(buffer_prop, 1)
-                    try:
-                        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-                    except Exception:
-                        logger.debug('Camera MJPG fourcc not supported, using default')
-                    self.cap = cap
-                    break
-
-            if self.cap is None or not self.cap.isOpened():
-                logger.error("Cannot open camera")
+            if not self.source.open():
+                logger.error("Cannot open camera (gate=%s)", self.gate)
                 return False
-            
-            logger.info("Camera initialized successfully")
+
+            logger.info("Camera initialized successfully (gate=%s, source=%s)", self.gate, self.source.name)
             return True
         except Exception as e:
             logger.error(f"Camera setup failed: {e}")
@@ -336,57 +1233,109 @@ class ThumbDetectionPipeline:
 
     def setup_mediapipe(self):
         """ตั้งค่า MediaPipe"""
+        if self.pool:
+            # โหลด model ใน worker process ตอนได้เฟรมแรก
+            logger.info("MediaPipe runs in %d worker processes", self.pool.processes)
+            return True
         try:
-            self.mp_hands = mp.solutions.hands
-            self.mp_draw = mp.solutions.drawing_utils
-            
-            self.hands = self.mp_hands.Hands(
-                model_complexity=0,  # ใช้ model ง่ายๆ สำหรับ RPi
-                max_num_hands=1,     # ตรวจจับมือเดียวเพื่อประสิทธิภาพ
-                min_detection_confidence=0.45,
-                min_tracking_confidence=0.25
-            )
+            models = HandModels(roi=self.roi_tracker is not None)
+            self.hands, self.roi_hands = models.hands, models.roi_hands
             logger.info("MediaPipe initialized successfully")
             return True
         except Exception as e:
             logger.error(f"MediaPipe setup failed: {e}")
             return False
 
-    def publish_frame(self, frame):
+    def publish_frame(self, frame, skip_default: bool = False):
+        """Encode เฟรมเฉพาะ variant ที่มี client ดูอยู่ แล้วส่งเข้า FrameBuffer"""
         if not self.frame_buffer:
             return
-        try:
-            success, encoded = cv2.imencode(
-                '.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), STREAM_JPEG_QUALITY]
-            )
-            if success:
-                self.frame_buffer.update(encoded.tobytes())
-        except Exception as exc:
-            logger.debug(f"Frame encode failed: {exc}")
+        encoded: Dict[str, bytes] = {}
+        for variant in self.frame_buffer.active_variants():
+            if skip_default and variant.name == "default":
+                continue
+            try:
+                image = frame
+                if variant.width and variant.width < frame.shape[1]:
+                    height = max(1, int(frame.shape[0] * variant.width / frame.shape[1]))
+                    with self.timers["resize"].time():
+                        image = cv2.resize(frame, (variant.width, height), interpolation=cv2.INTER_AREA)
+                with self.timers["imencode"].time():
+                    success, buffer = cv2.imencode(
+                        '.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), variant.quality]
+                    )
+                if success:
+                    encoded[variant.name] = buffer.tobytes()
+            except Exception as exc:
+                logger.debug(f"Frame encode failed ({variant.name}): {exc}")
+        if encoded:
+            self.frame_buffer.update_variants(encoded)
+
+    def publish_passthrough(self, captured) -> bool:
+        """ส่ง JPEG ของกล้องเข้าสตรีม default ตรงๆ คืน False ถ้าเฟรมนี้ไม่มี JPEG ให้ใช้"""
+        if not (STREAM_PASSTHROUGH and self.frame_buffer and captured.jpeg is not None):
+            return False
+        if self.frame_buffer.is_active("default"):
+            self.frame_buffer.update(captured.jpeg)
+        return True
+
+    def _needs_display_frame(self, passthrough: bool = False) -> bool:
+        """ไม่ต้อง flip/encode ถ้าไม่มีใครดูสตรีมและไม่ได้เปิดหน้าต่าง"""
+        if SHOW_WINDOW:
+            return True
+        if not self.frame_buffer:
+            return False
+        if passthrough:
+            # default ส่งตรงจากกล้องแล้ว เหลือเฉพาะ variant ที่ต้องย่อ
+            return any(variant.name != "default" for variant in self.frame_buffer.active_variants())
+        return self.frame_buffer.has_subscribers()
+
+    def _display_frame(self, annotated):
+        """เฟรมสำหรับสตรีม/หน้าต่าง: โหมด pass-through ไม่ flip เพราะ browser mirror เอง"""
+        if STREAM_PASSTHROUGH:
+            return annotated
+        with self.timers["flip"].time():
+            return cv2.flip(annotated, 1)
 
-    def process_frame(self, frame):
-        """ประมวลผลเฟรมและตรวจจับท่าทาง"""
+    def process_frame(self, frame, scale: int = 1):
+        """ประมวลผลเฟรมและตรวจจับท่าทาง (scale = อัตราที่ frame ถูกย่อจากภาพจริงของกล้อง)"""
         if self.hands is None:
             return False, frame
 
-        annotated = frame.copy()
-
         try:
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             h, w, _ = frame.shape
+            results = self._detect_hands(frame, h, w)
+        except Exception as e:
+            logger.error(f"Error processing frame: {e}")
+            return False, frame
+        return self.handle_results(frame, results, scale)
+
+    def handle_results(self, frame, results, scale: int = 1):
+        """ตรวจท่าจากผล MediaPipe (multi_hand_landmarks) บันทึก/ส่ง landmarks และวาด overlay"""
+        # pass-through ไม่วาด overlay ลงภาพ จึงไม่ต้อง copy
+        annotated = frame if STREAM_PASSTHROUGH else frame.copy()
 
-            # Process with MediaPipe
-            results = self.hands.process(rgb_frame)
+        try:
+            h, w, _ = frame.shape
+            # margin ของ ThumbsUpRule เป็น pixel ของภาพเต็ม
+            rule_h, rule_w = h * scale, w * scale
+            if self.recorder:
+                self._record(frame, results, rule_h, rule_w)
+            if STREAM_PASSTHROUGH:
+                self._publish_landmarks(results)
 
             detected = False
             if results.multi_hand_landmarks:
+                if self.scheduler:
+                    self.scheduler.report_hand(int(time.time() * 1000))
                 for hand_landmarks in results.multi_hand_landmarks:
-                    self.mp_draw.draw_landmarks(
-                        annotated, hand_landmarks, self.mp_hands.HAND_CONNECTIONS
-                    )
+                    if not STREAM_PASSTHROUGH:
+                        with self.timers["draw_landmarks"].time():
+                            self.mp_draw.draw_landmarks(
+                                annotated, hand_landmarks, self.mp_hands.HAND_CONNECTIONS
+                            )
 
-                    if self.gesture_detector(hand_landmarks, h, w):
+                    if self.gesture_detector(hand_landmarks, rule_h, rule_w):
                         detected = True
                         break
 
@@ -394,7 +1343,58 @@ class ThumbDetectionPipeline:
         except Exception as e:
             logger.error(f"Error processing frame: {e}")
             return False, annotated
+
+    def _publish_landmarks(self, results):
+        """ส่ง landmarks ทุกครั้งที่เห็นมือ และส่ง list ว่างครั้งเดียวเมื่อมือหายไป"""
+        if results.multi_hand_landmarks:
+            hands = [
+                np.round(landmarks_to_array(hand_landmarks)[:, :2], 4).ravel().tolist()
+                for hand_landmarks in results.multi_hand_landmarks
+            ]
+            self.mqtt.send_landmarks(hands)
+            self._landmarks_visible = True
+        elif self._landmarks_visible:
+            self.mqtt.send_landmarks([])
+            self._landmarks_visible = False
+
+    def _record(self, frame, results, h: int, w: int):
+        landmarks = None
+        if results.multi_hand_landmarks:
+            landmarks = landmarks_to_array(results.multi_hand_landmarks[0])
+        jpeg = None
+        if self.recorder.record_frames:
+            success, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+            jpeg = buffer.tobytes() if success else None
+        self.recorder.write(time.time() * 1000, landmarks, h, w, jpeg)
 
+    def _detect_hands(self, frame, h: int, w: int):
+        """รัน MediaPipe บน ROI ที่ติดตามอยู่ ถ้าไม่เจอมือค่อยกลับไปใช้เฟรมเต็ม"""
+        hands, roi_hands = self.hands, self.roi_hands
+        roi = self.roi_tracker.crop(frame) if self.roi_tracker and roi_hands else None
+        if roi is not None:
+            crop, box = roi
+            with self.timers["cvt_color"].time():
+                rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            with self.timers["hands_process_roi"].time():
+                results = roi_hands.process(rgb_crop)
+            if results.multi_hand_landmarks:
+                for hand_landmarks in results.multi_hand_landmarks:
+                    HandRoiTracker.map_to_frame(hand_landmarks, box, h, w)
+                self.roi_tracker.update(results.multi_hand_landmarks[0], h, w)
+                return results
+            self.roi_tracker.lost()
+
+        # Convert BGR to RGB
+        with self.timers["cvt_color"].time():
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        # Process with MediaPipe
+        with self.timers["hands_process"].time():
+            results = hands.process(rgb_frame)
+        if self.roi_tracker and results.multi_hand_landmarks:
+            self.roi_tracker.update(results.multi_hand_landmarks[0], h, w)
+        return results
+
     def run(self):
         """รัน pipeline หลัก"""
         logger.info("🚀 เริ่มระบบตรวจจับท่าทาง...")
@@ -413,82 +1413,17 @@ class ThumbDetectionPipeline:
 
         self.is_running = True
         self.mqtt.send_session_status("camera_ready")
-        logger.info("✅ ระบบพร้อมทำงาน - รอตรวจจับนิ้วโป้ง...")
-
-        consecutive_failures = 0
-        max_failures = 10
+        # retained: browser ที่เปิดทีหลังรู้ทันทีว่าต้อง mirror/วาด overlay เองหรือไม่
+        self.mqtt.send_landmarks([], retain=True)
+        if STREAM_PASSTHROUGH and self.source.name in ('gstreamer', 'synthetic'):
+            logger.warning("Source %s has no camera JPEG; stream frames will be re-encoded", self.source.name)
+        logger.info("✅ ระบบพร้อมทำงาน - รอตรวจจับนิ้วโป้ง... (mode=%s)", PIPELINE_MODE)
 
         try:
-            while self.is_running:
-                ret, frame = self.cap.read()
-                if not ret:
-                    consecutive_failures += 1
-                    logger.warning(f"Failed to read frame ({consecutive_failures}/{max_failures})")
-                    if consecutive_failures == 1:
-                        self._reset_thumb_hold()
-                    if consecutive_failures >= max_failures:
-                        logger.error("Too many consecutive failures, restarting camera...")
-                        self.cap.release()
-                        time.sleep(2)
-                        if not self.setup_camera():
-                            break
-                        consecutive_failures = 0
-                    continue
-                
-                consecutive_failures = 0
-
-                # ประมวลผลเฟรมและอัปเดตสถานะการชูนิ้วโป้ง
-                detected, annotated = self.process_frame(frame)
-                now_ms = int(time.time() * 1000)
-
-                if detected:
-                    self.consecutive_detect_frames += 1
-                    self.last_detected_ms = now_ms
-                else:
-                    if self.thumb_hold_start_ms is None:
-                        self.consecutive_detect_frames = 0
-                        self.last_detected_ms = None
-
-                if self.thumb_hold_start_ms is None:
-                    if self.consecutive_detect_frames >= self.detect_stable_frames:
-                        self.thumb_hold_start_ms = now_ms
-                        self.last_progress_sent = 0.0
-                        self.thumb_hold_completed = False
-                        self.last_progress_bucket = 0
-                        self.mqtt.send_thumb_state(True, progress=0.0, hold_complete=False)
-                        logger.info("👆 เริ่มตรวจจับนิ้วโป้ง (เริ่มจับเวลา)")
-                else:
-                    if self.last_detected_ms is not None and (now_ms - self.last_detected_ms) > self.thumb_release_grace_ms:
-                        logger.debug("Thumb hold released (timeout)")
-                        self._reset_thumb_hold()
-                    else:
-                        hold_ms = max(0, now_ms - (self.thumb_hold_start_ms or now_ms))
-                        progress = min(hold_ms / self.thumb_hold_duration_ms, 1.0)
-                        bucket = int(progress / self.thumb_progress_step)
-                        max_bucket = int(1 / self.thumb_progress_step)
-
-                        if not self.thumb_hold_completed:
-                            if progress >= 1.0:
-                                self.thumb_hold_completed = True
-                                self.last_progress_sent = 1.0
-                                self.last_progress_bucket = max_bucket
-                                self.mqtt.send_thumb_state(True, progress=1.0, hold_complete=True)
-                                self.mqtt.send_session_status("thumb_detected")
-                                logger.info("🎯 นิ้วโป้งค้างครบ %.1f วินาที", self.thumb_hold_duration_ms / 1000)
-                            elif bucket > self.last_progress_bucket:
-                                self.last_progress_bucket = bucket
-                                self.last_progress_sent = progress
-                                self.mqtt.send_thumb_state(True, progress=progress, hold_complete=False)
-
-                display_frame = cv2.flip(annotated, 1)
-
-                self.publish_frame(display_frame)
-
-                if SHOW_WINDOW:
-                    cv2.imshow("Thumb Detection - RPi", display_frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        break
-
+            if PIPELINE_MODE == 'serial':
+                self._run_serial()
+            else:
+                self._run_threaded()
         except KeyboardInterrupt:
             logger.info("Received interrupt, shutting down...")
         except Exception as e:
@@ -496,43 +1431,430 @@ class ThumbDetectionPipeline:
         finally:
             self.cleanup()
 
-    def _reset_thumb_hold(self):
-        has_state = (
-            self.thumb_hold_start_ms is not None or
-            self.thumb_hold_completed or
-            self.last_progress_sent > 0.0
-        )
-        if has_state:
-            self.mqtt.send_thumb_state(False, progress=0.0, hold_complete=False)
-            self.mqtt.last_thumb_payload = None
+    def _run_serial(self):
+        """อ่าน-ประมวลผล-เข้ารหัสต่อกันในเธรดเดียว (โหมดเดิม)"""
+        consecutive_failures = 0
 
-        self.thumb_hold_start_ms = None
-        self.last_progress_sent = 0.0
-        self.thumb_hold_completed = False
-        self.last_detected_ms = None
-        self.consecutive_detect_frames = 0
-        self.last_progress_bucket = -1
+        while self.is_running:
+            with self.timers["read"].time():
+                captured = self.source.read()
+            if captured is None or captured.image is None:
+                consecutive_failures += 1
+                if not self._handle_read_failure(consecutive_failures):
+                    break
+                if consecutive_failures >= self.max_read_failures:
+                    consecutive_failures = 0
+                continue
 
-    def cleanup(self):
+            consecutive_failures = 0
+            self.stage_stats["capture"].tick()
+            passthrough = self.publish_passthrough(captured)
+
+            # ประมวลผลเฟรมและอัปเดตสถานะการชูนิ้วโป้ง
+            annotated = self._infer(captured)
+
+            if not self._needs_display_frame(passthrough):
+                self._maybe_log_stats()
+                continue
+
+            display_frame = self._display_frame(annotated)
+            self.publish_frame(display_frame, skip_default=passthrough)
+            self.stage_stats["encode"].tick()
+
+            if SHOW_WINDOW:
+                cv2.imshow("Thumb Detection - RPi", display_frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+            self._maybe_log_stats()
+
+    def _run_threaded(self):
+        """แยก capture / inference / encode เป็น worker ของตัวเอง ส่งต่อกันผ่าน LatestFrameQueue"""
+        if self.pool:
+            inference = [
+                threading.Thread(target=self._pool_dispatch_worker, name="thumb-dispatch", daemon=True),
+                threading.Thread(target=self._pool_result_worker, name="thumb-results", daemon=True),
+            ]
+        else:
+            inference = [threading.Thread(target=self._inference_worker, name="thumb-inference", daemon=True)]
+        self._workers = [
+            threading.Thread(target=self._capture_worker, name="thumb-capture", daemon=True),
+            *inference,
+            threading.Thread(target=self._encode_worker, name="thumb-encode", daemon=True),
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        # เธรดหลักใช้แสดงผลหน้าต่าง (cv2.imshow ต้องอยู่บน main thread) และ log สถิติ
+        while self.is_running and all(worker.is_alive() for worker in self._workers):
+            if SHOW_WINDOW:
+                ok, display_frame = self._display_queue.get(timeout=0.1)
+                if ok:
+                    cv2.imshow("Thumb Detection - RPi", display_frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.2)
+            self._maybe_log_stats()
+
+    def _capture_worker(self):
+        consecutive_failures = 0
+        try:
+            while self.is_running:
+                with self.timers["read"].time():
+                    captured = self.source.read()
+                if captured is None or captured.image is None:
+                    consecutive_failures += 1
+                    if consecutive_failures == 1:
+                        # แจ้ง inference stage ให้รีเซ็ตสถานะการชูนิ้ว
+                        self._infer_queue.put(None)
+                    if not self._handle_read_failure(consecutive_failures, reset_hold=False):
+                        break
+                    if consecutive_failures >= self.max_read_failures:
+                        consecutive_failures = 0
+                    continue
+
+                consecutive_failures = 0
+                self.stage_stats["capture"].tick()
+                # JPEG จากกล้องเข้าสตรีมได้ทันที ไม่ต้องรอ inference
+                passthrough = self.publish_passthrough(captured)
+                self._infer_queue.put((captured, passthrough))
+        except Exception as e:
+            logger.error(f"Capture worker error: {e}")
+        finally:
+            self._infer_queue.close()
+
+    def _inference_worker(self):
+        try:
+            while self.is_running:
+                ok, item = self._infer_queue.get(timeout=0.5)
+                if ok:
+                    self.handle_inference(item)
+        except Exception as e:
+            logger.error(f"Inference worker error: {e}")
+        finally:
+            self._encode_queue.close()
+
+    def _pool_dispatch_worker(self):
+        """ส่งเฟรมเข้า InferencePool (เฟรมที่ scheduler ข้ามส่งต่อให้ encode ทันที)"""
+        try:
+            while self.is_running:
+                ok, item = self._infer_queue.get(timeout=0.5)
+                if not ok:
+                    continue
+                if item is None:
+                    # รีเซ็ตตามลำดับเดียวกับผล inference ที่ยังค้างอยู่
+                    self.pool.submit_marker(None)
+                    continue
+                captured, passthrough = item
+                if self.scheduler and not self.scheduler.should_infer(captured.image, int(time.time() * 1000)):
+                    self.stage_stats["inference"].skip()
+                    self._encode_queue.put((captured.image, passthrough))
+                    continue
+                if not self.pool.submit(captured.image, item):
+                    # ทุก worker ยังไม่ว่าง: ข้ามเฟรมนี้
+                    self.stage_stats["inference"].skip()
+        except Exception as e:
+            logger.error(f"Inference dispatch error: {e}")
+
+    def _pool_result_worker(self):
+        """รับผลจาก InferencePool ตามลำดับ seq แล้วอัปเดต hold state machine"""
+        try:
+            while self.is_running:
+                result = self.pool.get(timeout=0.5)
+                if result is None:
+                    continue
+                item, hands = result
+                if item is None:
+                    self.hold.reset()
+                    continue
+                captured, passthrough = item
+                results = SimpleNamespace(
+                    multi_hand_landmarks=[array_to_landmarks(lm) for lm in hands] if hands else None
+                )
+                detected, annotated = self.handle_results(captured.image, results, captured.scale)
+                self.hold.update(detected, int(time.time() * 1000))
+                self.stage_stats["inference"].tick()
+                self._encode_queue.put((annotated, passthrough))
+        except Exception as e:
+            logger.error(f"Inference result worker error: {e}")
+        finally:
+            self._encode_queue.close()
+
+    def handle_inference(self, item):
+        """ประมวลผลหนึ่งรายการจาก infer queue (None = capture อ่านไม่สำเร็จ ให้รีเซ็ตสถานะ)"""
+        if item is None:
+            self.hold.reset()
+            return
+        captured, passthrough = item
+        self._encode_queue.put((self._infer(captured), passthrough))
+
+    def _encode_worker(self):
+        try:
+            while self.is_running:
+                ok, item = self._encode_queue.get(timeout=0.5)
+                if not ok:
+                    continue
+                annotated, passthrough = item
+                if not self._needs_display_frame(passthrough):
+                    continue
+                display_frame = self._display_frame(annotated)
+                self.publish_frame(display_frame, skip_default=passthrough)
+                self.stage_stats["encode"].tick()
+                if SHOW_WINDOW:
+                    self._display_queue.put(display_frame)
+        except Exception as e:
+            logger.error(f"Encode worker error: {e}")
+
+    def _infer(self, captured):
+        """รัน inference (ถ้า scheduler อนุญาต) และอัปเดตสถานะ คืนเฟรมสำหรับแสดงผล"""
+        frame = captured.image
+        if self.scheduler and not self.scheduler.should_infer(frame, int(time.time() * 1000)):
+            self.stage_stats["inference"].skip()
+            return frame
+
+        detected, annotated = self.process_frame(frame, captured.scale)
+        self.hold.update(detected, int(time.time() * 1000))
+        self.stage_stats["inference"].tick()
+        return annotated
+
+    def _handle_read_failure(self, consecutive_failures: int, reset_hold: bool = True) -> bool:
+        """จัดการเมื่ออ่านเฟรมไม่สำเร็จ คืนค่า False ถ้าเปิดกล้องใหม่ไม่ได้"""
+        logger.warning(f"Failed to read frame ({consecutive_failures}/{self.max_read_failures})")
+        if consecutive_failures == 1 and reset_hold:
+            self.hold.reset()
+        if consecutive_failures >= self.max_read_failures:
+            logger.error("Too many consecutive failures, restarting camera...")
+            self.source.release()
+            time.sleep(2)
+            if not self.setup_camera():
+                return False
+        return True
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """สถิติ FPS และจำนวนเฟรมที่ถูกทิ้งของแต่ละ stage"""
+        return {name: stats.snapshot() for name, stats in self.stage_stats.items()}
+
+    def collect_metrics(self):
+        """FPS และตัวนับเฟรมของแต่ละ stage สำหรับ /metrics"""
+        for stage, s in self.get_stats().items():
+            labels = {"gate": self.gate, "stage": stage}
+            yield Sample("thumb_stage_fps", "gauge", "Frames per second over the last second", labels, s["fps"])
+            yield Sample("thumb_stage_frames_total", "counter", "Frames handled by the stage", labels, s["frames"])
+            yield Sample("thumb_stage_dropped_total", "counter",
+                         "Frames replaced in the stage input queue before being handled", labels, s["dropped"])
+            yield Sample("thumb_stage_skipped_total", "counter",
+                         "Frames the stage skipped (adaptive inference / busy pool)", labels, s["skipped"])
+
+    def _maybe_log_stats(self):
+        if STATS_LOG_INTERVAL <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_log < STATS_LOG_INTERVAL:
+            return
+        self._last_stats_log = now
+        logger.info(
+            "📊 %s%s",
+            f"[{self.gate}] " if self.camera else "",
+            ", ".join(
+                f"{name}: {s['fps']:.1f} fps (dropped {s['dropped']}, skipped {s['skipped']})"
+                for name, s in self.get_stats().items()
+            )
+        )
+        hold = self.hold.hold_latency
+        if hold is not None and hold.count:
+            logger.info("📊 %shold_complete p99 %.2fs (%d holds)",
+                        f"[{self.gate}] " if self.camera else "", hold.quantile(0.99), hold.count)
+
+    def cleanup(self, close_mqtt: bool = True):
         """ทำความสะอาด resources"""
         self.is_running = False
-        self._reset_thumb_hold()
-        if self.cap:
-            self.cap.release()
+        METRICS.remove_collector(self.collect_metrics)
+        for queue in (self._infer_queue, self._encode_queue, self._display_queue):
+            queue.close()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout=2.0)
+        self._workers = []
+        self.hold.reset()
+        self.source.release()
         if self.hands:
             self.hands.close()
+        if self.roi_hands:
+            self.roi_hands.close()
+        if self.pool:
+            self.pool.close()
+        if self.recorder:
+            self.recorder.close()
         if SHOW_WINDOW:
             cv2.destroyAllWindows()
         if self.stream_server:
             try:
                 self.stream_server.shutdown()
-                self.stream_server.server_close()
             except Exception as exc:
                 logger.debug(f"Error stopping stream server: {exc}")
             self.stream_server = None
-        if self.mqtt.client:
-            self.mqtt.client.loop_stop()
-            self.mqtt.client.disconnect()
+        if close_mqtt:
+            self.mqtt.close()
+            logger.info("ระบบปิดลงแล้ว")
+
+
+class MultiCameraPipeline:
+    """
+    หลายกล้อง/หลาย gate ในโปรเซสเดียว
+    - capture และ encode แยกเธรดต่อกล้อง (ใช้ worker ของ ThumbDetectionPipeline)
+    - inference worker ชุดเดียวใช้ร่วมกันทุกกล้อง วนเก็บเฟรมล่าสุดของทุก gate ที่พร้อมมาประมวลผลเป็นรอบๆ
+    - MediaPipe (video mode + ROI) แยกชุดต่อ gate: tracking ระหว่างเฟรมของ MediaPipe จึงไม่ปนภาพจากหลายกล้อง
+      gate หนึ่งถูกประมวลผลโดย worker ทีละตัว (_infer_lock) จึงใช้ชุดเดียวกันได้ไม่ว่า worker ไหนหยิบไป
+    - capture / encode ของ gate ที่หยุดไป (กล้องหลุดจนเปิดใหม่ไม่ได้, exception) ถูกเริ่มใหม่ gate อื่นทำงานต่อ
+    - MQTT ใช้การเชื่อมต่อเดียว, stream server เดียว (/stream/<gate>)
+    - hold state machine / scheduler / ROI tracker แยกต่อ gate
+    """
+
+    def __init__(self, cameras: List[CameraConfig], workers: int = INFERENCE_WORKERS):
+        self.mqtt = MQTTManager(cameras[0].site, cameras[0].device_id)
+        self.gates: List[ThumbDetectionPipeline] = []
+        self._frame_ready = threading.Event()
+        for i, camera in enumerate(cameras):
+            mqtt_manager = self.mqtt if i == 0 else self.mqtt.add_gate(camera.site, camera.device_id)
+            gate = ThumbDetectionPipeline(mqtt_manager, camera=camera)
+            gate._infer_queue.on_put = self._frame_ready.set
+            # gate หนึ่งถูกประมวลผลโดย worker ทีละตัว เพื่อให้ลำดับเฟรมและสถานะถูกต้อง
+            gate._infer_lock = threading.Lock()
+            gate._gate_threads = {}
+            gate._restart_at = 0.0
+            gate.restarts = 0
+            self.gates.append(gate)
+        self.worker_count = max(1, workers)
+        self.stream_server = None
+        self.is_running = False
+        self._workers = []
+
+    def run(self):
+        logger.info("🚀 เริ่มระบบตรวจจับท่าทาง %d กล้อง...", len(self.gates))
+        self.gates = [gate for gate in self.gates if gate.setup_camera() and gate.setup_mediapipe()]
+        if not self.gates:
+            logger.error("No camera could be opened")
+            self.mqtt.close()
+            return
+        if SHOW_WINDOW:
+            logger.warning("SHOW_WINDOW is not supported with multiple cameras")
+
+        if STREAM_ENABLED:
+            try:
+                self.stream_server = AsyncStreamServer()
+                for gate in self.gates:
+                    self.stream_server.add_gate(gate.gate, gate.frame_buffer)
+                self.stream_server.start()
+                logger.info(
+                    "📡 MJPEG streams ready at http://0.0.0.0:%s/stream/{%s}",
+                    STREAM_PORT, ",".join(gate.gate for gate in self.gates)
+                )
+            except Exception as exc:
+                logger.error(f"Failed to start stream server: {exc}")
+                self.stream_server = None
+
+        self.is_running = True
+        for gate in self.gates:
+            gate.is_running = True
+            gate.mqtt.send_session_status("camera_ready")
+            gate.mqtt.send_landmarks([], retain=True)
+            self._start_gate_workers(gate, ("capture", "encode"))
+        self._workers = [
+            threading.Thread(target=self._inference_worker, name=f"thumb-inference-{i}", daemon=True)
+            for i in range(self.worker_count)
+        ]
+        for worker in self._workers:
+            worker.start()
+        logger.info("✅ ระบบพร้อมทำงาน - %d gates, %d inference workers", len(self.gates), self.worker_count)
+
+        try:
+            while self.is_running and all(worker.is_alive() for worker in self._workers):
+                time.sleep(0.2)
+                for gate in self.gates:
+                    self._supervise(gate)
+                    gate._maybe_log_stats()
+        except KeyboardInterrupt:
+            logger.info("Received interrupt, shutting down...")
+        finally:
+            self.cleanup()
+
+    def _start_gate_workers(self, gate: ThumbDetectionPipeline, kinds) -> None:
+        for kind in kinds:
+            target = gate._capture_worker if kind == "capture" else gate._encode_worker
+            worker = threading.Thread(target=target, name=f"thumb-{kind}-{gate.gate}", daemon=True)
+            gate._gate_threads[kind] = worker
+            worker.start()
+        gate._workers = list(gate._gate_threads.values())
+
+    def _supervise(self, gate: ThumbDetectionPipeline) -> None:
+        """เริ่ม capture / encode ของ gate ที่หยุดไปใหม่ (กล้องเปิดไม่ได้ลองใหม่ทุก GATE_RESTART_INTERVAL วินาที)"""
+        dead = [kind for kind, worker in gate._gate_threads.items() if not worker.is_alive()]
+        if not dead or not self.is_running or time.monotonic() < gate._restart_at:
+            return
+        logger.error("Gate %s: %s worker stopped, restarting", gate.gate, "/".join(dead))
+        gate.restarts += 1
+        gate._infer_queue.put(None)     # inference worker รีเซ็ต hold state ของ gate นี้
+        if "capture" in dead:
+            gate.source.release()
+            if not gate.setup_camera():
+                gate._restart_at = time.monotonic() + GATE_RESTART_INTERVAL
+                logger.error("Gate %s: camera still unavailable, retrying in %.0fs", gate.gate, GATE_RESTART_INTERVAL)
+                dead.remove("capture")
+        self._start_gate_workers(gate, dead)
+
+    def _claim_batch(self):
+        """เก็บเฟรมล่าสุดของทุก gate ที่ไม่มี worker อื่นถืออยู่ (คืน list ของ (gate, item))"""
+        batch = []
+        for gate in self.gates:
+            if not gate._infer_lock.acquire(blocking=False):
+                continue
+            ok, item = gate._infer_queue.get(timeout=0)
+            if ok:
+                batch.append((gate, item))
+            else:
+                gate._infer_lock.release()
+        return batch
+
+    def _inference_worker(self):
+        try:
+            while self.is_running:
+                self._frame_ready.clear()
+                batch = self._claim_batch()
+                if not batch:
+                    self._frame_ready.wait(timeout=0.1)
+                    continue
+                for gate, item in batch:
+                    try:
+                        gate.handle_inference(item)
+                    except Exception as e:
+                        logger.error(f"Inference error (gate={gate.gate}): {e}")
+                    finally:
+                        gate._infer_lock.release()
+        except Exception as e:
+            logger.error(f"Inference worker error: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return {gate.gate: gate.get_stats() for gate in self.gates}
+
+    def cleanup(self):
+        self.is_running = False
+        self._frame_ready.set()
+        for gate in self.gates:
+            gate.is_running = False
+        # หยุด inference ก่อน gate.cleanup() รีเซ็ต hold state
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+        self._workers = []
+        for gate in self.gates:
+            gate.cleanup(close_mqtt=False)
+        if self.stream_server:
+            try:
+                self.stream_server.shutdown()
+            except Exception as exc:
+                logger.debug(f"Error stopping stream server: {exc}")
+            self.stream_server = None
+        self.mqtt.close()
         logger.info("ระบบปิดลงแล้ว")
 
 def main():
@@ -542,7 +1864,11 @@ def main():
     logger.info("   Integrated with MQTT Bridge")
     logger.info("=" * 50)
     
-    pipeline = ThumbDetectionPipeline()
+    cameras = load_camera_configs()
+    if cameras:
+        pipeline = MultiCameraPipeline(cameras)
+    else:
+        pipeline = ThumbDetectionPipeline()
     pipeline.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,641 @@
+# frame_sources.py - แหล่งภาพสำหรับ camera_thumb (กล้อง / ไฟล์ / ภาพสังเคราะห์)
+"""
+ทุกแหล่งภาพใช้ interface เดียวกัน (FrameSource):
+
+    source = create_frame_source('v4l2', device='/dev/video0', width=640, height=480)
+    if source.open():
+        captured = source.read()   # CapturedFrame หรือ None ถ้าอ่านไม่สำเร็จ
+        source.release()
+
+CapturedFrame.timestamp เป็นเวลาถ่ายภาพจริงบนนาฬิกา time.monotonic()
+(สำหรับ V4L2 ใช้ timestamp ของ buffer จาก kernel) และ FrameSource.dropped
+นับจำนวนเฟรมที่หายไประหว่างทาง
+"""
+import ctypes
+import errno
+import fcntl
+import glob
+import logging
+import mmap
+import os
+import select
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CapturedFrame:
+    image: Optional[np.ndarray]  # ภาพ BGR
+    timestamp: float             # เวลาที่ถ่ายภาพ (time.monotonic)
+    sequence: int
+    jpeg: Optional[bytes] = None  # JPEG ดิบจากกล้อง (ถ้ามี)
+    scale: int = 1                # image ถูกย่อลงกี่เท่าเทียบกับเฟรมจริงของกล้อง
+
+
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_jpeg(data, scale: int = 1) -> Optional[np.ndarray]:
+    """decode JPEG โดยให้ libjpeg ย่อภาพระหว่าง decode (scale = 1, 2, 4 หรือ 8)"""
+    flags = _REDUCED_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR)
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+class FrameSource:
+    """Base class ของแหล่งภาพ"""
+    name = "base"
+
+    def __init__(self, fps: float = 30.0, realtime: bool = True, decode_scale: int = 1):
+        self.fps = fps
+        self.realtime = realtime
+        self.decode_scale = decode_scale if decode_scale in _REDUCED_DECODE_FLAGS else 1
+        self.frames_read = 0
+        self.dropped = 0
+        self._sequence = 0
+        self._last_timestamp: Optional[float] = None
+        self._next_due = 0.0
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def read(self) -> Optional[CapturedFrame]:
+        raise NotImplementedError
+
+    def release(self) -> None:
+        pass
+
+    def stats(self):
+        return {"source": self.name, "frames": self.frames_read, "dropped": self.dropped}
+
+    def _frame(self, image, timestamp: float, jpeg: Optional[bytes] = None,
+               sequence: Optional[int] = None) -> CapturedFrame:
+        """สร้าง CapturedFrame และนับเฟรมที่หาย (จาก sequence หรือช่องว่างของเวลา)"""
+        if sequence is None:
+            if self._last_timestamp is not None and self.fps > 0:
+                gap_frames = int(round((timestamp - self._last_timestamp) * self.fps))
+                if gap_frames > 1:
+                    self.dropped += gap_frames - 1
+            sequence = self._sequence + 1
+        elif self.frames_read and sequence > self._sequence + 1:
+            self.dropped += sequence - self._sequence - 1
+        self._sequence = sequence
+        self._last_timestamp = timestamp
+        self.frames_read += 1
+        scale = self.decode_scale if jpeg is not None else 1
+        return CapturedFrame(image=image, timestamp=timestamp, sequence=sequence, jpeg=jpeg, scale=scale)
+
+    def _pace(self) -> None:
+        """หน่วงเวลาให้ได้อัตรา fps (สำหรับแหล่งภาพที่ไม่ใช่กล้อง)"""
+        if not self.realtime or self.fps <= 0:
+            return
+        now = time.monotonic()
+        if self._next_due > now:
+            time.sleep(self._next_due - now)
+        self._next_due = max(self._next_due, now) + 1.0 / self.fps
+
+
+# ===================== OpenCV VideoCapture =====================
+
+class OpenCVSource(FrameSource):
+    """
+    cv2.VideoCapture ลอง backend ตามลำดับ (V4L2 → ANY → default)
+    raw_mjpeg=True ปิดการแปลงสีของ OpenCV เพื่อรับ JPEG ดิบของกล้อง แล้ว decode เอง
+    """
+    name = "opencv"
+
+    def __init__(self, index: int = 0, width: int = 640, height: int = 480, fps: float = 30.0,
+                 raw_mjpeg: bool = False, decode_scale: int = 1):
+        super().__init__(fps=fps, decode_scale=decode_scale)
+        self.raw_mjpeg = raw_mjpeg
+        self.index = index
+        self.width = width
+        self.height = height
+        self.cap = None
+
+    def open(self) -> bool:
+        backends = [cv2.CAP_V4L2, cv2.CAP_ANY, None]
+        for backend in backends:
+            cap = cv2.VideoCapture(self.index) if backend is None else cv2.VideoCapture(self.index, backend)
+            if cap.isOpened():
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+                cap.set(cv2.CAP_PROP_FPS, self.fps)
+                buffer_prop = getattr(cv2, 'CAP_PROP_BUFFERSIZE', None)
+                if buffer_prop is not None:
+                    cap.set(buffer_prop, 1)
+                try:
+                    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                except Exception:
+                    logger.debug('Camera MJPG fourcc not supported, using default')
+                if self.raw_mjpeg:
+                    cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+                self.cap = cap
+                return True
+            cap.release()
+        return False
+
+    def read(self) -> Optional[CapturedFrame]:
+        ok, image = self.cap.read()
+        if not ok:
+            return None
+        timestamp = time.monotonic()
+        # backend V4L2 คืน buffer MJPEG ดิบเป็น array 1 แถวเมื่อปิด CONVERT_RGB
+        if self.raw_mjpeg and image is not None and (image.ndim == 1 or image.shape[0] == 1):
+            jpeg = image.tobytes()
+            return self._frame(decode_jpeg(jpeg, self.decode_scale), timestamp, jpeg=jpeg)
+        return self._frame(image, timestamp)
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+# ===================== V4L2 mmap =====================
+
+def _fourcc(code: str) -> int:
+    return ord(code[0]) | (ord(code[1]) << 8) | (ord(code[2]) << 16) | (ord(code[3]) << 24)
+
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_ANY = 0
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_BUF_FLAG_TIMESTAMP_MASK = 0x0000e000
+V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC = 0x00002000
+V4L2_PIX_FMT_MJPEG = _fourcc('MJPG')
+V4L2_PIX_FMT_YUYV = _fourcc('YUYV')
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ('driver', ctypes.c_uint8 * 16),
+        ('card', ctypes.c_uint8 * 32),
+        ('bus_info', ctypes.c_uint8 * 32),
+        ('version', ctypes.c_uint32),
+        ('capabilities', ctypes.c_uint32),
+        ('device_caps', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+        ('pixelformat', ctypes.c_uint32),
+        ('field', ctypes.c_uint32),
+        ('bytesperline', ctypes.c_uint32),
+        ('sizeimage', ctypes.c_uint32),
+        ('colorspace', ctypes.c_uint32),
+        ('priv', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('ycbcr_enc', ctypes.c_uint32),
+        ('quantization', ctypes.c_uint32),
+        ('xfer_func', ctypes.c_uint32),
+    ]
+
+
+class _v4l2_format_union(ctypes.Union):
+    # v4l2_window ใน union มี pointer จึงต้อง align ตามขนาด pointer
+    _fields_ = [('pix', v4l2_pix_format), ('raw_data', ctypes.c_uint8 * 200), ('_align', ctypes.c_void_p)]
+
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('fmt', _v4l2_format_union)]
+
+
+class v4l2_fract(ctypes.Structure):
+    _fields_ = [('numerator', ctypes.c_uint32), ('denominator', ctypes.c_uint32)]
+
+
+class v4l2_captureparm(ctypes.Structure):
+    _fields_ = [
+        ('capability', ctypes.c_uint32),
+        ('capturemode', ctypes.c_uint32),
+        ('timeperframe', v4l2_fract),
+        ('extendedmode', ctypes.c_uint32),
+        ('readbuffers', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 4),
+    ]
+
+
+class _v4l2_streamparm_union(ctypes.Union):
+    _fields_ = [('capture', v4l2_captureparm), ('raw_data', ctypes.c_uint8 * 200)]
+
+
+class v4l2_streamparm(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('parm', _v4l2_streamparm_union)]
+
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [
+        ('count', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('memory', ctypes.c_uint32),
+        ('capabilities', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 1),
+    ]
+
+
+class timeval(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_usec', ctypes.c_long)]
+
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('frames', ctypes.c_uint8),
+        ('seconds', ctypes.c_uint8),
+        ('minutes', ctypes.c_uint8),
+        ('hours', ctypes.c_uint8),
+        ('userbits', ctypes.c_uint8 * 4),
+    ]
+
+
+class _v4l2_buffer_m(ctypes.Union):
+    _fields_ = [
+        ('offset', ctypes.c_uint32),
+        ('userptr', ctypes.c_ulong),
+        ('planes', ctypes.c_void_p),
+        ('fd', ctypes.c_int32),
+    ]
+
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [
+        ('index', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('bytesused', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('field', ctypes.c_uint32),
+        ('timestamp', timeval),
+        ('timecode', v4l2_timecode),
+        ('sequence', ctypes.c_uint32),
+        ('memory', ctypes.c_uint32),
+        ('m', _v4l2_buffer_m),
+        ('length', ctypes.c_uint32),
+        ('reserved2', ctypes.c_uint32),
+        ('request_fd', ctypes.c_int32),
+    ]
+
+
+def _ioc(direction: int, nr: int, struct_type) -> int:
+    return (direction << 30) | (ctypes.sizeof(struct_type) << 16) | (ord('V') << 8) | nr
+
+
+_IOC_WRITE = 1
+_IOC_READ = 2
+VIDIOC_QUERYCAP = _ioc(_IOC_READ, 0, v4l2_capability)
+VIDIOC_S_FMT = _ioc(_IOC_READ | _IOC_WRITE, 5, v4l2_format)
+VIDIOC_REQBUFS = _ioc(_IOC_READ | _IOC_WRITE, 8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _ioc(_IOC_READ | _IOC_WRITE, 9, v4l2_buffer)
+VIDIOC_QBUF = _ioc(_IOC_READ | _IOC_WRITE, 15, v4l2_buffer)
+VIDIOC_DQBUF = _ioc(_IOC_READ | _IOC_WRITE, 17, v4l2_buffer)
+VIDIOC_STREAMON = _ioc(_IOC_WRITE, 18, ctypes.c_int)
+VIDIOC_STREAMOFF = _ioc(_IOC_WRITE, 19, ctypes.c_int)
+VIDIOC_S_PARM = _ioc(_IOC_READ | _IOC_WRITE, 22, v4l2_streamparm)
+
+
+class V4L2MmapSource(FrameSource):
+    """
+    อ่านกล้อง USB ผ่าน V4L2 โดยตรงด้วย mmap buffers (ไม่ผ่าน OpenCV)
+    ได้ timestamp และ sequence จาก kernel และได้ JPEG ดิบของกล้องเมื่อใช้ MJPEG
+    ทุกครั้งที่อ่านจะดึง buffer ที่ค้างอยู่ออกให้หมดแล้วใช้เฟรมล่าสุด
+    """
+    name = "v4l2"
+
+    def __init__(
+        self,
+        device: str = '/dev/video0',
+        width: int = 640,
+        height: int = 480,
+        fps: float = 30.0,
+        pixel_format: str = 'MJPG',
+        buffer_count: int = 4,
+        decode: bool = True,
+        timeout: float = 1.0,
+        decode_scale: int = 1,
+    ):
+        super().__init__(fps=fps, decode_scale=decode_scale)
+        self.device = device
+        self.width = width
+        self.height = height
+        self.pixel_format = _fourcc(pixel_format)
+        self.buffer_count = buffer_count
+        self.decode = decode
+        self.timeout = timeout
+        self.fd: Optional[int] = None
+        self._buffers: List[mmap.mmap] = []
+
+    def open(self) -> bool:
+        try:
+            self.fd = os.open(self.device, os.O_RDWR | os.O_NONBLOCK)
+            cap = v4l2_capability()
+            fcntl.ioctl(self.fd, VIDIOC_QUERYCAP, cap)
+            caps = cap.device_caps or cap.capabilities
+            if not (caps & V4L2_CAP_VIDEO_CAPTURE and caps & V4L2_CAP_STREAMING):
+                raise OSError(f"{self.device} does not support streaming capture")
+
+            fmt = v4l2_format()
+            fmt.type = V4L2_BUF_TYPE_VIDEO_CAPTURE
+            fmt.fmt.pix.width = self.width
+            fmt.fmt.pix.height = self.height
+            fmt.fmt.pix.pixelformat = self.pixel_format
+            fmt.fmt.pix.field = V4L2_FIELD_ANY
+            fcntl.ioctl(self.fd, VIDIOC_S_FMT, fmt)
+            # driver อาจเลือกขนาด/format ที่ใกล้เคียงที่สุดแทน
+            self.width = fmt.fmt.pix.width
+            self.height = fmt.fmt.pix.height
+            self.pixel_format = fmt.fmt.pix.pixelformat
+            if self.pixel_format not in (V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV):
+                raise OSError(f"Unsupported pixel format 0x{self.pixel_format:08x}")
+
+            parm = v4l2_streamparm()
+            parm.type = V4L2_BUF_TYPE_VIDEO_CAPTURE
+            parm.parm.capture.timeperframe.numerator = 1
+            parm.parm.capture.timeperframe.denominator = int(self.fps)
+            try:
+                fcntl.ioctl(self.fd, VIDIOC_S_PARM, parm)
+            except OSError:
+                logger.debug("VIDIOC_S_PARM not supported, using driver frame rate")
+
+            req = v4l2_requestbuffers()
+            req.count = self.buffer_count
+            req.type = V4L2_BUF_TYPE_VIDEO_CAPTURE
+            req.memory = V4L2_MEMORY_MMAP
+            fcntl.ioctl(self.fd, VIDIOC_REQBUFS, req)
+
+            for index in range(req.count):
+                buf = self._new_buffer(index)
+                fcntl.ioctl(self.fd, VIDIOC_QUERYBUF, buf)
+                self._buffers.append(
+                    mmap.mmap(self.fd, buf.length, mmap.MAP_SHARED,
+                              mmap.PROT_READ | mmap.PROT_WRITE, offset=buf.m.offset)
+                )
+                fcntl.ioctl(self.fd, VIDIOC_QBUF, buf)
+
+            fcntl.ioctl(self.fd, VIDIOC_STREAMON, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            logger.info("V4L2 %s streaming %dx%d with %d mmap buffers",
+                        self.device, self.width, self.height, len(self._buffers))
+            return True
+        except OSError as e:
+            logger.error(f"V4L2 open failed ({self.device}): {e}")
+            self.release()
+            return False
+
+    @staticmethod
+    def _new_buffer(index: int = 0) -> v4l2_buffer:
+        buf = v4l2_buffer()
+        buf.index = index
+        buf.type = V4L2_BUF_TYPE_VIDEO_CAPTURE
+        buf.memory = V4L2_MEMORY_MMAP
+        return buf
+
+    def _dequeue(self) -> Optional[v4l2_buffer]:
+        buf = self._new_buffer()
+        try:
+            fcntl.ioctl(self.fd, VIDIOC_DQBUF, buf)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return None
+            raise
+        return buf
+
+    def read(self) -> Optional[CapturedFrame]:
+        if self.fd is None:
+            return None
+        try:
+            ready, _, _ = select.select([self.fd], [], [], self.timeout)
+            if not ready:
+                return None
+
+            latest = self._dequeue()
+            if latest is None:
+                return None
+            # ดึงเฟรมที่ค้างอยู่ออกให้หมด ใช้เฉพาะเฟรมใหม่สุด
+            while True:
+                newer = self._dequeue()
+                if newer is None:
+                    break
+                fcntl.ioctl(self.fd, VIDIOC_QBUF, latest)
+                latest = newer
+
+            data = self._buffers[latest.index][:latest.bytesused]
+            fcntl.ioctl(self.fd, VIDIOC_QBUF, latest)
+        except OSError as e:
+            logger.warning(f"V4L2 read failed: {e}")
+            return None
+
+        if latest.flags & V4L2_BUF_FLAG_TIMESTAMP_MASK == V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC:
+            timestamp = latest.timestamp.tv_sec + latest.timestamp.tv_usec / 1e6
+        else:
+            timestamp = time.monotonic()
+
+        jpeg = data if self.pixel_format == V4L2_PIX_FMT_MJPEG else None
+        image = self._decode(data) if self.decode else None
+        return self._frame(image, timestamp, jpeg=jpeg, sequence=latest.sequence)
+
+    def _decode(self, data: bytes) -> Optional[np.ndarray]:
+        if self.pixel_format == V4L2_PIX_FMT_MJPEG:
+            return decode_jpeg(data, self.decode_scale)
+        raw = np.frombuffer(data, dtype=np.uint8)
+        return cv2.cvtColor(raw.reshape(self.height, self.width, 2), cv2.COLOR_YUV2BGR_YUYV)
+
+    def release(self) -> None:
+        if self.fd is None:
+            return
+        try:
+            fcntl.ioctl(self.fd, VIDIOC_STREAMOFF, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+        except OSError:
+            pass
+        for buffer in self._buffers:
+            buffer.close()
+        self._buffers = []
+        os.close(self.fd)
+        self.fd = None
+
+
+# ===================== GStreamer (hardware MJPEG decode) =====================
+
+class GStreamerSource(FrameSource):
+    """
+    เปิดกล้องผ่าน GStreamer pipeline ของ OpenCV เพื่อใช้ตัว decode MJPEG แบบ hardware
+    (v4l2jpegdec บน Raspberry Pi) ต้องใช้ OpenCV ที่ build พร้อม GStreamer
+    """
+    name = "gstreamer"
+
+    def __init__(
+        self,
+        device: str = '/dev/video0',
+        width: int = 640,
+        height: int = 480,
+        fps: float = 30.0,
+        decoder: str = 'v4l2jpegdec',
+        pipeline: Optional[str] = None,
+    ):
+        super().__init__(fps=fps)
+        self.pipeline = pipeline or (
+            f"v4l2src device={device} io-mode=mmap ! "
+            f"image/jpeg,width={width},height={height},framerate={int(fps)}/1 ! "
+            f"{decoder} ! videoconvert ! video/x-raw,format=BGR ! "
+            "appsink drop=true max-buffers=1 sync=false"
+        )
+        self.cap = None
+
+    def open(self) -> bool:
+        cap = cv2.VideoCapture(self.pipeline, cv2.CAP_GSTREAMER)
+        if not cap.isOpened():
+            logger.error(f"GStreamer pipeline failed: {self.pipeline}")
+            cap.release()
+            return False
+        self.cap = cap
+        return True
+
+    def read(self) -> Optional[CapturedFrame]:
+        ok, image = self.cap.read()
+        if not ok:
+            return None
+        return self._frame(image, time.monotonic())
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+# ===================== File / image directory =====================
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FileSource(FrameSource):
+    """อ่านจากไฟล์วิดีโอหรือ directory ของภาพ (เรียงตามชื่อไฟล์) วนซ้ำได้"""
+    name = "file"
+
+    def __init__(self, path: str, fps: float = 30.0, loop: bool = True, realtime: bool = True,
+                 decode_scale: int = 1):
+        super().__init__(fps=fps, realtime=realtime, decode_scale=decode_scale)
+        self.path = path
+        self.loop = loop
+        self.cap = None
+        self._images: List[str] = []
+        self._position = 0
+
+    def open(self) -> bool:
+        if os.path.isdir(self.path):
+            self._images = sorted(
+                p for p in glob.glob(os.path.join(self.path, '*'))
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            self._position = 0
+            if not self._images:
+                logger.error(f"No images found in {self.path}")
+                return False
+            return True
+
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            logger.error(f"Cannot open video file {self.path}")
+            return False
+        file_fps = cap.get(cv2.CAP_PROP_FPS)
+        if file_fps and file_fps > 0:
+            self.fps = file_fps
+        self.cap = cap
+        return True
+
+    def read(self) -> Optional[CapturedFrame]:
+        self._pace()
+        if self._images:
+            if self._position >= len(self._images):
+                if not self.loop:
+                    return None
+                self._position = 0
+            path = self._images[self._position]
+            self._position += 1
+            with open(path, 'rb') as f:
+                data = f.read()
+            jpeg = data if path.lower().endswith(('.jpg', '.jpeg')) else None
+            image = decode_jpeg(data, self.decode_scale if jpeg is not None else 1)
+            if image is None:
+                return None
+            return self._frame(image, time.monotonic(), jpeg=jpeg)
+
+        if self.cap is None:
+            return None
+        ok, image = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self.cap.read()
+        if not ok:
+            return None
+        return self._frame(image, time.monotonic())
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+# ===================== Synthetic =====================
+
+class SyntheticSource(FrameSource):
+    """สร้างภาพทดสอบ (สี่เหลี่ยมเคลื่อนที่ + เลขเฟรม) สำหรับรันแบบ headless"""
+    name = "synthetic"
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30.0, realtime: bool = True):
+        super().__init__(fps=fps, realtime=realtime)
+        self.width = width
+        self.height = height
+        self._background = None
+
+    def open(self) -> bool:
+        gradient = np.linspace(40, 200, self.width, dtype=np.uint8)
+        self._background = np.repeat(np.tile(gradient, (self.height, 1))[:, :, np.newaxis], 3, axis=2)
+        return True
+
+    def read(self) -> Optional[CapturedFrame]:
+        if self._background is None:
+            return None
+        self._pace()
+        n = self._sequence + 1
+        image = self._background.copy()
+        size = max(self.height // 6, 8)
+        x = (n * 7) % max(self.width - size, 1)
+        y = (self.height - size) // 2
+        cv2.rectangle(image, (x, y), (x + size, y + size), (0, 160, 255), -1)
+        cv2.putText(image, str(n), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        return self._frame(image, time.monotonic())
+
+
+# ===================== Factory =====================
+
+SOURCE_TYPES = {
+    OpenCVSource.name: OpenCVSource,
+    V4L2MmapSource.name: V4L2MmapSource,
+    GStreamerSource.name: GStreamerSource,
+    FileSource.name: FileSource,
+    SyntheticSource.name: SyntheticSource,
+}
+
+
+def create_frame_source(kind: str, **options) -> FrameSource:
+    """สร้าง FrameSource ตามชื่อ (opencv / v4l2 / gstreamer / file / synthetic)"""
+    try:
+        source_type = SOURCE_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown frame source '{kind}' (choose from {', '.join(SOURCE_TYPES)})")
+    return source_type(**options)
@@ -0,0 +1,280 @@
+# inference_pool.py - รัน MediaPipe Hands หลายโปรเซสเพื่อใช้ทุก core ของ RPi
+"""
+แต่ละ worker process มี MediaPipe Hands ของตัวเองและ ring ของช่องเฟรมใน shared memory
+โปรเซสหลักคัดลอกเฟรมลงช่องว่างแล้วส่งแค่ (seq, slot, shape) ผ่านคิว จึงไม่ต้อง pickle ภาพ
+ผลลัพธ์ (landmarks เป็น array เล็กๆ) ถูกเรียงตาม seq ก่อนคืนให้ผู้เรียก:
+
+    pool = InferencePool(processes=3, model_options=HAND_MODEL_OPTIONS)
+    pool.submit(frame, payload)          # False ถ้าทุกช่องเต็ม (เฟรมถูกทิ้ง)
+    payload, hands = pool.get(timeout)   # hands: list ของ array (21, 3) หรือ None
+    pool.close()
+"""
+import logging
+import multiprocessing as mp_proc
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFrameRing:
+    """ช่องเก็บเฟรม BGR ขนาดคงที่ใน shared memory; ฝั่ง worker เปิดด้วยชื่อเดิม"""
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+        else:
+            # worker ที่ spawn ใช้ resource_tracker ตัวเดียวกับโปรเซสหลัก ซึ่งเป็นผู้ unlink
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def view(self, slot: int, shape) -> np.ndarray:
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot: int, image: np.ndarray) -> None:
+        self.view(slot, image.shape)[...] = image
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(index: int, ring_name: str, slots: int, slot_bytes: int,
+                 tasks, results, model_options: Dict[str, object]) -> None:
+    """entry ของ worker process: รับ (seq, slot, shape) แล้วส่ง (seq, index, slot, hands) กลับ"""
+    import mediapipe as mp
+
+    ring = SharedFrameRing(slots, slot_bytes, name=ring_name)
+    hands = mp.solutions.hands.Hands(**model_options)
+    results.put(("ready", index))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, shape = task
+            found = None
+            try:
+                rgb = cv2.cvtColor(ring.view(slot, shape), cv2.COLOR_BGR2RGB)
+                output = hands.process(rgb)
+                if output.multi_hand_landmarks:
+                    found = [
+                        np.array([(p.x, p.y, p.z) for p in hand.landmark], dtype=np.float32)
+                        for hand in output.multi_hand_landmarks
+                    ]
+            except Exception as exc:
+                logger.error(f"Inference worker {index} failed on frame {seq}: {exc}")
+            results.put((seq, index, slot, found))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hands.close()
+        ring.close()
+
+
+class InferencePool:
+    """
+    กลุ่ม worker process สำหรับ MediaPipe Hands
+    - worker แต่ละตัวมี SharedFrameRing ของตัวเอง slots_per_worker ช่อง
+    - submit() ไม่บล็อก: ถ้าไม่มีช่องว่างคืน False (นับใน dropped)
+    - get() คืนผลตามลำดับที่ submit เสมอ ผลที่ค้างนานเกิน result_timeout ถูกข้าม (นับใน lost)
+      โดยเริ่มนับเวลาหลังทุก worker โหลด model เสร็จแล้ว
+    """
+
+    def __init__(self, processes: int, slots_per_worker: int = 2,
+                 model_options: Optional[Dict[str, object]] = None, result_timeout: float = 2.0):
+        self.processes = max(1, processes)
+        self.slots_per_worker = max(1, slots_per_worker)
+        self.model_options = dict(model_options or {})
+        self.result_timeout = result_timeout
+        self._ctx = mp_proc.get_context('spawn')  # ไม่ fork โปรเซสที่มีเธรดและ MediaPipe อยู่แล้ว
+        self._lock = threading.Lock()
+        self._workers = []
+        self._rings: List[SharedFrameRing] = []
+        self._tasks = []
+        self._results = None
+        self._free: List[deque] = []
+        self._alive: List[bool] = []
+        self._ready = 0
+        self._slot_bytes = 0
+        self._next_seq = 0
+        self._next_worker = 0
+        self._order: deque = deque()              # seq ตามลำดับ submit
+        self._pending: Dict[int, Tuple[float, object]] = {}   # seq -> (เวลา submit, payload)
+        self._done: Dict[int, Tuple[object, Optional[list]]] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.lost = 0
+        self.reordered = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, frame_shape) -> None:
+        """สร้าง shared memory และ worker process (ขนาดช่องตามเฟรมแรก)"""
+        self._slot_bytes = int(np.prod(frame_shape))
+        self._results = self._ctx.Queue()
+        for index in range(self.processes):
+            ring = SharedFrameRing(self.slots_per_worker, self._slot_bytes)
+            tasks = self._ctx.Queue()
+            worker = self._ctx.Process(
+                target=_worker_main,
+                args=(index, ring.name, self.slots_per_worker, self._slot_bytes,
+                      tasks, self._results, self.model_options),
+                name=f"thumb-infer-proc-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._rings.append(ring)
+            self._tasks.append(tasks)
+            self._workers.append(worker)
+            self._free.append(deque(range(self.slots_per_worker)))
+            self._alive.append(True)
+        logger.info("Inference pool started: %d processes x %d slots (%d KB/slot)",
+                    self.processes, self.slots_per_worker, self._slot_bytes // 1024)
+
+    def submit(self, image: np.ndarray, payload) -> bool:
+        """คัดลอกเฟรมลงช่องว่างของ worker ถัดไปแล้วส่งงาน คืน False ถ้าไม่มีช่องว่าง"""
+        if not self.started:
+            self.start(image.shape)
+        if image.nbytes > self._slot_bytes or image.dtype != np.uint8:
+            logger.warning("Frame %s does not fit the inference pool slots", image.shape)
+            self.dropped += 1
+            return False
+
+        with self._lock:
+            for offset in range(self.processes):
+                index = (self._next_worker + offset) % self.processes
+                if self._alive[index] and self._free[index]:
+                    slot = self._free[index].popleft()
+                    break
+            else:
+                self.dropped += 1
+                return False
+            self._next_worker = (index + 1) % self.processes
+            seq = self._next_seq
+            self._next_seq += 1
+            self._order.append(seq)
+            self._pending[seq] = (time.monotonic(), payload)
+            self.submitted += 1
+
+        self._rings[index].write(slot, image)
+        self._tasks[index].put((seq, slot, image.shape))
+        return True
+
+    def submit_marker(self, payload) -> None:
+        """แทรก payload ที่ไม่มีเฟรมเข้าลำดับผลลัพธ์ (เช่นสัญญาณรีเซ็ตสถานะ)"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._order.append(seq)
+            self._done[seq] = (payload, None)
+
+    def get(self, timeout: float = 0.5):
+        """คืน (payload, hands) ถัดไปตามลำดับ หรือ None ถ้ายังไม่มีผลภายใน timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            ready = self._pop_ready()
+            if ready is not None:
+                return ready
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._results is None:
+                if self._results is None:
+                    time.sleep(max(0.0, min(remaining, 0.05)))
+                return None
+            try:
+                message = self._results.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message[0] == "ready":
+                logger.debug("Inference worker %s ready", message[1])
+                self._mark_ready()
+                continue
+            self._complete(*message)
+
+    def _mark_ready(self) -> None:
+        with self._lock:
+            self._ready += 1
+            if self._ready >= sum(self._alive):
+                # งานที่ส่งระหว่างโหลด model เริ่มนับเวลาใหม่ตั้งแต่ตอนนี้
+                now = time.monotonic()
+                self._pending = {seq: (now, payload) for seq, (_, payload) in self._pending.items()}
+
+    def _complete(self, seq: int, index: int, slot: int, hands) -> None:
+        with self._lock:
+            self._free[index].append(slot)
+            entry = self._pending.pop(seq, None)
+            if entry is None:
+                return  # ถูกข้ามไปแล้วเพราะรอนานเกิน
+            if self._order and self._order[0] != seq:
+                self.reordered += 1
+            self._done[seq] = (entry[1], hands)
+
+    def _pop_ready(self):
+        with self._lock:
+            while self._order:
+                head = self._order[0]
+                if head in self._done:
+                    self._order.popleft()
+                    self.completed += 1
+                    return self._done.pop(head)
+                submitted_at = self._pending.get(head, (None,))[0]
+                if (submitted_at is not None and self._ready >= sum(self._alive)
+                        and time.monotonic() - submitted_at > self.result_timeout):
+                    self._order.popleft()
+                    self._pending.pop(head, None)
+                    self.lost += 1
+                    continue
+                return None
+            return None
+
+    def _check_workers(self) -> None:
+        for index, worker in enumerate(self._workers):
+            if self._alive[index] and not worker.is_alive():
+                logger.error("Inference worker %d exited (code %s)", index, worker.exitcode)
+                with self._lock:
+                    self._alive[index] = False
+                    self._free[index].clear()
+        if self._workers and not any(self._alive):
+            raise RuntimeError("All inference worker processes exited")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "lost": self.lost,
+            "reordered": self.reordered,
+        }
+
+    def close(self) -> None:
+        for index, tasks in enumerate(self._tasks):
+            if self._alive[index]:
+                tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=3.0)
+            if worker.is_alive():
+                worker.terminate()
+        for ring in self._rings:
+            ring.close()
+        self._workers = []
+        self._rings = []
+        self._tasks = []
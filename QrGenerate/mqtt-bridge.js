@@ -21,7 +21,8 @@ const topic = {
   thumb: `${SITE}/${DEVICE_ID}/ui/thumb`,
   armed: `${SITE}/${DEVICE_ID}/ui/armed`,
   cancel: `${SITE}/${DEVICE_ID}/ui/cancel`,
-  session: `${SITE}/${DEVICE_ID}/ui/session_status`
+  session: `${SITE}/${DEVICE_ID}/ui/session_status`,
+  landmarks: `${SITE}/${DEVICE_ID}/ui/landmarks`
 };
 
 const initialSession = () => ({
@@ -100,6 +101,10 @@ export function attachMqttBridge({ onToggleSensor, onEvent } = {}) {
       if (err) log('[mqtt] subscribe error:', err.message);
       else log('[mqtt] subscribed:', subscriptions.join(', '));
     });
+    // landmarks มาทุกเฟรมที่เห็นมือ: QoS 0 และไม่ log
+    client.subscribe(topic.landmarks, { qos: 0 }, (err) => {
+      if (err) log('[mqtt] subscribe error:', err.message);
+    });
   });
 
   client.on('reconnect', () => log('[mqtt] reconnect...'));
@@ -113,6 +118,11 @@ export function attachMqttBridge({ onToggleSensor, onEvent } = {}) {
       data = {};
     }
 
+    if (t === topic.landmarks) {
+      emit(topic.landmarks, data, { direction: 'inbound' });
+      return;
+    }
+
     if (t === topic.presence) {
       const present = Boolean(data.present ?? true);
       emit(topic.presence, { ...data, present }, { direction: 'inbound' });
@@ -59,7 +59,8 @@ app.get('/', (req, res) => {
 });
 
 // proxy camera stream so UI can stay on same origin/port
-app.get('/camera/stream', async (req, res) => {
+// /camera/stream/<gate> maps to /stream/<gate> when camera_thumb runs several cameras
+app.get(['/camera/stream', '/camera/stream/:gate'], async (req, res) => {
   const controller = new AbortController();
   req.on('close', () => controller.abort());
 
@@ -72,7 +73,9 @@ app.get('/camera/stream', async (req, res) => {
       res.socket.setNoDelay(true);
     }
 
-    const upstream = await fetch(CAMERA_STREAM_URL, {
+    const gatePath = req.params.gate ? `/${encodeURIComponent(req.params.gate)}` : '';
+    const query = req.originalUrl.includes('?') ? req.originalUrl.slice(req.originalUrl.indexOf('?')) : '';
+    const upstream = await fetch(`${CAMERA_STREAM_URL}${gatePath}${query}`, {
       signal: controller.signal,
       headers: { Accept: 'multipart/x-mixed-replace' }
     });
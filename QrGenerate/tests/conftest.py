@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# โมดูลของ QrGenerate เป็นไฟล์เดี่ยวในโฟลเดอร์หลัก (รันจากโฟลเดอร์นั้นเหมือน camera_thumb.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
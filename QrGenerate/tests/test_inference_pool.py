@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from camera_thumb import HAND_MODEL_OPTIONS
+from inference_pool import InferencePool
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(processes=2, slots_per_worker=2, model_options=HAND_MODEL_OPTIONS,
+                         result_timeout=30.0)
+    yield pool
+    pool.close()
+
+
+def blank(value: int) -> np.ndarray:
+    return np.full((120, 160, 3), value, dtype=np.uint8)
+
+
+def drain(pool, count: int):
+    results = []
+    while len(results) < count:
+        result = pool.get(timeout=60.0)
+        assert result is not None, f"only {len(results)} of {count} results arrived"
+        results.append(result)
+    return results
+
+
+def test_frames_beyond_free_slots_are_dropped_while_models_load(pool):
+    # worker ยังโหลด MediaPipe อยู่ จึงไม่มีช่องไหนว่างคืนมาระหว่าง submit
+    accepted = [pool.submit(blank(i), i) for i in range(6)]
+    assert accepted == [True] * 4 + [False] * 2
+    assert pool.stats()["dropped"] == 2
+
+    assert [payload for payload, _ in drain(pool, 4)] == [0, 1, 2, 3]
+    assert pool.stats()["completed"] == 4
+
+
+def test_results_come_back_in_submit_order(pool):
+    expected, results = [], []
+    for i in range(40):
+        if i % 10 == 5:
+            pool.submit_marker(("marker", i))
+            expected.append(("marker", i))
+        # รอผลเมื่อช่องเต็ม เพื่อให้ทุกเฟรมถูกรับและสองโปรเซสทำงานสลับกันจริง
+        while not pool.submit(blank(i), i):
+            results.extend(drain(pool, 1))
+        expected.append(i)
+    results.extend(drain(pool, len(expected) - len(results)))
+
+    assert [payload for payload, _ in results] == expected
+    assert all(hands is None for _, hands in results)
+    assert pool.stats()["lost"] == 0
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+from camera_thumb import MQTTPublisher
+
+
+class FakeClient:
+    """เก็บทุก publish ไว้ตามลำดับ (เรียกจากเธรดของ MQTTPublisher)"""
+
+    def __init__(self):
+        self.sent = []
+        self._cond = threading.Condition()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self._cond:
+            self.sent.append((topic, payload, qos, retain))
+            self._cond.notify_all()
+
+    def wait_for(self, count: int, timeout: float = 2.0) -> None:
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.sent) >= count, timeout=timeout)
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def payloads(client, topic):
+    return [payload for sent_topic, payload, _, _ in client.sent if sent_topic == topic]
+
+
+def test_burst_on_one_topic_sends_only_the_latest(client):
+    publisher = MQTTPublisher(client, interval_ms=10_000)
+    publisher.publish("thumb", 0, coalesce=True)
+    client.wait_for(1)
+    for progress in range(1, 10):
+        publisher.publish("thumb", progress, coalesce=True)
+    time.sleep(0.05)
+    assert payloads(client, "thumb") == [0]   # ยังไม่ถึง interval
+
+    publisher.close()
+    assert payloads(client, "thumb") == [0, 9]
+    assert publisher.stats()["coalesced"] == 8
+
+
+def test_coalesced_topic_is_rate_limited(client):
+    publisher = MQTTPublisher(client, interval_ms=100)
+    start = time.monotonic()
+    while time.monotonic() - start < 0.5:
+        publisher.publish("landmarks", time.monotonic(), coalesce=True)
+        time.sleep(0.002)
+    publisher.close()
+    sent = payloads(client, "landmarks")
+    assert 4 <= len(sent) <= 8
+    assert publisher.stats()["published"] == len(sent)
+
+
+def test_urgent_message_replaces_pending_progress(client):
+    publisher = MQTTPublisher(client, interval_ms=10_000)
+    publisher.publish("thumb", "progress-0", coalesce=True)
+    client.wait_for(1)
+    publisher.publish("thumb", "progress-1", coalesce=True)
+    publisher.publish("thumb", "hold_complete", qos=1)
+    publisher.publish("session", "ended", qos=1, retain=True)
+    client.wait_for(3)
+    publisher.close()
+
+    assert client.sent == [
+        ("thumb", "progress-0", 0, False),
+        ("thumb", "hold_complete", 1, False),
+        ("session", "ended", 1, True),
+    ]
+    assert publisher.stats()["coalesced"] == 1
+
+
+def test_topics_are_coalesced_independently(client):
+    publisher = MQTTPublisher(client, interval_ms=10_000)
+    publisher.publish("thumb", 1, coalesce=True)
+    publisher.publish("landmarks", "a", coalesce=True)
+    client.wait_for(2)
+    publisher.publish("thumb", 2, coalesce=True)
+    publisher.publish("landmarks", "b", coalesce=True)
+    publisher.close()
+
+    assert payloads(client, "thumb") == [1, 2]
+    assert payloads(client, "landmarks") == ["a", "b"]
+    assert publisher.stats()["coalesced"] == 0
+
+
+def test_publish_error_does_not_stop_the_thread(client):
+    calls = []
+
+    def flaky_publish(topic, payload, qos=0, retain=False):
+        calls.append(payload)
+        if payload == "boom":
+            raise RuntimeError("broker gone")
+        FakeClient.publish(client, topic, payload, qos, retain)
+
+    client.publish = flaky_publish
+    publisher = MQTTPublisher(client, interval_ms=10)
+    publisher.publish("session", "boom")
+    publisher.publish("session", "after")
+    client.wait_for(1)
+    publisher.close()
+    assert calls == ["boom", "after"]
+    assert payloads(client, "session") == ["after"]
@@ -0,0 +1,158 @@
+import socket
+import threading
+import time
+
+import pytest
+from camera_thumb import (
+    STREAM_JPEG_QUALITY,
+    STREAM_RESPONSE_HEADERS,
+    AsyncStreamServer,
+    FrameBuffer,
+    StreamVariant,
+    frame_chunk,
+    parse_stream_variants,
+)
+
+
+@pytest.fixture
+def frame_buffer():
+    return FrameBuffer(parse_stream_variants('low:50:320'))
+
+
+def test_parse_stream_variants_always_has_default():
+    variants = parse_stream_variants(' low:50:320 , mid:70 ,bad:x, ')
+    assert variants['default'] == StreamVariant('default', STREAM_JPEG_QUALITY)
+    assert variants['low'] == StreamVariant('low', 50, 320)
+    assert variants['mid'] == StreamVariant('mid', 70, None)
+    assert 'bad' not in variants
+
+
+def test_frame_chunk_is_one_multipart_part():
+    chunk = frame_chunk(b'JPEGDATA')
+    assert bytes(chunk) == (
+        b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: 8\r\n\r\nJPEGDATA\r\n'
+    )
+
+
+def test_unknown_variant_subscribes_to_default(frame_buffer):
+    assert frame_buffer.acquire('huge').name == 'default'
+    assert [v.name for v in frame_buffer.active_variants()] == ['default']
+    assert frame_buffer.has_subscribers()
+
+
+def test_variants_share_one_sequence(frame_buffer):
+    frame_buffer.acquire('default')
+    frame_buffer.acquire('low')
+    frame_buffer.update_variants({'default': b'full', 'low': b'small'})
+
+    chunk, seq = frame_buffer.wait_for_frame(-1, timeout=0.1)
+    low, low_seq = frame_buffer.wait_for_frame(-1, timeout=0.1, variant='low')
+    assert bytes(chunk) == bytes(frame_chunk(b'full'))
+    assert bytes(low) == bytes(frame_chunk(b'small'))
+    assert seq == low_seq == 1
+
+
+def test_wait_for_frame_wakes_on_update(frame_buffer):
+    frame_buffer.acquire('default')
+    timer = threading.Timer(0.05, frame_buffer.update, args=(b'next',))
+    timer.start()
+    chunk, seq = frame_buffer.wait_for_frame(0, timeout=2.0)
+    timer.join()
+    assert bytes(chunk) == bytes(frame_chunk(b'next'))
+    assert seq == 1
+    assert frame_buffer.wait_for_frame(seq, timeout=0.05) == (None, seq)
+
+
+def test_last_release_drops_cached_chunk(frame_buffer):
+    frame_buffer.acquire('low')
+    frame_buffer.acquire('low')
+    frame_buffer.update(b'small', variant='low')
+
+    frame_buffer.release('low')
+    assert frame_buffer.wait_for_frame(-1, timeout=0.01, variant='low')[0] is not None
+    frame_buffer.release('low')
+    assert not frame_buffer.has_subscribers()
+    assert frame_buffer.wait_for_frame(-1, timeout=0.01, variant='low')[0] is None
+
+
+def read_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        part = sock.recv(size - len(data))
+        if not part:
+            break
+        data += part
+    return data
+
+
+@pytest.fixture
+def stream_server(frame_buffer):
+    server = AsyncStreamServer(frame_buffer, host='127.0.0.1', port=0)
+    server.start()
+    yield server, server._server.sockets[0].getsockname()[1]
+    server.shutdown()
+
+
+def open_stream(port: int, path: str) -> socket.socket:
+    sock = socket.create_connection(('127.0.0.1', port), timeout=3.0)
+    sock.sendall(b'GET %s HTTP/1.0\r\n\r\n' % path.encode())
+    return sock
+
+
+def wait_for_clients(server, count: int) -> None:
+    deadline = time.monotonic() + 3.0
+    while server.client_count() != count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.client_count() == count
+
+
+def test_stream_fans_out_each_variant(stream_server, frame_buffer):
+    server, port = stream_server
+    clients = [open_stream(port, '/stream'), open_stream(port, '/stream'),
+               open_stream(port, '/stream?variant=low')]
+    expected = [STREAM_RESPONSE_HEADERS + bytes(frame_chunk(jpeg))
+                for jpeg in (b'full-1', b'full-1', b'small-1')]
+    try:
+        wait_for_clients(server, 3)
+        frame_buffer.update_variants({'default': b'full-1', 'low': b'small-1'})
+        received = [read_exact(sock, len(want)) for sock, want in zip(clients, expected)]
+    finally:
+        for sock in clients:
+            sock.close()
+    assert received == expected
+
+
+def test_new_client_gets_latest_frame_immediately(stream_server, frame_buffer):
+    server, port = stream_server
+    expected = STREAM_RESPONSE_HEADERS + bytes(frame_chunk(b'cached'))
+    first = open_stream(port, '/stream')
+    second = None
+    try:
+        wait_for_clients(server, 1)
+        frame_buffer.update(b'cached')
+        assert read_exact(first, len(expected)) == expected
+        second = open_stream(port, '/stream')
+        assert read_exact(second, len(expected)) == expected
+    finally:
+        first.close()
+        if second is not None:
+            second.close()
+
+
+def test_unknown_path_is_404(stream_server):
+    _, port = stream_server
+    sock = open_stream(port, '/nope')
+    try:
+        assert read_exact(sock, 64).startswith(b'HTTP/1.0 404 Not Found')
+    finally:
+        sock.close()
+
+
+def test_disconnect_releases_variant(stream_server, frame_buffer):
+    server, port = stream_server
+    sock = open_stream(port, '/stream?variant=low')
+    wait_for_clients(server, 1)
+    assert [v.name for v in frame_buffer.active_variants()] == ['low']
+    sock.close()
+    wait_for_clients(server, 0)
+    assert not frame_buffer.has_subscribers()
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from camera_thumb import ThumbsUpRule, array_to_landmarks
+
+
+def per_hand_rule(rule: ThumbsUpRule, lm: np.ndarray, h: int, w: int) -> bool:
+    """กฎเดิมแบบทีละมือ (ก่อน vectorize) ใช้เป็นคำตอบอ้างอิง"""
+    y_vals = [float(y) * h for y in lm[:, 1]]
+    x_vals = [float(x) * w for x in lm[:, 0]]
+    hand_span = max(max(y_vals) - min(y_vals), 1.0)
+    lift_margin = max(rule.lift_margin_px, hand_span * 0.12)
+    curl_margin = max(rule.curl_margin_px, hand_span * 0.08)
+
+    thumb_tip_y = y_vals[4]
+    thumb_up = (
+        thumb_tip_y + lift_margin * 0.4 < y_vals[3] and
+        thumb_tip_y + lift_margin * 0.6 < y_vals[2] and
+        thumb_tip_y + lift_margin < y_vals[0]
+    )
+    thumb_vertical = abs(thumb_tip_y - y_vals[3]) > abs(x_vals[4] - x_vals[3]) * 0.5
+    curled_count = sum(
+        1 for tip, pip, mcp in ((8, 6, 5), (12, 10, 9), (16, 14, 13), (20, 18, 17))
+        if y_vals[tip] > min(y_vals[pip], y_vals[mcp]) + curl_margin * 0.6
+    )
+    index_suppressed = y_vals[8] > thumb_tip_y + curl_margin * 0.6
+    others_curled = curled_count >= 3 or (curled_count >= 2 and index_suppressed)
+    return bool(thumb_up and thumb_vertical and others_curled)
+
+
+def thumbs_up_hand(rng) -> np.ndarray:
+    """มือชูนิ้วโป้ง (นิ้วโป้งชี้ขึ้น นิ้วอื่นงอลงใต้ข้อ) + noise"""
+    lm = np.zeros((21, 3), dtype=np.float32)
+    lm[:, 0] = 0.5
+    lm[0, 1] = 0.80                                   # wrist
+    lm[1:5, 1] = (0.70, 0.60, 0.50, 0.40)             # thumb cmc → tip ขึ้นด้านบน
+    lm[1:5, 0] = (0.48, 0.47, 0.47, 0.47)
+    for tip, pip, mcp in ((8, 6, 5), (12, 10, 9), (16, 14, 13), (20, 18, 17)):
+        lm[mcp, 1], lm[pip, 1], lm[tip, 1] = 0.62, 0.66, 0.74
+    return lm + rng.normal(0, 0.02, lm.shape).astype(np.float32)
+
+
+@pytest.fixture
+def hands():
+    rng = np.random.default_rng(1234)
+    random_hands = rng.random((2000, 21, 3), dtype=np.float32)
+    posed = np.stack([thumbs_up_hand(rng) for _ in range(2000)])
+    return np.concatenate([random_hands, posed])
+
+
+def test_classify_batch_matches_per_hand_rule(hands):
+    rule = ThumbsUpRule()
+    batch = rule.classify_batch(hands, 480, 640)
+    expected = np.array([per_hand_rule(rule, lm, 480, 640) for lm in hands])
+    assert expected.any() and not expected.all()      # มีทั้งสองกรณีให้เทียบ
+    np.testing.assert_array_equal(batch, expected)
+
+
+def test_classify_batch_per_hand_frame_size(hands):
+    rule = ThumbsUpRule()
+    sizes = np.random.default_rng(7).integers(120, 1080, size=(len(hands), 2))
+    batch = rule.classify_batch(hands, sizes[:, 0], sizes[:, 1])
+    expected = [per_hand_rule(rule, lm, h, w) for lm, (h, w) in zip(hands, sizes)]
+    np.testing.assert_array_equal(batch, expected)
+
+
+def test_single_hand_paths_agree(hands):
+    rule = ThumbsUpRule()
+    for lm in hands[::100]:
+        expected = per_hand_rule(rule, lm, 480, 640)
+        assert rule.classify(lm, 480, 640) == expected
+        assert rule(array_to_landmarks(lm), 480, 640) == expected
+
+
+def test_empty_batch():
+    assert ThumbsUpRule().classify_batch(np.zeros((0, 21, 3), dtype=np.float32), 480, 640).shape == (0,)
@@ -0,0 +1,197 @@
+# thumb_metrics.py - histogram/counter ขนาดเล็กสำหรับ camera_thumb และ export เป็น Prometheus text
+"""
+ออกแบบให้ใช้ใน hot path ของ pipeline ได้: histogram มี bucket คงที่ (ไม่เก็บค่าดิบ)
+observe() แค่หา bucket ด้วย bisect และบวกตัวนับภายใต้ lock ของตัวเอง
+
+    METRICS = MetricsRegistry()
+    read = METRICS.histogram("thumb_stage_seconds", "...", STAGE_BUCKETS, gate="gateA", stage="read")
+    with read.time():
+        frame = source.read()
+    METRICS.render()   # text/plain; version=0.0.4
+
+ค่าที่อ่านจาก state ปัจจุบัน (FPS, จำนวน client) ส่งผ่าน collector ที่คืน Sample ตอน render
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+# วินาที: stage ต่อเฟรมบน RPi อยู่ราว 0.5 ms (flip) ถึงหลายร้อย ms (hands.process เต็มเฟรม)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+# วินาที: ตั้งแต่เห็นท่าจนส่ง hold_complete (รวมเวลาค้างท่า 3 วินาทีของ ThumbHoldStateMachine)
+HOLD_BUCKETS = (3.0, 3.05, 3.1, 3.2, 3.3, 3.5, 3.75, 4.0, 4.5, 5.0, 6.0, 8.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Sample(NamedTuple):
+    """ค่าหนึ่งค่าจาก collector (kind = 'gauge' หรือ 'counter')"""
+    name: str
+    kind: str
+    help: str
+    labels: Dict[str, str]
+    value: float
+
+
+def _format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Span:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: 'Histogram'):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """histogram แบบ bucket คงที่ (ค่าเป็นวินาที) ปลอดภัยเมื่อเรียกจากหลายเธรด"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # ช่องสุดท้าย = เกิน bucket บนสุด
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Span:
+        """with histogram.time(): ... จับเวลาด้วย perf_counter (monotonic)"""
+        return _Span(self)
+
+    def quantile(self, q: float) -> float:
+        """ประมาณ quantile จาก bucket (interpolate ภายใน bucket แบบเดียวกับ histogram_quantile)"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """เก็บ histogram/counter ตามชื่อ + labels และรวม collector ที่คืนค่า ณ ตอน render"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, dict] = {}  # name -> {kind, help, series: {labels: metric}}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _get(self, name: str, kind: str, help_text: str, labels: Dict[str, str], factory):
+        key: Labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            family = self._metrics.setdefault(name, {"kind": kind, "help": help_text, "series": {}})
+            metric = family["series"].get(key)
+            if metric is None:
+                metric = family["series"][key] = factory()
+            return metric
+
+    def histogram(self, name: str, help_text: str, buckets=STAGE_BUCKETS, **labels) -> Histogram:
+        return self._get(name, "histogram", help_text, labels, lambda: Histogram(buckets))
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        return self._get(name, "counter", help_text, labels, Counter)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            families = {
+                name: (family["kind"], family["help"], list(family["series"].items()))
+                for name, family in self._metrics.items()
+            }
+            collectors = list(self._collectors)
+
+        lines = []
+        for name, (kind, help_text, series) in families.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, metric in series:
+                if kind == "histogram":
+                    counts, total_sum, total = metric.snapshot()
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), counts):
+                        cumulative += count
+                        le = f'le="{_format_value(bound)}"'
+                        lines.append(f'{name}_bucket{_format_labels(labels, le)} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {total_sum!r}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {total}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(metric.value)}')
+
+        # sample จาก collector: รวมตามชื่อเพื่อให้ HELP/TYPE อยู่หัว family เดียว
+        collected: Dict[str, list] = {}
+        for collector in collectors:
+            for sample in collector():
+                collected.setdefault(sample.name, []).append(sample)
+        for name, samples in collected.items():
+            lines.append(f'# HELP {name} {samples[0].help}')
+            lines.append(f'# TYPE {name} {samples[0].kind}')
+            for sample in samples:
+                labels = tuple(sorted((k, str(v)) for k, v in sample.labels.items()))
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(sample.value)}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,162 @@
+# thumb_recording.py - บันทึก/อ่าน landmarks และเฟรมของ camera_thumb สำหรับ replay แบบ offline
+"""
+Recording หนึ่งชุดคือ directory ที่มีไฟล์:
+
+  meta.json      ข้อมูล format (version, dtype ของ index)
+  index.bin      1 record ต่อเฟรม ตาม INDEX_DTYPE
+  landmarks.bin  float32 (N, 21, 3) พิกัด normalized ของมือแรก (เป็นศูนย์ถ้าไม่เจอมือ)
+  frames.bin     JPEG ต่อกัน (ถ้าบันทึกเฟรม) อ้างอิงด้วย frame_offset/frame_size ใน index
+
+ทุกไฟล์เป็นแบบ append-only และเปิดด้วย np.memmap ได้โดยตรง
+"""
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+LANDMARK_SHAPE = (21, 3)
+LANDMARK_BYTES = LANDMARK_SHAPE[0] * LANDMARK_SHAPE[1] * 4
+INDEX_DTYPE = np.dtype([
+    ('t_ms', '<f8'),
+    ('has_hand', 'u1'),
+    ('height', '<u2'),
+    ('width', '<u2'),
+    ('frame_offset', '<u8'),
+    ('frame_size', '<u4'),
+])
+
+INDEX_FILE = 'index.bin'
+LANDMARKS_FILE = 'landmarks.bin'
+FRAMES_FILE = 'frames.bin'
+META_FILE = 'meta.json'
+
+_EMPTY_LANDMARKS = np.zeros(LANDMARK_SHAPE, dtype='<f4')
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class LandmarkRecorder:
+    """เขียน recording แบบต่อท้าย (เรียกจากหลายเธรดได้)"""
+
+    def __init__(self, path: str, record_frames: bool = False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.record_frames = record_frames
+        self._lock = threading.Lock()
+
+        # ตัดส่วนที่เขียนไม่ครบ (เช่นไฟดับกลางเฟรม) ให้จำนวน record ตรงกันทุกไฟล์
+        index_path = os.path.join(path, INDEX_FILE)
+        landmarks_path = os.path.join(path, LANDMARKS_FILE)
+        self.count = min(
+            _file_size(index_path) // INDEX_DTYPE.itemsize,
+            _file_size(landmarks_path) // LANDMARK_BYTES,
+        )
+        for file_path, size in ((index_path, INDEX_DTYPE.itemsize), (landmarks_path, LANDMARK_BYTES)):
+            if os.path.exists(file_path):
+                os.truncate(file_path, self.count * size)
+
+        self._index = open(index_path, 'ab')
+        self._landmarks = open(landmarks_path, 'ab')
+        self._frames = None
+        self._frame_offset = 0
+        if record_frames:
+            frames_path = os.path.join(path, FRAMES_FILE)
+            self._frame_offset = _file_size(frames_path)
+            self._frames = open(frames_path, 'ab')
+
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as meta:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "index_dtype": INDEX_DTYPE.descr,
+                "landmark_shape": list(LANDMARK_SHAPE),
+            }, meta)
+
+    def write(
+        self,
+        t_ms: float,
+        landmarks: Optional[np.ndarray],
+        height: int,
+        width: int,
+        jpeg: Optional[bytes] = None,
+    ) -> None:
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record['t_ms'] = t_ms
+        record['has_hand'] = landmarks is not None
+        record['height'] = height
+        record['width'] = width
+        lm = _EMPTY_LANDMARKS if landmarks is None else np.asarray(landmarks, dtype='<f4').reshape(LANDMARK_SHAPE)
+
+        with self._lock:
+            if self._index.closed:
+                return
+            if self._frames is not None and jpeg is not None:
+                record['frame_offset'] = self._frame_offset
+                record['frame_size'] = len(jpeg)
+                self._frames.write(jpeg)
+                self._frame_offset += len(jpeg)
+            self._landmarks.write(lm.tobytes())
+            self._index.write(record.tobytes())
+            self.count += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            for handle in (self._frames, self._landmarks, self._index):
+                if handle is not None and not handle.closed:
+                    handle.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for handle in (self._frames, self._landmarks, self._index):
+                if handle is not None:
+                    handle.close()
+
+
+class LandmarkRecording:
+    """อ่าน recording แบบ memory-mapped (ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        index_path = os.path.join(path, INDEX_FILE)
+        landmarks_path = os.path.join(path, LANDMARKS_FILE)
+        frames_path = os.path.join(path, FRAMES_FILE)
+
+        count = min(
+            _file_size(index_path) // INDEX_DTYPE.itemsize,
+            _file_size(landmarks_path) // LANDMARK_BYTES,
+        )
+        if count == 0:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+            self.landmarks = np.zeros((0,) + LANDMARK_SHAPE, dtype='<f4')
+        else:
+            self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+            self.landmarks = np.memmap(landmarks_path, dtype='<f4', mode='r', shape=(count,) + LANDMARK_SHAPE)
+
+        self.frames = None
+        if _file_size(frames_path) > 0:
+            self.frames = np.memmap(frames_path, dtype=np.uint8, mode='r')
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def timestamps_ms(self) -> np.ndarray:
+        return self.index['t_ms']
+
+    @property
+    def has_hand(self) -> np.ndarray:
+        return self.index['has_hand'].astype(bool)
+
+    def frame_jpeg(self, i: int) -> Optional[np.ndarray]:
+        """JPEG ของเฟรมที่ i (เป็น view ของ memmap) หรือ None ถ้าไม่ได้บันทึกเฟรม"""
+        if self.frames is None:
+            return None
+        size = int(self.index['frame_size'][i])
+        if size == 0:
+            return None
+        offset = int(self.index['frame_offset'][i])
+        return self.frames[offset:offset + size]
@@ -0,0 +1,180 @@
+# thumb_replay.py - replay recording ผ่าน ThumbsUpRule / TemporalFilter / hold state machine
+"""
+วัด throughput และ latency ของ camera_thumb แบบ offline (ไม่ต้องมีกล้องหรือ MQTT broker)
+
+    python thumb_replay.py recordings/gateA               # เร็วที่สุดเท่าที่ทำได้
+    python thumb_replay.py recordings/gateA --realtime    # ตามจังหวะเวลาที่บันทึกไว้
+    python thumb_replay.py recordings/gateA --mediapipe   # รัน MediaPipe ใหม่จากเฟรมที่บันทึก
+
+สร้าง recording ด้วยการรัน camera_thumb.py พร้อม RECORD_PATH=<dir> (และ RECORD_FRAMES=1)
+"""
+import argparse
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+import camera_thumb as ct
+from thumb_recording import LandmarkRecording
+
+
+class ReplayPublisher:
+    """ใช้แทน MQTTManager: นับข้อความที่จะถูก publish แทนการส่งจริง"""
+
+    def __init__(self):
+        self.last_thumb_payload = None
+        self.now_ms = 0
+        self.thumb_messages = 0
+        self.session_messages = 0
+        self.hold_complete_ms: List[int] = []
+
+    def send_thumb_state(self, detected, *, progress=None, hold_complete=None, distance=None):
+        self.thumb_messages += 1
+        if hold_complete:
+            self.hold_complete_ms.append(self.now_ms)
+
+    def send_session_status(self, status):
+        self.session_messages += 1
+
+
+@dataclass
+class ReplayReport:
+    frames: int = 0
+    elapsed_s: float = 0.0
+    thumb_messages: int = 0
+    session_messages: int = 0
+    temporal_emits: int = 0
+    hold_latencies_ms: List[int] = field(default_factory=list)
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def mqtt_messages(self) -> int:
+        return self.thumb_messages + self.session_messages
+
+    def summary(self) -> str:
+        lines = [
+            f"frames            : {self.frames}",
+            f"elapsed           : {self.elapsed_s:.3f} s",
+            f"throughput        : {self.fps:,.0f} frames/s",
+            f"mqtt messages     : {self.mqtt_messages} (thumb={self.thumb_messages}, session={self.session_messages})",
+            f"temporal emits    : {self.temporal_emits}",
+            f"hold_complete     : {len(self.hold_latencies_ms)}",
+        ]
+        if self.hold_latencies_ms:
+            latencies = np.asarray(self.hold_latencies_ms)
+            lines.append(
+                "gesture->complete : "
+                f"mean={latencies.mean():.0f} ms p50={np.percentile(latencies, 50):.0f} ms "
+                f"max={latencies.max():.0f} ms"
+            )
+        return "\n".join(lines)
+
+
+def _mediapipe_detections(recording: LandmarkRecording, rule: ct.ThumbsUpRule) -> np.ndarray:
+    """รัน MediaPipe ใหม่บนเฟรม JPEG ที่บันทึกไว้"""
+    hands = ct.mp.solutions.hands.Hands(
+        model_complexity=0,
+        max_num_hands=1,
+        min_detection_confidence=0.45,
+        min_tracking_confidence=0.25
+    )
+    detections = np.zeros(len(recording), dtype=bool)
+    try:
+        for i in range(len(recording)):
+            jpeg = recording.frame_jpeg(i)
+            if jpeg is None:
+                continue
+            frame = cv2.imdecode(np.asarray(jpeg), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if results.multi_hand_landmarks:
+                h, w = frame.shape[:2]
+                detections[i] = rule(results.multi_hand_landmarks[0], h, w)
+    finally:
+        hands.close()
+    return detections
+
+
+def replay(
+    recording: LandmarkRecording,
+    realtime: bool = False,
+    use_mediapipe: bool = False,
+    rule: Optional[ct.ThumbsUpRule] = None,
+) -> ReplayReport:
+    """ป้อน recording เข้า ThumbsUpRule → TemporalFilter → ThumbHoldStateMachine"""
+    rule = rule or ct.ThumbsUpRule(lift_margin_px=10, curl_margin_px=6)
+    publisher = ReplayPublisher()
+    hold = ct.ThumbHoldStateMachine(publisher)
+    temporal = ct.TemporalFilter(ct.TemporalParams())
+    report = ReplayReport(frames=len(recording))
+    if len(recording) == 0:
+        return report
+
+    timestamps = np.asarray(recording.timestamps_ms, dtype=np.int64)
+    started = time.perf_counter()
+
+    if use_mediapipe:
+        detections = _mediapipe_detections(recording, rule)
+    else:
+        index = recording.index
+        detections = rule.classify_batch(recording.landmarks, index['height'], index['width'])
+        detections &= recording.has_hand
+
+    gesture_start_ms: Optional[int] = None
+    for i, detected in enumerate(detections.tolist()):
+        now_ms = int(timestamps[i])
+        if realtime:
+            delay = (now_ms - timestamps[0]) / 1000.0 - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        if temporal.step(detected, now_ms):
+            report.temporal_emits += 1
+
+        if detected and gesture_start_ms is None and not hold.thumb_hold_completed:
+            gesture_start_ms = now_ms
+
+        publisher.now_ms = now_ms
+        completed = len(publisher.hold_complete_ms)
+        hold.update(detected, now_ms)
+
+        if len(publisher.hold_complete_ms) > completed and gesture_start_ms is not None:
+            report.hold_latencies_ms.append(now_ms - gesture_start_ms)
+            gesture_start_ms = None
+        elif not detected and hold.thumb_hold_start_ms is None:
+            gesture_start_ms = None
+
+    report.elapsed_s = time.perf_counter() - started
+    report.thumb_messages = publisher.thumb_messages
+    report.session_messages = publisher.session_messages
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a camera_thumb recording offline")
+    parser.add_argument("recording", help="directory ที่บันทึกด้วย RECORD_PATH")
+    parser.add_argument("--realtime", action="store_true", help="replay ตามจังหวะเวลาที่บันทึก")
+    parser.add_argument("--mediapipe", action="store_true", help="รัน MediaPipe ใหม่จากเฟรมที่บันทึก")
+    parser.add_argument("--lift-margin", type=float, default=10.0, help="ThumbsUpRule.lift_margin_px")
+    parser.add_argument("--curl-margin", type=float, default=6.0, help="ThumbsUpRule.curl_margin_px")
+    parser.add_argument("-v", "--verbose", action="store_true", help="แสดง log ของ state machine")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        ct.logger.setLevel(logging.WARNING)
+
+    recording = LandmarkRecording(args.recording)
+    rule = ct.ThumbsUpRule(lift_margin_px=args.lift_margin, curl_margin_px=args.curl_margin)
+    report = replay(recording, realtime=args.realtime, use_mediapipe=args.mediapipe, rule=rule)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()